@@ -1,89 +1,314 @@
-import json
-from openai import OpenAI
+import logging
 import os
-from dotenv import load_dotenv
-load_dotenv()
-client = OpenAI()
+import threading
+import time
+import db
+from context_window import ContextWindow, estimate_tokens
+from note_index import NoteIndex
+from prompt_context import TopicContextCache
+from response_cache import ResponseCache, cache_key
+from instrumentation import incr, observe, span
 
-# fisier pentru chat istoric per topic
+# clientul OpenAI se creeaza la prima intrebare (vezi get_client), nu la import
+client = None
+_client_lock = threading.Lock()
+
+# vechiul fisier de istoric, importat o singura data in chat_messages (topics.db)
 CHAT_DB_PATH = "data/chat_history.json"
 
+# model folosit pentru rezumatul istoricului care iese din fereastra de context
+DEFAULT_SUMMARY_MODEL = "gpt-4o-mini"
+
+# nota selectata mai lunga de atat se trimite prin rezumatul ei (study_batch.py), daca e la zi
+SUMMARY_MIN_CHARS = 1500
+
+# index semantic al notelor; chromadb se incarca abia la prima intrebare
+note_index = NoteIndex()
+
+# raspunsuri deja primite pentru exact aceeasi lista de mesaje
+response_cache = ResponseCache()
+
+# blocul de context al fiecarui topic (nume, descriere, titluri), refacut doar la modificari
+topic_contexts = TopicContextCache()
+
+_history_migrated = False
+
+log = logging.getLogger(__name__)
+
+
+def get_client():
+    """The OpenAI client, created on first use; openai and dotenv load only then."""
+    global client
+    with _client_lock:
+        if client is None:
+            from dotenv import load_dotenv
+            from openai import OpenAI
+            load_dotenv()
+            client = OpenAI()
+    return client
+
+
+def _migrate_history():
+    global _history_migrated
+    if not _history_migrated:
+        db.migrate_chat_history_json(CHAT_DB_PATH)
+        _history_migrated = True
 
-def load_chat_history():
-    try:
-        with open(CHAT_DB_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except:
-        return {}
 
+def load_chat_history(topic_id, limit=None):
+    """Messages of one topic, oldest first (only the newest `limit` if given)."""
+    _migrate_history()
+    return [{"role": m["role"], "content": m["content"]}
+            for m in db.get_chat_messages(topic_id, limit=limit)]
 
-def save_chat_history(data):
-    with open(CHAT_DB_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+
+def save_chat_turn(topic_id, question, answer):
+    _migrate_history()
+    db.add_chat_messages(topic_id, [
+        {"role": "user", "content": question},
+        {"role": "assistant", "content": answer},
+    ])
 
 
 # -------------------------------
 # AI Tutor Logic
 # -------------------------------
-def build_prompt(topic_name, topic_desc, note_titles, selected_note_content, settings):
+DEPTH_INSTRUCTIONS = {
+    "short": "Răspunde scurt în 2-3 rânduri.",
+    "medium": "Răspunde moderat, 4-8 rânduri.",
+    "detailed": "Explică detaliat și pas cu pas, 8-15 rânduri."
+}
+
+
+def build_prompt(context, settings, with_titles=True):
+    """System prompt for a topic's ContextBlock.
+
+    Holds only what is fixed for the topic and settings, so it comes out
+    byte-identical for every question; the per-question parts go in
+    build_note_context() instead.
+    """
     lang = settings.get("language", "RO")
     depth = settings.get("depth", "medium")
+    sections = [context.header]
+    if with_titles:
+        sections.append(context.titles)
+    sections.append(f"""Instrucțiuni stil:
+- Răspunde în limba: {lang}
+- {DEPTH_INSTRUCTIONS.get(depth, "")}
+- Fii clar, logic și explicativ.""")
+    return "\n\n".join(sections) + "\n"
 
-    depth_map = {
-        "short": "Răspunde scurt în 2-3 rânduri.",
-        "medium": "Răspunde moderat, 4-8 rânduri.",
-        "detailed": "Explică detaliat și pas cu pas, 8-15 rânduri."
-    }
 
-    return f"""
-Ești un tutor AI care ajută utilizatorul să înțeleagă topicul: **{topic_name}**.
+def build_note_context(selected_note_content, context_chunks=None, selected_note_summary=None):
+    """The per-question context (retrieved chunks, selected note), or None if there is none.
 
-Descriere topic:
-{topic_desc}
+    A selected_note_summary is sent in place of the note's text.
+    """
+    sections = []
+    if context_chunks:
+        sections.append("Fragmente relevante din notițe:\n" + "\n---\n".join(context_chunks))
+    if selected_note_summary:
+        sections.append(f"Rezumatul notei selectate:\n{selected_note_summary}")
+    elif selected_note_content:
+        sections.append(f"Fragment notă selectată:\n{selected_note_content}")
+    return "\n\n".join(sections) or None
 
-Titlurile notelor din acest topic:
-{', '.join(note_titles)}
 
-Fragment notă selectată:
-{selected_note_content}
+def selected_note_summary(note_id, content):
+    """The stored summary of a long note, if it was made from exactly this text."""
+    if note_id is None or len(content or "") < SUMMARY_MIN_CHARS:
+        return None
+    row = db.get_note_summary(note_id, current_only=True)
+    # the editor may hold edits that haven't reached the db yet
+    if row is None or not row["summary"] or row["content"] != content:
+        return None
+    return row["summary"]
 
-Instrucțiuni stil:
-- Răspunde în limba: {lang}
-- {depth_map.get(depth, "")}
-- Fii clar, logic și explicativ.
-"""
 
+def summarize_history(previous_summary, messages, max_tokens, model=DEFAULT_SUMMARY_MODEL, timeout=None):
+    """Fold messages that left the context window into the running summary."""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = "Rezumă concis conversația de mai jos, păstrând conceptele și întrebările importante."
+    if previous_summary:
+        prompt += f"\n\nRezumat anterior:\n{previous_summary}"
+    with span("tutor_phase_seconds", phase="summarize"):
+        response = get_client().chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": transcript},
+            ],
+            temperature=0,
+            max_tokens=max(max_tokens, 64),
+            timeout=timeout
+        )
+    _record_usage(getattr(response, "usage", None))
+    return response.choices[0].message.content
+
+
+context_window = ContextWindow(summarize_history)
+
+
+def build_messages(topic_id, selected_note_content, question, settings, selected_note_id=None, timeout=None):
+    """The message list for one question.
+
+    The cached topic system prompt comes first and the history after it,
+    so consecutive questions share a prefix; the per-question note context
+    goes last, right before the question.
+    """
+    _migrate_history()
+    context = topic_contexts.get(topic_id)
+    if context is None:
+        raise ValueError(f"topic {topic_id} does not exist")
 
-def ask_tutor(topic_id, topic_name, topic_desc, note_titles, selected_note_content, question, settings):
-    history = load_chat_history()
-    if str(topic_id) not in history:
-        history[str(topic_id)] = []
+    with span("tutor_phase_seconds", phase="load_history"):
+        # rezumatul istoricului ruleaza in cererea tutorelui, deci respecta acelasi timeout
+        history = context_window.build(
+            topic_id, settings.get("context_token_budget", 2000),
+            model=settings.get("summary_model", DEFAULT_SUMMARY_MODEL),
+            timeout=timeout if timeout is not None else settings.get("request_timeout")
+        )
+
+    # RETRIEVE the note chunks closest to the question
+    context_chunks = None
+    if settings.get("rag_top_k"):
+        try:
+            with span("tutor_phase_seconds", phase="retrieve"):
+                context_chunks = note_index.query(topic_id, question, settings["rag_top_k"])
+        except ImportError:
+            pass  # chromadb unavailable: fall back to note titles
+        except Exception as e:
+            # modelul de embedding nu s-a descarcat (offline) sau chromadb a esuat: trimitem titlurile
+            log.warning("Note retrieval failed, sending note titles instead: %s", e)
+            context_chunks = None
 
     # BUILD SYSTEM + USER MESSAGE
-    system_msg = build_prompt(topic_name, topic_desc, note_titles, selected_note_content, settings)
+    with span("tutor_phase_seconds", phase="build_prompt"):
+        # relevant chunks retrieved from the topic's notes replace the full title list
+        system_msg = build_prompt(context, settings, with_titles=not context_chunks)
+        summary = None
+        if settings.get("use_note_summaries", True):
+            summary = selected_note_summary(selected_note_id, selected_note_content)
+        note_context = build_note_context(selected_note_content, context_chunks, summary)
+    incr("tutor_context_tokens_total",
+         context.header_tokens + (0 if context_chunks else context.titles_tokens), part="topic")
 
     messages = [{"role": "system", "content": system_msg}]
 
     # Add history
-    for msg in history[str(topic_id)]:
+    for msg in history:
         messages.append(msg)
 
+    if note_context:
+        incr("tutor_context_tokens_total", estimate_tokens(note_context), part="question")
+        messages.append({"role": "system", "content": note_context})
+
     # Add new question
     messages.append({"role": "user", "content": question})
+    return messages
+
+
+def _record_usage(usage):
+    """Count the tokens a completion reports (absent on some proxies and stubs)."""
+    if usage is None:
+        return
+    incr("tutor_tokens_total", getattr(usage, "prompt_tokens", 0) or 0, kind="prompt")
+    incr("tutor_tokens_total", getattr(usage, "completion_tokens", 0) or 0, kind="completion")
+
+
+def _response_cache_key(messages, settings, use_cache):
+    """Cache key for this request, or None when the answer should not be cached."""
+    temperature = settings.get("temperature", 0.5)
+    if not use_cache or not settings.get("cache_responses", True):
+        return None
+    # sampling at higher temperatures is meant to vary; don't pin one answer
+    if temperature > settings.get("cache_max_temperature", 0.2):
+        return None
+    return cache_key(messages, settings.get("model", "gpt-4.1-mini"), temperature,
+                     settings.get("max_tokens", 300))
 
-    # CALL OPENAI
-    response = client.chat.completions.create(
+
+def ask_tutor(topic_id, selected_note_content, question, settings, timeout=None, use_cache=True,
+              selected_note_id=None):
+    messages = build_messages(topic_id, selected_note_content, question, settings, selected_note_id, timeout)
+
+    key = _response_cache_key(messages, settings, use_cache)
+    answer = response_cache.get(key) if key else None
+    if key:
+        incr("tutor_cache_total", result="miss" if answer is None else "hit")
+
+    if answer is None:
+        # CALL OPENAI
+        with span("tutor_phase_seconds", phase="api_call"):
+            response = get_client().chat.completions.create(
+                model=settings.get("model", "gpt-4.1-mini"),
+                messages=messages,
+                temperature=settings.get("temperature", 0.5),
+                max_tokens=settings.get("max_tokens", 300),
+                timeout=timeout
+            )
+        _record_usage(getattr(response, "usage", None))
+
+        answer = response.choices[0].message.content
+        if key:
+            response_cache.put(key, answer)
+
+    # Save history
+    with span("tutor_phase_seconds", phase="save_history"):
+        save_chat_turn(topic_id, question, answer)
+
+    return answer
+
+
+def ask_tutor_stream(topic_id, selected_note_content, question, settings, timeout=None, use_cache=True,
+                     selected_note_id=None):
+    """Like ask_tutor, but yields the answer in text deltas as they arrive.
+
+    The turn is saved to history only once the stream has completed; closing
+    the generator early discards it. A cached answer arrives as one delta.
+    """
+    messages = build_messages(topic_id, selected_note_content, question, settings, selected_note_id, timeout)
+
+    key = _response_cache_key(messages, settings, use_cache)
+    cached = response_cache.get(key) if key else None
+    if key:
+        incr("tutor_cache_total", result="miss" if cached is None else "hit")
+    if cached is not None:
+        yield cached
+        save_chat_turn(topic_id, question, cached)
+        return
+
+    start = time.perf_counter()
+    stream = get_client().chat.completions.create(
         model=settings.get("model", "gpt-4.1-mini"),
         messages=messages,
         temperature=settings.get("temperature", 0.5),
-        max_tokens=settings.get("max_tokens", 300)
+        max_tokens=settings.get("max_tokens", 300),
+        timeout=timeout,
+        stream=True,
+        # the last chunk then carries the token usage (and no choices)
+        stream_options={"include_usage": True}
     )
 
-    answer = response.choices[0].message.content
-
-    # Save history
-    history[str(topic_id)].append({"role": "user", "content": question})
-    history[str(topic_id)].append({"role": "assistant", "content": answer})
-    save_chat_history(history)
+    parts = []
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                _record_usage(getattr(chunk, "usage", None))
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if not parts:
+                    observe("tutor_phase_seconds", time.perf_counter() - start, phase="first_token")
+                parts.append(delta)
+                yield delta
+    finally:
+        stream.close()
+    # time spent by the consumer between deltas counts too; it is the time the user waited
+    observe("tutor_phase_seconds", time.perf_counter() - start, phase="api_call")
 
-    return answer
+    answer = "".join(parts)
+    if key:
+        response_cache.put(key, answer)
+    with span("tutor_phase_seconds", phase="save_history"):
+        save_chat_turn(topic_id, question, answer)
@@ -1,15 +1,23 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from theme import apply_modern_dark_theme
-from modern_widgets import RoundedButton
-from ai_tutor import ask_tutor
-from settings import load_settings
+from modern_widgets import RoundedButton, VirtualList, ChatTranscript
+from ai_tutor import ask_tutor_stream, CHAT_DB_PATH
+from settings import settings_service
+from tutor_worker import TutorWorker
+from search_pipeline import SearchPipeline
+from write_behind import WriteBehind
+from instrumentation import start_exporters, timed
 from db import (
-    get_topics, create_topic, update_topic, delete_topic,
-    get_notes_by_topic, create_note, update_note, delete_note,
-    init_db
+    list_topics, create_topic, update_topic, delete_topic, list_notes,
+    get_chat_messages, migrate_chat_history_json, init_db
 )
 
+PAGE_SIZE = 200
+CHAT_PAGE_SIZE = 30
+# autosave once typing in the note editor pauses this long
+AUTOSAVE_MS = 800
+
 
 class NotesApp:
     def __init__(self, root):
@@ -25,14 +33,32 @@ class NotesApp:
 
         self.selected_topic_id = None
         self.selected_note_id = None
+        self.selected_note = None
 
-        self.build_layout()
-        self.load_topics()
+        self.tutor_worker = TutorWorker(self.root)
+        self.tutor_streams = []
+        self.search = SearchPipeline(self.root, self.on_search_results)
+        self.writes = WriteBehind(self.root, on_conflict=self.on_note_conflict)
+        self.autosave_job = None
+        # loaded on the first question, then kept current by the settings watcher
+        self.settings = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
-    def resize_chat_frame(self, event):
-        """Ensure chat_frame matches chat_container width."""
-        canvas_width = event.width
-        self.chat_container.itemconfig(self.chat_window, width=canvas_width)
+        self.build_layout()
+        self.writes.replay()
+        # topics load once the window has been drawn, so the first frame isn't held up by the db
+        self.topics_loaded = False
+        self.root.bind("<Map>", self.on_first_map, add="+")
+
+    def on_close(self):
+        if self.settings is not None:
+            settings_service.stop_watching(self.root)
+            settings_service.unsubscribe(self.on_settings_changed)
+        self.save_note()
+        self.writes.close()
+        self.tutor_worker.shutdown()
+        self.search.shutdown()
+        self.root.destroy()
 
     # ============================================================
     # BUILD LAYOUT
@@ -48,18 +74,17 @@ class NotesApp:
                   foreground=self.colors["accent"],
                   background=self.colors["bg_sidebar"]).pack(pady=15)
 
-        self.topic_list = tk.Listbox(
+        self.topic_list = VirtualList(
             self.sidebar,
+            text_of=lambda t: t["name"],
+            on_select=self.on_topic_select,
+            page_size=PAGE_SIZE,
             bg=self.colors["bg_sidebar"],
             fg=self.colors["fg_text"],
-            selectbackground=self.colors["select_bg"],
-            highlightthickness=0,
-            relief="flat",
-            bd=0,
+            select_bg=self.colors["select_bg"],
             font=("Segoe UI", 11)
         )
         self.topic_list.pack(fill="both", expand=True, padx=10)
-        self.topic_list.bind("<<ListboxSelect>>", self.on_topic_select)
 
         RoundedButton(self.sidebar, text="Add Topic",
                       bg_color=self.colors["accent"], fg_color="#1E1E2E",
@@ -91,24 +116,24 @@ class NotesApp:
         self.search_entry = ttk.Entry(self.main, textvariable=self.search_var, width=50)
         self.search_entry.pack(anchor="w", padx=10, pady=2)
 
-        self.notes_list = tk.Listbox(
+        self.notes_list = VirtualList(
             self.main,
+            text_of=lambda n: n["title"],
+            on_select=self.on_note_select,
+            page_size=PAGE_SIZE,
             bg=self.colors["bg_card"],
             fg=self.colors["fg_text"],
-            selectbackground=self.colors["select_bg"],
-            highlightthickness=0,
-            relief="flat",
-            bd=0,
+            select_bg=self.colors["select_bg"],
             height=8,
             font=("Segoe UI", 11)
         )
         self.notes_list.pack(fill="x", padx=10, pady=8)
-        self.notes_list.bind("<<ListboxSelect>>", self.on_note_select)
 
         ttk.Label(self.main, text="Title:", style="Header.TLabel").pack(anchor="w", padx=10)
 
         self.note_title = ttk.Entry(self.main, width=50)
         self.note_title.pack(anchor="w", padx=10, pady=5)
+        self.note_title.bind("<KeyRelease>", lambda e: self.schedule_autosave())
 
         ttk.Label(self.main, text="Content:", style="Header.TLabel").pack(anchor="w", padx=10)
 
@@ -125,6 +150,7 @@ class NotesApp:
             font=("Segoe UI", 11)
         )
         self.note_content.pack(fill="both", expand=True, padx=10, pady=8)
+        self.note_content.bind("<<Modified>>", self.on_content_modified)
 
         bottom_buttons = ttk.Frame(self.main, style="Main.TFrame")
         bottom_buttons.pack(fill="x", pady=2)
@@ -141,7 +167,7 @@ class NotesApp:
         RoundedButton(bottom_buttons, text="Save Changes",
                       bg_color="#A6E3A1", fg_color="#1E1E2E",
                       parent_bg=self.colors["bg_main"],
-                      command=self.save_note).grid(row=0, column=1, padx=5, sticky="ew")
+                      command=self.save_note_now).grid(row=0, column=1, padx=5, sticky="ew")
 
         RoundedButton(bottom_buttons, text="Delete Note",
                       bg_color="#F38BA8", fg_color="#1E1E2E",
@@ -158,29 +184,15 @@ class NotesApp:
 
         ttk.Label(self.tutor_frame, text="AI Tutor:", style="Header.TLabel").pack(anchor="w")
 
-        # Scrollable chat area
-        self.chat_container = tk.Canvas(
+        # Chat transcript: only the visible bubbles are drawn, older history pages in on scroll-up
+        self.transcript = ChatTranscript(
             self.tutor_frame,
+            load_older=self.load_older_messages,
+            page_size=CHAT_PAGE_SIZE,
             bg=self.colors["bg_card"],
-            highlightthickness=0
-        )
-        self.chat_container.pack(fill="both", expand=True, padx=5, pady=5)
-
-        self.chat_scroll = ttk.Scrollbar(self.tutor_frame, orient="vertical", command=self.chat_container.yview)
-        self.chat_scroll.pack(side="right", fill="y")
-
-        self.chat_container.configure(yscrollcommand=self.chat_scroll.set)
-
-        self.chat_frame = tk.Frame(self.chat_container, bg=self.colors["bg_card"])
-        self.chat_window = self.chat_container.create_window(
-        (0, 0),
-        window=self.chat_frame,
-        anchor="nw"
+            user_fg=self.colors["accent"]
         )
-
-        self.chat_frame.bind("<Configure>", lambda e: 
-                             self.chat_container.configure(scrollregion=self.chat_container.bbox("all")))
-        self.chat_container.bind("<Configure>", self.resize_chat_frame)
+        self.transcript.pack(fill="both", expand=True, padx=5, pady=5)
 
         # Input field + Send
         self.tutor_input = ttk.Entry(self.tutor_frame, width=80)
@@ -197,52 +209,22 @@ class NotesApp:
     # ============================================================
     # CHAT BUBBLE UTILITIES
     # ============================================================
+    @timed("ui_seconds", op="add_bubble")
     def add_bubble(self, text, sender="user"):
-        """Create a chat bubble aligned left or right."""
-
-        # Each message gets its own ROW FRAME to avoid stretching.
-        row = tk.Frame(self.chat_frame, bg=self.colors["bg_card"])
-        row.pack(fill="x", pady=3)
-
-        # Decide style based on sender
-        if sender == "user":
-            bubble_color = "#2e384d"
-            fg = self.colors["accent"]
-            side = "right"
-            padx = (50, 10)
-        else:
-            bubble_color = "#374152"
-            fg = "#A6E3A1"
-            side = "left"
-            padx = (10, 50)
-
-        # bubble itself (shrink to text)
-        bubble = tk.Frame(
-            row,
-            bg=bubble_color,
-            padx=12,
-            pady=8
-        )
+        """Append a chat bubble (right for the user, left for the tutor); returns its handle."""
+        return self.transcript.add_message(text, sender)
 
-        tk.Label(
-            bubble,
-            text=text,
-            fg=fg,
-            bg=bubble_color,
-            justify="left",
-            wraplength=450,
-            font=("Segoe UI", 10)
-        ).pack()
-
-        # PACK bubble aligned properly inside row
-        if side == "right":
-            bubble.pack(anchor="e", padx=padx)
-        else:
-            bubble.pack(anchor="w", padx=padx)
+    def update_bubble(self, handle, text):
+        """Replace a bubble's text in place (used while an answer streams in)."""
+        self.transcript.update_message(handle, text)
+
+    def load_transcript(self):
+        rows = get_chat_messages(self.selected_topic_id, limit=CHAT_PAGE_SIZE)
+        self.transcript.reset([chat_row(m) for m in rows], exhausted=len(rows) < CHAT_PAGE_SIZE)
 
-        # update scroll
-        self.chat_container.update_idletasks()
-        self.chat_container.yview_moveto(1.0)
+    def load_older_messages(self, before_id, limit):
+        rows = get_chat_messages(self.selected_topic_id, limit=limit, before_id=before_id)
+        return [chat_row(m) for m in rows]
 
 
 
@@ -250,19 +232,13 @@ class NotesApp:
     # TYPING ANIMATION
     # ============================================================
     def start_typing_animation(self):
+        if self.typing_animation_running:
+            return
         self.typing_animation_running = True
         self.typing_dots = 0
 
         # create placeholder bubble
-        self.typing_bubble = tk.Label(
-            self.chat_frame,
-            text="🤖 Tutor is typing",
-            fg="#A6E3A1",
-            bg=self.colors["bg_card"],
-            font=("Segoe UI", 10),
-            anchor="w"
-        )
-        self.typing_bubble.pack(anchor="w", pady=3)
+        self.typing_bubble = self.add_bubble("🤖 Tutor is typing", sender="assistant")
 
         self.update_typing_animation()
 
@@ -273,16 +249,18 @@ class NotesApp:
         dots = "." * (self.typing_dots % 4)
         self.typing_dots += 1
 
-        self.typing_bubble.config(text=f"🤖 Tutor is typing{dots}")
+        self.update_bubble(self.typing_bubble, f"🤖 Tutor is typing{dots}")
 
         self.typing_animation_job = self.root.after(500, self.update_typing_animation)
 
     def stop_typing_animation(self):
         if self.typing_animation_job:
             self.root.after_cancel(self.typing_animation_job)
+            self.typing_animation_job = None
 
         if hasattr(self, "typing_bubble"):
-            self.typing_bubble.destroy()
+            self.transcript.remove_message(self.typing_bubble)
+            del self.typing_bubble
 
         self.typing_animation_running = False
 
@@ -300,40 +278,91 @@ class NotesApp:
             return
 
         # display user bubble
-        self.add_bubble(f"👤 You:\n{question}", sender="user")
+        question_bubble = self.add_bubble(format_chat_message("user", question), sender="user")
+
+        self.tutor_input.delete(0, tk.END)
 
         # start typing animation
         self.start_typing_animation()
 
-        # get context
-        topic = next(t for t in self.topics if t["id"] == self.selected_topic_id)
-        note_titles = [n["title"] for n in self.notes]
-
+        # the topic's name, description and note titles come from ai_tutor's context cache
         selected_content = ""
-        if self.notes_list.curselection():
-            idx = self.notes_list.curselection()[0]
-            selected_content = self.notes[idx]["content"]
-
-        settings = load_settings()
-
-        # query AI
-        answer = ask_tutor(
-            topic_id=self.selected_topic_id,
-            topic_name=topic["name"],
-            topic_desc=topic["description"],
-            note_titles=note_titles,
-            selected_note_content=selected_content,
-            question=question,
-            settings=settings
+        selected_id = None
+        if self.selected_note is not None:
+            selected_content = self.selected_note["content"] or ""
+            selected_id = self.selected_note["id"]
+
+        settings = self.tutor_settings()
+
+        # stream the answer in the background; deltas come back on the Tk thread
+        stream = {"topic_id": self.selected_topic_id, "bubble": None, "text": "",
+                  "question": question, "question_bubble": question_bubble}
+        self.tutor_streams.append(stream)
+        self.tutor_worker.submit(
+            stream["topic_id"],
+            ask_tutor_stream,
+            dict(
+                topic_id=stream["topic_id"],
+                selected_note_content=selected_content,
+                selected_note_id=selected_id,
+                question=question,
+                settings=settings,
+                timeout=settings.get("request_timeout")
+            ),
+            on_delta=lambda delta: self.on_tutor_delta(stream, delta),
+            on_done=lambda answer: self.on_tutor_answer(stream, answer),
+            on_error=lambda error: self.on_tutor_error(stream, error),
+            timeout=settings.get("request_timeout")
         )
 
-        # stop animation
-        self.stop_typing_animation()
-
-        # show answer bubble
-        self.add_bubble(f"🤖 Tutor:\n{answer}", sender="assistant")
+    def on_tutor_delta(self, stream, delta):
+        stream["text"] += delta
+        text = format_chat_message("assistant", stream["text"])
+        if stream["bubble"] is None:
+            stream["bubble"] = self.add_bubble(text, sender="assistant")
+            self.update_typing_state(stream["topic_id"])
+        else:
+            self.update_bubble(stream["bubble"], text)
 
-        self.tutor_input.delete(0, tk.END)
+    def on_tutor_answer(self, stream, answer):
+        text = format_chat_message("assistant", answer)
+        if stream["bubble"] is None:
+            stream["bubble"] = self.add_bubble(text, sender="assistant")
+        else:
+            self.update_bubble(stream["bubble"], text)
+        self.attach_stored_ids(stream, answer)
+        self.finish_tutor_request(stream)
+
+    def attach_stored_ids(self, stream, answer):
+        # the turn was saved before on_done; its row ids let the transcript page
+        # older history back in once these bubbles are the oldest ones loaded
+        rows = get_chat_messages(stream["topic_id"], limit=2)
+        if len(rows) == 2 and rows[0]["content"] == stream["question"] and rows[1]["content"] == answer:
+            self.transcript.set_message_id(stream["question_bubble"], rows[0]["id"])
+            self.transcript.set_message_id(stream["bubble"], rows[1]["id"])
+
+    def on_tutor_error(self, stream, error):
+        self.add_bubble(f"⚠️ Tutor error:\n{error}", sender="assistant")
+        self.finish_tutor_request(stream)
+
+    def finish_tutor_request(self, stream):
+        self.tutor_streams.remove(stream)
+        self.update_typing_state(stream["topic_id"])
+
+    def update_typing_state(self, topic_id):
+        # the typing bubble stays while a question of this topic still waits for its first token
+        if not any(s["bubble"] is None for s in self.tutor_streams if s["topic_id"] == topic_id):
+            self.stop_typing_animation()
+
+    def tutor_settings(self):
+        if self.settings is None:
+            self.settings = settings_service.get()
+            settings_service.subscribe(self.on_settings_changed)
+            settings_service.watch(self.root)
+        return self.settings
+
+    def on_settings_changed(self, settings):
+        self.settings = settings
 
     def ask_tutor_enter(self, event):
         self.ask_tutor_action()
@@ -343,96 +372,208 @@ class NotesApp:
     # ============================================================
     # TOPICS + NOTES LOGIC
     # ============================================================
+    def on_first_map(self, event):
+        if event.widget is self.root and not self.topics_loaded:
+            self.topics_loaded = True
+            # idle callbacks run in order, so this comes after the redraw the map just queued
+            self.root.after_idle(self.load_topics)
+
     def load_topics(self):
-        self.topic_list.delete(0, tk.END)
-        self.topics = list(get_topics())
-        for t in self.topics:
-            self.topic_list.insert(tk.END, t["name"])
+        self.topic_list.load(topic_pages)
 
     def add_topic(self):
         name = simple_input("Add Topic", "Topic name:")
         if not name:
             return
         desc = simple_input("Add Topic", "Description:")
-        create_topic(name, desc)
-        self.load_topics()
+        topic_id = create_topic(name, desc)
+        self.topic_list.insert_row({"id": topic_id, "name": name, "description": desc})
 
     def edit_topic(self):
-        if not self.topic_list.curselection():
+        topic = self.topic_list.selected()
+        if topic is None:
             return
-        idx = self.topic_list.curselection()[0]
-        topic = self.topics[idx]
         new_name = simple_input("Edit Topic", "New name:", topic["name"])
         new_desc = simple_input("Edit Topic", "New description:", topic["description"])
         update_topic(topic["id"], new_name, new_desc)
-        self.load_topics()
+        topic = {"id": topic["id"], "name": new_name, "description": new_desc}
+        self.topic_list.update_row(topic)
 
     def delete_topic_action(self):
-        if not self.topic_list.curselection():
+        topic = self.topic_list.selected()
+        if topic is None:
             return
         if messagebox.askyesno("Confirm", "Delete topic and all its notes?"):
-            idx = self.topic_list.curselection()[0]
-            delete_topic(self.topics[idx]["id"])
+            delete_topic(topic["id"])
+            self.topic_list.remove_row(topic["id"])
+            self.tutor_worker.cancel_topic(topic["id"])
             self.selected_topic_id = None
-            self.load_topics()
-            self.notes_list.delete(0, tk.END)
-
-    def on_topic_select(self, event):
-        if not self.topic_list.curselection():
-            return
-        idx = self.topic_list.curselection()[0]
-        self.selected_topic_id = self.topics[idx]["id"]
+            self.notes_list.clear()
+            self.transcript.reset()
+
+    def on_topic_select(self, topic):
+        if topic["id"] != self.selected_topic_id:
+            self.save_note()
+            # answers for the topic we leave are no longer shown, but still finish and are saved
+            self.tutor_worker.detach_topic(self.selected_topic_id)
+            self.tutor_streams = [s for s in self.tutor_streams
+                                  if s["topic_id"] != self.selected_topic_id]
+            self.stop_typing_animation()
+            self.selected_note = None
+            self.selected_topic_id = topic["id"]
+            self.load_transcript()
         self.load_notes()
 
     def load_notes(self):
-        self.notes = list(get_notes_by_topic(self.selected_topic_id))
-        self.render_notes(self.notes)
-
-    def render_notes(self, notes):
-        self.notes_list.delete(0, tk.END)
-        for n in notes:
-            self.notes_list.insert(tk.END, n["title"])
+        self.filter_notes()
 
+    @timed("ui_seconds", op="load_notes")
     def filter_notes(self):
-        text = self.search_var.get().lower()
-        filtered = [n for n in self.notes if text in n["title"].lower()]
-        self.render_notes(filtered)
+        if not self.selected_topic_id:
+            return
+        text = self.search_var.get().strip()
+        if text:
+            # ranked full-text hits, debounced and fetched off the UI thread
+            self.search.set_query(text, self.selected_topic_id)
+            return
+        self.search.cancel()
+        # titles only; a note's content is loaded when it is selected
+        self.notes_list.load(note_pages(self.selected_topic_id))
+        if self.selected_note_id is not None:
+            self.notes_list.select(self.selected_note_id)
+
+    def on_search_results(self, rows, first, done):
+        if first:
+            self.notes_list.show(rows)
+            if self.selected_note_id is not None:
+                self.notes_list.select(self.selected_note_id)
+        else:
+            self.notes_list.append_rows(rows)
 
-    def on_note_select(self, event):
-        if not self.notes_list.curselection():
+    def on_note_select(self, row):
+        # keep the edits of the note we leave before the editor is refilled
+        self.save_note()
+        note = self.writes.get_note(row["id"])
+        if note is None:
             return
-        idx = self.notes_list.curselection()[0]
-        note = self.notes[idx]
+        self.selected_note = note
         self.selected_note_id = note["id"]
         self.note_title.delete(0, tk.END)
         self.note_title.insert(0, note["title"])
         self.note_content.delete("1.0", tk.END)
-        self.note_content.insert("1.0", note["content"])
+        self.note_content.insert("1.0", note["content"] or "")
 
     def add_note(self):
         if not self.selected_topic_id:
             return
-        create_note(self.selected_topic_id, "New Note", "")
-        self.load_notes()
+        note_id = self.writes.create(self.selected_topic_id, "New Note", "")
+        note = self.writes.get_note(note_id)
+        self.notes_list.insert_row(list_row(note))
+
+    def cancel_autosave(self):
+        if self.autosave_job:
+            self.root.after_cancel(self.autosave_job)
+            self.autosave_job = None
+
+    def schedule_autosave(self):
+        self.cancel_autosave()
+        self.autosave_job = self.root.after(AUTOSAVE_MS, self.save_note)
+
+    def on_content_modified(self, event):
+        # <<Modified>> fires once until the flag is reset
+        if self.note_content.edit_modified():
+            self.note_content.edit_modified(False)
+            self.schedule_autosave()
 
     def save_note(self):
-        if not self.selected_note_id:
+        self.cancel_autosave()
+        if not self.selected_note_id or self.selected_note is None:
             return
         title = self.note_title.get()
         content = self.note_content.get("1.0", tk.END).strip()
-        update_note(self.selected_note_id, title, content)
-        self.load_notes()
+        if (title, content) == (self.selected_note["title"], self.selected_note["content"] or ""):
+            return
+        # buffered; the write-behind queue batches it into its next flush
+        self.writes.update(self.selected_note_id, title, content, self.selected_note.get("version"),
+                           self.selected_note.get("topic_id"))
+        self.selected_note = {**self.selected_note, "title": title, "content": content}
+        # patch the one row in place instead of reloading the topic
+        self.notes_list.update_row(list_row(self.selected_note))
+
+    def on_note_conflict(self, note_id, copy_id):
+        # another instance saved or deleted this note first; our edit was kept as a separate note
+        deleted = self.writes.get_note(note_id) is None
+        if deleted:
+            self.notes_list.remove_row(note_id)
+            if note_id == self.selected_note_id:
+                self.selected_note_id = None
+                self.selected_note = None
+                self.note_title.delete(0, tk.END)
+                self.note_content.delete("1.0", tk.END)
+        what = "deleted" if deleted else "saved"
+        copy = self.writes.get_note(copy_id) if copy_id is not None else None
+        if copy is None:
+            messagebox.showwarning(
+                "Note changed elsewhere",
+                f"This note was {what} by another window first, and your edit could not be kept."
+            )
+            return
+        if copy["topic_id"] == self.selected_topic_id:
+            self.notes_list.insert_row(list_row(copy))
+        if note_id == self.selected_note_id:
+            self.selected_note = None
+            self.notes_list.select(note_id, notify=True)
+        messagebox.showwarning(
+            "Note changed elsewhere",
+            f"This note was {what} by another window first. Your version was kept as \"{copy['title']}\"."
+        )
+
+    def save_note_now(self):
+        self.save_note()
+        self.writes.flush()
 
     def delete_note_action(self):
         if not self.selected_note_id:
             return
-        delete_note(self.selected_note_id)
+        self.cancel_autosave()
+        self.writes.delete(self.selected_note_id)
+        self.notes_list.remove_row(self.selected_note_id)
         self.selected_note_id = None
-        self.load_notes()
+        self.selected_note = None
         self.note_title.delete(0, tk.END)
         self.note_content.delete("1.0", tk.END)
 
 
+# ============================================================
+# LIST SOURCES (VirtualList fetch_page callbacks)
+# ============================================================
+def chat_row(message):
+    return {"id": message["id"], "sender": message["role"],
+            "text": format_chat_message(message["role"], message["content"])}
+
+
+def format_chat_message(role, content):
+    if role == "user":
+        return f"👤 You:\n{content}"
+    return f"🤖 Tutor:\n{content}"
+
+
+def list_row(note):
+    return {"id": note["id"], "title": note["title"], "created_at": note["created_at"]}
+
+
+def topic_pages(cursor, limit):
+    rows = list_topics(before_id=cursor, limit=limit)
+    return rows, (rows[-1]["id"] if len(rows) == limit else None)
+
+
+def note_pages(topic_id):
+    def fetch(cursor, limit):
+        rows = list_notes(topic_id, before_id=cursor, limit=limit)
+        return rows, (rows[-1]["id"] if len(rows) == limit else None)
+    return fetch
+
+
 # ============================================================
 # POPUP INPUT
 # ============================================================
@@ -466,6 +607,8 @@ def simple_input(title, prompt, default=""):
 # ============================================================
 if __name__ == "__main__":
     init_db()
+    migrate_chat_history_json(CHAT_DB_PATH)
+    start_exporters()
     root = tk.Tk()
     NotesApp(root)
     root.mainloop()
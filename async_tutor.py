@@ -0,0 +1,130 @@
+import asyncio
+import random
+import time
+
+from response_cache import cache_key
+
+MAX_CONCURRENCY = 4
+REQUESTS_PER_SECOND = 3.0
+BURST = 5
+MAX_RETRIES = 4
+BASE_DELAY = 0.5
+MAX_DELAY = 8.0
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _retryable(error):
+    import openai
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class AsyncTutorEngine:
+    """Asyncio tutor client built on AsyncOpenAI.
+
+    Upstream calls are limited by a semaphore (concurrent requests) and a
+    token bucket (request rate), and retried with exponential backoff and
+    jitter on 429 and 5xx responses, honouring Retry-After when present.
+    Identical in-flight requests (same messages and sampling params) are
+    coalesced onto a single upstream call.
+    """
+
+    def __init__(self, client=None, max_concurrency=MAX_CONCURRENCY,
+                 requests_per_second=REQUESTS_PER_SECOND, burst=BURST,
+                 max_retries=MAX_RETRIES, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+        self._client = client
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.upstream_calls = 0
+        self._inflight = {}
+
+    @classmethod
+    def from_settings(cls, settings, client=None):
+        return cls(client=client,
+                   max_concurrency=settings.get("max_concurrent_requests", MAX_CONCURRENCY),
+                   requests_per_second=settings.get("requests_per_second", REQUESTS_PER_SECOND))
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import AsyncOpenAI
+            # retries are ours, so the SDK's own must stay off
+            self._client = AsyncOpenAI(max_retries=0)
+        return self._client
+
+    async def complete(self, messages, model, temperature, max_tokens):
+        """Return the completion text, sharing one upstream call between identical requests."""
+        key = cache_key(messages, model, temperature, max_tokens)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._complete(messages, model, temperature, max_tokens))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: one caller giving up must not cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def _complete(self, messages, model, temperature, max_tokens):
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            async with self.semaphore:
+                self.upstream_calls += 1
+                try:
+                    response = await self.client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens
+                    )
+                    return response.choices[0].message.content
+                except Exception as e:
+                    if attempt == self.max_retries or not _retryable(e):
+                        raise
+                    delay = self._backoff(attempt, e)
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt, error):
+        retry_after = error.response.headers.get("retry-after")
+        try:
+            return min(float(retry_after), self.max_delay)
+        except (TypeError, ValueError):
+            delay = min(self.base_delay * 2 ** attempt, self.max_delay)
+            return delay / 2 + random.uniform(0, delay / 2)
+
+    async def ask(self, topic_id, selected_note_content, question, settings, selected_note_id=None):
+        """Async counterpart of ai_tutor.ask_tutor (history and prompt handling included)."""
+        from ai_tutor import build_messages, save_chat_turn
+        messages = await asyncio.to_thread(build_messages, topic_id, selected_note_content, question, settings,
+                                           selected_note_id)
+        answer = await self.complete(
+            messages,
+            settings.get("model", "gpt-4.1-mini"),
+            settings.get("temperature", 0.5),
+            settings.get("max_tokens", 300)
+        )
+        await asyncio.to_thread(save_chat_turn, topic_id, question, answer)
+        return answer
@@ -0,0 +1,133 @@
+"""Compression benchmark: the storage and I/O savings against the CPU cost.
+
+    python -m benchmarks.compression [--notes 5000] [--codecs off zlib zstd] [--out compression.json]
+
+For each codec the same seeded corpus of long notes (2-8 KB bodies, above
+compression.THRESHOLD) is imported into a fresh database, and the run
+reports the database size and min / median / p95 ms for:
+
+  * import: writing the whole corpus (compression CPU vs. fewer pages);
+  * get_note: reading random single notes (decompression on every read);
+  * export_scan: streaming every body through iter_notes() from a freshly
+    opened connection, i.e. a page-cache-cold scan;
+  * list_notes_page / search: listings and FTS hits, which should not
+    depend on the codec at all.
+
+zstd is skipped when the zstandard package is missing. The output and
+--baseline check match benchmarks.run.
+"""
+import argparse
+import json
+import platform
+import random
+import sqlite3
+import sys
+from pathlib import Path
+
+import compression
+import db
+from benchmarks.run import SEED, THRESHOLD, WORKDIR, compare, measure, note_records
+
+
+def long_records(n, seed=SEED):
+    """n records whose bodies join 8-30 of benchmarks.run's short ones."""
+    rng = random.Random(seed)
+    short = note_records(n * 30, seed=seed)
+    for record in note_records(n, seed=seed + 1):
+        parts = [next(short)["content"] for _ in range(rng.randint(8, 30))]
+        yield {**record, "content": "\n\n".join(parts)}
+
+
+def available(codec):
+    if codec != "zstd":
+        return True
+    try:
+        compression._zstd_module()
+    except ImportError:
+        return False
+    return True
+
+
+def run_codec(codec, n, workdir):
+    compression.configure(codec=codec)
+    path = Path(workdir) / f"compression-{codec}.db"
+    rng = random.Random(SEED)
+    results = {}
+
+    def bench(name, fn, repeat):
+        results[name] = measure(fn, repeat)
+        print(f"  {name:<16} median {results[name]['median_ms']:>10.3f} ms", file=sys.stderr)
+
+    def fresh_import():
+        db.close_conn()
+        for stale in Path(workdir).glob(path.name + "*"):
+            stale.unlink()
+        db.DB_PATH = path
+        db.init_db()
+        db.import_notes(long_records(n))
+        db.get_conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    bench("import", fresh_import, 3)
+    size = path.stat().st_size
+    print(f"  {'db_bytes':<16} {size:>17,}", file=sys.stderr)
+
+    def scan():
+        db.close_conn()
+        for _ in db.iter_notes():
+            pass
+
+    topics = [r["id"] for r in db.list_topics(limit=1000)]
+    bench("get_note", lambda: db.get_note(rng.randint(1, n)), 500)
+    bench("export_scan", scan, 5)
+    bench("list_notes_page", lambda: db.list_notes(rng.choice(topics), limit=200), 200)
+    word = db.get_note(n // 2)["content"].split()[0]
+    bench("search", lambda: db.search_notes(word, limit=20), 50)
+    db.close_conn()
+    return results, size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=5000)
+    parser.add_argument("--codecs", nargs="+", default=["off", "zlib", "zstd"])
+    parser.add_argument("--workdir", type=Path, default=WORKDIR)
+    parser.add_argument("--out", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args(argv)
+
+    args.workdir.mkdir(parents=True, exist_ok=True)
+    previous = compression._codec
+    results, sizes = {}, {}
+    try:
+        for codec in args.codecs:
+            if not available(codec):
+                print(f"{codec}: not installed, skipped", file=sys.stderr)
+                continue
+            print(codec, file=sys.stderr)
+            results[codec], sizes[codec] = run_codec(codec, args.notes, args.workdir)
+    finally:
+        compression.configure(codec=previous)
+
+    report = {
+        "meta": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                 "notes": args.notes, "db_bytes": sizes},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
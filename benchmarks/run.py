@@ -0,0 +1,260 @@
+"""Benchmarks for the db, search, chat history and prompt-building hot paths.
+
+    python -m benchmarks.run                              # 1k and 100k notes
+    python -m benchmarks.run --sizes 1000 100000 1000000
+    python -m benchmarks.run --out results.json --baseline baseline.json
+
+Synthetic corpora (deterministic, seeded) are generated once per size into
+--workdir and reused by later runs. Every benchmark reports min / median /
+p95 in milliseconds; results are written as JSON. With --baseline the run
+exits 1 when a median is more than --threshold (relative) slower than the
+baseline's. The tutor runs against a local stub instead of the OpenAI API.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from itertools import accumulate
+from pathlib import Path
+from types import SimpleNamespace
+
+import db
+
+DEFAULT_SIZES = [1000, 100000]
+WORKDIR = Path("benchmarks/.corpora")
+THRESHOLD = 0.25
+# medians closer than this to the baseline are noise, whatever the ratio
+MIN_DELTA_MS = 0.05
+
+NOTES_PER_TOPIC = 200
+HISTORY_MESSAGES = 20000
+VOCABULARY = 5000
+SEED = 1234
+# a benchmark stops repeating after this many seconds (but runs at least MIN_REPEAT times)
+TIME_BUDGET_S = 3.0
+MIN_REPEAT = 3
+
+
+# ---------------------------
+# Synthetic data
+# ---------------------------
+
+def vocabulary(rng, size=VOCABULARY):
+    syllables = ["ba", "ce", "di", "fo", "gu", "la", "me", "ni", "po", "ru", "sa", "te", "vi", "zo", "ma", "ri"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def note_records(n, seed=SEED):
+    """n note records spread over n / NOTES_PER_TOPIC topics, Zipf-ish word frequencies."""
+    rng = random.Random(seed)
+    words = vocabulary(rng)
+    # cumulative, so choices() doesn't re-add VOCABULARY weights per call
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(words))))
+    topics = max(1, n // NOTES_PER_TOPIC)
+    for i in range(n):
+        yield {
+            "topic": f"Topic {i % topics}",
+            "topic_description": "Synthetic benchmark topic.",
+            "title": " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(2, 6))),
+            "content": " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(20, 120))),
+        }
+
+
+def chat_history(n, seed=SEED):
+    rng = random.Random(seed)
+    words = vocabulary(rng)
+    for i in range(n):
+        yield {"role": "user" if i % 2 == 0 else "assistant",
+               "content": " ".join(rng.choices(words, k=rng.randint(10, 80)))}
+
+
+def ensure_corpus(size, workdir):
+    """Point db.py at the corpus of this size, generating it on first use."""
+    path = Path(workdir) / f"corpus-{size}.db"
+    db.close_conn()
+    db.DB_PATH = path
+    if path.exists():
+        return path
+    tmp = path.with_name(path.name + ".partial")
+    for stale in tmp.parent.glob(tmp.name + "*"):
+        stale.unlink()
+    db.DB_PATH = tmp
+    db.init_db()
+    db.import_notes(note_records(size))
+    history = list(chat_history(HISTORY_MESSAGES))
+    for start in range(0, len(history), 1000):
+        db.add_chat_messages(1, history[start:start + 1000])
+    db.get_conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    db.close_conn()
+    tmp.rename(path)
+    db.DB_PATH = path
+    return path
+
+
+# ---------------------------
+# Local LLM stub
+# ---------------------------
+
+class StubLLM:
+    """Answers every chat.completions.create() call instantly with canned text."""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=self)
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(content="Răspuns de test. " * 20)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)],
+                               usage=SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0))
+
+
+def stub_tutor(workdir):
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark-stub")
+    import ai_tutor
+    from response_cache import ResponseCache
+    ai_tutor.client = StubLLM()
+    ai_tutor.response_cache = ResponseCache(path=Path(workdir) / "tutor_cache.db")
+    ai_tutor._history_migrated = True
+    return ai_tutor
+
+
+# ---------------------------
+# Harness
+# ---------------------------
+
+def measure(fn, repeat, warmup=1, budget=TIME_BUDGET_S):
+    for _ in range(warmup):
+        fn()
+    times = []
+    deadline = time.perf_counter() + budget
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+        if len(times) >= MIN_REPEAT and time.perf_counter() > deadline:
+            break
+    times.sort()
+    return {
+        "repeat": len(times),
+        "min_ms": round(times[0], 4),
+        "median_ms": round(statistics.median(times), 4),
+        "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))], 4),
+    }
+
+
+def run_size(size, workdir, rng):
+    ensure_corpus(size, workdir)
+    tutor = stub_tutor(workdir)
+    conn = db.get_conn()
+    topics = [r["id"] for r in conn.execute("SELECT id FROM topics")]
+    sample = db.get_note(max(1, size // 2))
+    title_word = sample["title"].split()[-1]
+    content_word = sample["content"].split()[0]
+    settings = {"language": "RO", "depth": "medium", "model": "stub", "temperature": 0.5,
+                "max_tokens": 300, "context_token_budget": 2000, "rag_top_k": 0,
+                "cache_responses": False}
+
+    results = {}
+
+    def bench(name, fn, repeat):
+        results[name] = measure(fn, repeat)
+        print(f"  {name:<28} median {results[name]['median_ms']:>10.3f} ms", file=sys.stderr)
+
+    bench("get_notes_by_topic", lambda: db.get_notes_by_topic(rng.choice(topics)), 50)
+    bench("list_notes_page", lambda: db.list_notes(rng.choice(topics), limit=200), 200)
+    bench("list_topics_page", lambda: db.list_topics(limit=200), 200)
+    bench("search_title_word", lambda: db.search_notes(title_word), 50)
+    bench("search_content_word", lambda: db.search_notes(content_word), 50)
+    bench("search_prefix_in_topic", lambda: db.search_notes(title_word[:2], topic_id=topics[0]), 50)
+    bench("load_chat_history_full", lambda: tutor.load_chat_history(1), 10)
+    bench("load_chat_history_window", lambda: tutor.load_chat_history(1, limit=50), 200)
+    bench("topic_context_cold", lambda: (tutor.topic_contexts.clear(), tutor.topic_contexts.get(topics[0])), 200)
+    bench("build_prompt", lambda: tutor.build_prompt(tutor.topic_contexts.get(topics[0]), settings), 500)
+    bench("build_messages", lambda: tutor.build_messages(1, sample["content"], "Ce este?", settings), 50)
+    bench("ask_tutor_stub", lambda: tutor.ask_tutor(topics[-1], sample["content"], "Ce este?", settings), 50)
+    bench("save_chat_turn", lambda: tutor.save_chat_turn(topics[-1], "intrebare", "raspuns"), 200)
+
+    created = []
+    bench("create_note", lambda: created.append(db.create_note(topics[0], "bench", "bench note")), 200)
+    # leave the corpus as generated for the next run
+    with db.transaction() as c:
+        c.executemany("DELETE FROM notes WHERE id = ?", [(i,) for i in created])
+        c.execute("DELETE FROM chat_messages WHERE topic_id = ?", (topics[-1],))
+        c.execute("DELETE FROM chat_summaries")
+
+    def bulk_import():
+        db.close_conn()
+        db.DB_PATH = Path(workdir) / "import.db"
+        for stale in Path(workdir).glob("import.db*"):
+            stale.unlink()
+        db.init_db()
+        db.import_notes(note_records(10000, seed=size))
+        db.close_conn()
+
+    bench("import_notes_10k", bulk_import, 3)
+    db.DB_PATH = Path(workdir) / f"corpus-{size}.db"
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Return a description of every benchmark whose median regressed past the threshold."""
+    regressions = []
+    for size, benches in results.items():
+        for name, stats in benches.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                continue
+            now, then = stats["median_ms"], base["median_ms"]
+            if now > then * (1 + threshold) and now - then > MIN_DELTA_MS:
+                regressions.append(f"{size}/{name}: {then:.3f} ms -> {now:.3f} ms")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--workdir", type=Path, default=WORKDIR)
+    parser.add_argument("--out", type=Path, help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", type=Path, help="results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args(argv)
+
+    args.workdir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(SEED)
+    results = {}
+    for size in args.sizes:
+        print(f"{size} notes", file=sys.stderr)
+        results[str(size)] = run_size(size, args.workdir, rng)
+    db.close_conn()
+
+    report = {
+        "meta": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                 "platform": platform.platform(), "created": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
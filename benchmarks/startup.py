@@ -0,0 +1,108 @@
+"""Startup benchmark: time to import the app and to its first interactive frame.
+
+    python -m benchmarks.startup [--repeat 5] [--out startup.json] [--baseline old.json]
+
+Each repeat starts a fresh interpreter in an empty data directory and
+reports, measured from process spawn:
+
+  * import_app: `import app` has finished;
+  * first_frame: the window has been mapped, the deferred topic load has
+    run and the event loop is idle again, i.e. the UI answers input.
+
+first_frame needs a display; without one only import_app is reported.
+The output and --baseline check match benchmarks.run.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.run import THRESHOLD, compare
+
+REPO = Path(__file__).resolve().parent.parent
+
+PROBE = r"""
+import json, time
+marks = {}
+import app
+marks["import_app"] = time.time()
+import tkinter as tk
+try:
+    root = tk.Tk()
+except tk.TclError:
+    print(json.dumps(marks))
+    raise SystemExit
+app.init_db()
+notes_app = app.NotesApp(root)
+load_topics = notes_app.load_topics
+
+def loaded():
+    load_topics()
+    root.after_idle(ready)
+
+def ready():
+    marks["first_frame"] = time.time()
+    print(json.dumps(marks))
+    root.destroy()
+
+notes_app.load_topics = loaded
+root.mainloop()
+"""
+
+
+def probe():
+    """Run one cold start; returns {mark: ms since spawn}."""
+    with tempfile.TemporaryDirectory() as cwd:
+        env = {**os.environ, "PYTHONPATH": str(REPO)}
+        env.pop("OPENAI_API_KEY", None)  # startup must not depend on it
+        start = time.time()
+        out = subprocess.run([sys.executable, "-c", PROBE], cwd=cwd, env=env, check=True,
+                             capture_output=True, text=True, timeout=60).stdout
+    marks = json.loads(out.strip().splitlines()[-1])
+    return {name: (at - start) * 1000 for name, at in marks.items()}
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "repeat": len(samples),
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(samples[len(samples) // 2], 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args(argv)
+
+    runs = [probe() for _ in range(args.repeat)]
+    results = {"startup": {name: summarize([r[name] for r in runs]) for name in runs[0]}}
+    for name, stats in results["startup"].items():
+        print(f"  {name:<12} median {stats['median_ms']:>10.3f} ms", file=sys.stderr)
+
+    text = json.dumps({"meta": {"python": sys.version.split()[0]}, "results": results}, indent=2)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""Bulk import and export of topics and notes.
+
+    python bulk_io.py import notes.jsonl
+    python bulk_io.py import notes.csv
+    python bulk_io.py import notes_dir/            # Markdown directory
+    python bulk_io.py export backup.jsonl [--topic 3]
+
+The format follows the file extension (.jsonl, .csv, a directory for
+Markdown) unless --format is given. Every format carries the same record:
+topic, topic_description, title, content, created_at.
+
+  * JSONL: one record object per line.
+  * CSV: a header row with those columns.
+  * Markdown: one subdirectory per topic holding one .md file per note,
+    "# <title>" on the first line and the content after it. An optional
+    _topic.md gives the topic name the same way (heading) and its
+    description (body); without it the directory name is the topic name.
+
+Input is read lazily and handed to db.import_notes(), which inserts it in
+one transaction; export streams rows from db.iter_notes().
+"""
+import argparse
+import csv
+import json
+import re
+import sys
+from itertools import chain, groupby
+from pathlib import Path
+
+import db
+
+FIELDS = ["topic", "topic_description", "title", "content", "created_at"]
+TOPIC_FILE = "_topic.md"
+
+# Note bodies can be far longer than csv's 128 KiB default field limit.
+csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+
+# ---------------------------
+# Readers
+# ---------------------------
+
+def read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_csv(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def _split_markdown(text, fallback_title):
+    """Return (title, body) from "# title" on the first line, else (fallback_title, text)."""
+    first, _, rest = text.partition("\n")
+    if first.startswith("# "):
+        return first[2:].strip(), rest.lstrip("\n")
+    return fallback_title, text
+
+
+def read_markdown(path):
+    for topic_dir in sorted(p for p in Path(path).iterdir() if p.is_dir()):
+        topic, description = topic_dir.name, ""
+        topic_file = topic_dir / TOPIC_FILE
+        if topic_file.exists():
+            topic, description = _split_markdown(topic_file.read_text(encoding="utf-8"), topic)
+        for note_file in sorted(topic_dir.glob("*.md")):
+            if note_file.name == TOPIC_FILE:
+                continue
+            title, content = _split_markdown(note_file.read_text(encoding="utf-8"), note_file.stem)
+            yield {"topic": topic, "topic_description": description.strip(),
+                   "title": title, "content": content}
+
+
+READERS = {"jsonl": read_jsonl, "csv": read_csv, "md": read_markdown}
+
+
+# ---------------------------
+# Writers
+# ---------------------------
+
+def _record(row):
+    return {field: row[field] for field in FIELDS}
+
+
+def write_jsonl(rows, path):
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(_record(row), ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def write_csv(rows, path):
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(_record(row))
+            count += 1
+    return count
+
+
+def _slug(text, limit=60):
+    slug = re.sub(r"[^\w\- ]+", "", text).strip().replace(" ", "-")
+    return slug[:limit] or "untitled"
+
+
+def write_markdown(rows, path):
+    root = Path(path)
+    root.mkdir(parents=True, exist_ok=True)
+    count = 0
+    # rows arrive ordered by topic, so each topic directory is written in one go
+    for topic_id, notes in groupby(rows, key=lambda r: r["topic_id"]):
+        first = next(notes)
+        topic_dir = root / f"{topic_id}-{_slug(first['topic'])}"
+        topic_dir.mkdir(exist_ok=True)
+        (topic_dir / TOPIC_FILE).write_text(
+            f"# {first['topic']}\n\n{first['topic_description'] or ''}", encoding="utf-8"
+        )
+        for i, row in enumerate(chain([first], notes), 1):
+            name = f"{i:06d}-{_slug(row['title'])}.md"
+            (topic_dir / name).write_text(f"# {row['title']}\n\n{row['content'] or ''}", encoding="utf-8")
+            count += 1
+    return count
+
+
+WRITERS = {"jsonl": write_jsonl, "csv": write_csv, "md": write_markdown}
+
+
+# ---------------------------
+# Commands
+# ---------------------------
+
+def detect_format(path):
+    path = Path(path)
+    if path.is_dir() or not path.suffix:
+        return "md"
+    suffix = path.suffix.lower().lstrip(".")
+    if suffix in ("jsonl", "ndjson"):
+        return "jsonl"
+    if suffix in READERS:
+        return suffix
+    raise ValueError(f"Cannot tell the format of {path}; pass --format.")
+
+
+def import_file(path, fmt=None, batch_size=db.BULK_BATCH_SIZE):
+    """Import every record of path; returns (topics_created, notes_imported)."""
+    fmt = fmt or detect_format(path)
+    return db.import_notes(READERS[fmt](path), batch_size=batch_size)
+
+
+def export_file(path, fmt=None, topic_id=None):
+    """Write every note (or one topic's notes) to path; returns the number written."""
+    fmt = fmt or detect_format(path)
+    return WRITERS[fmt](db.iter_notes(topic_id), path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import/export of topics and notes.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="load notes from a file or Markdown directory")
+    imp.add_argument("path")
+    imp.add_argument("--format", choices=sorted(READERS))
+    imp.add_argument("--batch-size", type=int, default=db.BULK_BATCH_SIZE)
+    exp = sub.add_parser("export", help="write notes to a file or Markdown directory")
+    exp.add_argument("path")
+    exp.add_argument("--format", choices=sorted(WRITERS))
+    exp.add_argument("--topic", type=int, help="only this topic id")
+    args = parser.parse_args(argv)
+
+    db.init_db()
+    if args.command == "import":
+        topics, notes = import_file(args.path, args.format, args.batch_size)
+        print(f"Imported {notes} notes ({topics} new topics).")
+    else:
+        count = export_file(args.path, args.format, args.topic)
+        print(f"Exported {count} notes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Transparent compression of large text payloads (note bodies, chat messages).
+
+encode() returns the text itself below THRESHOLD bytes, or when
+compressing would not save at least 10%; otherwise a BLOB whose first
+byte names the codec. decode() accepts either, so rows written before
+compression (TEXT) or with it off stay readable. Because stored TEXT is
+never compressed and BLOBs always are, the marker cannot be confused
+with user text.
+
+NOTES_COMPRESSION picks the codec for new writes: "zlib" (default),
+"zstd" (needs the zstandard package, falls back to zlib without it) or
+"off".
+"""
+import os
+import zlib
+
+THRESHOLD = 1024
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+ZLIB = b"z"
+ZSTD = b"s"
+
+_codec = os.environ.get("NOTES_COMPRESSION", "zlib").lower()
+_zstd = None
+
+
+def _zstd_module():
+    global _zstd
+    if _zstd is None:
+        import zstandard
+        _zstd = zstandard
+    return _zstd
+
+
+def configure(codec=None, threshold=None):
+    """Change the codec ("zlib", "zstd", "off") and/or threshold for new writes."""
+    global _codec, THRESHOLD
+    if codec is not None:
+        _codec = codec
+    if threshold is not None:
+        THRESHOLD = threshold
+
+
+def codec():
+    if _codec == "zstd":
+        try:
+            _zstd_module()
+        except ImportError:
+            return "zlib"
+    return _codec
+
+
+def encode(text):
+    """Storage form of text: the str itself, or a marker-prefixed compressed BLOB."""
+    if text is None or _codec == "off":
+        return text
+    raw = text.encode("utf-8")
+    if len(raw) < THRESHOLD:
+        return text
+    if codec() == "zstd":
+        packed = ZSTD + _zstd_module().ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    else:
+        packed = ZLIB + zlib.compress(raw, ZLIB_LEVEL)
+    return packed if len(packed) < len(raw) * 0.9 else text
+
+
+def decode(value):
+    """Inverse of encode(); registered as the note_text() SQL function by db.py."""
+    if not isinstance(value, bytes):
+        return value
+    marker, payload = value[:1], value[1:]
+    if marker == ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    if marker == ZSTD:
+        return _zstd_module().ZstdDecompressor().decompress(payload).decode("utf-8")
+    raise ValueError(f"unknown compression marker {marker!r}")
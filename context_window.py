@@ -0,0 +1,88 @@
+import db
+
+# Rough local token estimate: ~4 characters per token plus per-message framing.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Share of the budget kept for the rolling summary of older turns.
+SUMMARY_SHARE = 0.25
+
+PAGE_SIZE = 50
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def message_tokens(msg):
+    return estimate_tokens(msg["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def summary_message(content):
+    return {"role": "system", "content": f"Rezumatul conversației anterioare:\n{content}"}
+
+
+class ContextWindow:
+    """Keeps the newest turns of a topic within a token budget.
+
+    Turns that fall out of the window are folded into a per-topic summary
+    stored in chat_summaries. The summary is recomputed only when new
+    messages drop out, by calling summarize(previous_summary, dropped,
+    max_tokens, **options) with previous_summary possibly None and the
+    options given to build().
+    """
+
+    def __init__(self, summarize, page_size=PAGE_SIZE):
+        self.summarize = summarize
+        self.page_size = page_size
+
+    def build(self, topic_id, budget, **options):
+        """Return the history messages to send for topic_id, summary first."""
+        summary = db.get_chat_summary(topic_id)
+        upto_id = summary["upto_id"] if summary else 0
+        summary_budget = int(budget * SUMMARY_SHARE)
+
+        window, first_id = self._newest_within(topic_id, budget - summary_budget, upto_id)
+
+        # everything between the old summary and the window start has just dropped out
+        dropped = db.get_chat_messages(topic_id, before_id=first_id, after_id=upto_id)
+        if dropped:
+            content = self.summarize(
+                summary["content"] if summary else None,
+                [{"role": m["role"], "content": m["content"]} for m in dropped],
+                summary_budget,
+                **options
+            )
+            db.save_chat_summary(topic_id, dropped[-1]["id"], content)
+            summary = {"upto_id": dropped[-1]["id"], "content": content}
+
+        messages = [summary_message(summary["content"])] if summary else []
+        return messages + window
+
+    def _newest_within(self, topic_id, budget, upto_id):
+        """Newest messages after upto_id fitting in budget, and the id the window starts at."""
+        window = []
+        used = 0
+        before_id = None
+        while True:
+            page = db.get_chat_messages(
+                topic_id, limit=self.page_size, before_id=before_id, after_id=upto_id
+            )
+            for m in reversed(page):
+                cost = message_tokens(m)
+                if used + cost > budget:
+                    return self._trim(window)
+                used += cost
+                window.append(m)
+            if len(page) < self.page_size:
+                return self._trim(window)
+            before_id = page[0]["id"]
+
+    @staticmethod
+    def _trim(window):
+        window.reverse()
+        # never open the window with an answer whose question was dropped
+        while window and window[0]["role"] != "user":
+            window.pop(0)
+        first_id = window[0]["id"] if window else None
+        return [{"role": m["role"], "content": m["content"]} for m in window], first_id
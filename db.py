@@ -1,107 +1,877 @@
+import json
+import logging
+import os
+import random
+import re
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 
+import compression
+import deltas
+from instrumentation import timed
+
 DB_PATH = Path("data/topics.db")
 
-def get_conn():
-    DB_PATH.parent.mkdir(exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+# Connection tuning, applied once per connection in _connect().
+CACHE_SIZE_KB = 16 * 1024
+BUSY_TIMEOUT_MS = 5000
+# BEGIN IMMEDIATE is retried this many times when busy_timeout alone runs out
+BUSY_RETRIES = 5
+BUSY_BACKOFF_S = 0.05
+
+# Note revisions: a full snapshot at least every SNAPSHOT_EVERY revisions,
+# deltas in between; every COMPACT_EVERY versions old revisions are thinned
+# out, keeping the newest KEEP_RECENT and a log-spaced sample of the rest.
+SNAPSHOT_EVERY = 20
+COMPACT_EVERY = 50
+KEEP_RECENT = 20
+
+# Rows per executemany() batch in import_notes().
+BULK_BATCH_SIZE = 5000
+
+# Shortest search word matched as a prefix; notes_fts keeps prefix indexes
+# for 1-3 characters, so short prefixes don't scan every longer term.
+MIN_PREFIX_CHARS = 2
+
+_local = threading.local()
+_listeners = []
+log = logging.getLogger(__name__)
+
+
+class NoteConflict(Exception):
+    """update_note() was given an expected_version the note no longer has."""
+
+    def __init__(self, note_id, expected_version, current_version):
+        super().__init__(f"note {note_id} is at version {current_version}, not {expected_version}")
+        self.note_id = note_id
+        self.expected_version = expected_version
+        self.current_version = current_version
+
+# Note and chat message bodies may be stored compressed (see compression.py);
+# reads go through the note_text() SQL function registered in _connect().
+_NOTE_COLUMNS = "id, topic_id, title, note_text(content) AS content, created_at, version, updated_at"
+
+# Kept apart so import_notes() can drop it and index a whole batch at once.
+_NOTES_FTS_INSERT_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, title, content)
+        VALUES (new.id, new.title, note_text(new.content));
+    END
+"""
+
+
+# ---------------------------
+# Connection management
+# ---------------------------
+
+def _connect(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # isolation_level=None: autocommit for plain reads, explicit BEGIN in transaction()
+    conn = sqlite3.connect(path, isolation_level=None)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    # the FTS triggers and notes_plain call it, so every connection that writes notes needs it
+    conn.create_function("note_text", 1, compression.decode, deterministic=True)
     return conn
 
+
+def get_conn(path=None):
+    """Return the calling thread's connection to path (default DB_PATH), opening it on first use.
+
+    Connections are long-lived and keyed by (pid, path), so a forked worker
+    never reuses its parent's handle and pointing DB_PATH elsewhere (tests)
+    transparently opens a new one.
+    """
+    path = Path(path or DB_PATH)
+    key = (os.getpid(), str(path))
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(key)
+    if conn is None:
+        conn = conns[key] = _connect(path)
+    return conn
+
+
+def close_conn():
+    """Close every connection owned by the calling thread."""
+    conns = getattr(_local, "conns", {})
+    for key, conn in list(conns.items()):
+        if key[0] == os.getpid():
+            conn.close()
+        del conns[key]
+
+
+def _is_busy(error):
+    return getattr(error, "sqlite_errorcode", None) in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+
+def _begin(conn):
+    """BEGIN IMMEDIATE, retried with jittered backoff while another process holds the write lock."""
+    for attempt in range(BUSY_RETRIES + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if attempt == BUSY_RETRIES or not _is_busy(e):
+                raise
+            time.sleep(BUSY_BACKOFF_S * 2 ** attempt * random.uniform(0.5, 1.0))
+
+
+@contextmanager
+def transaction(path=None):
+    """Run the block in a single write transaction and yield a cursor.
+
+    Commits on success, rolls back on error. Nested calls join the
+    outermost transaction. The write lock is taken up front, so other
+    processes wait (busy_timeout, then _begin's retries) instead of
+    failing mid-transaction.
+    """
+    conn = get_conn(path)
+    if conn.in_transaction:
+        yield conn.cursor()
+        return
+    _begin(conn)
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+
+# ---------------------------
+# Change notifications
+# ---------------------------
+
+def add_listener(fn):
+    """Register fn(event, **ids), called after every committed topic/note change.
+
+    Events: topic_created/updated/deleted (topic_id),
+    note_created/updated/deleted (note_id, topic_id where known) and
+    notes_imported (first_id, last_id) once per import_notes() call.
+    """
+    _listeners.append(fn)
+
+def remove_listener(fn):
+    _listeners.remove(fn)
+
+def _notify(event, **ids):
+    for fn in list(_listeners):
+        fn(event, **ids)
+
+
+@timed("db_call_seconds", fn="init_db")
 def init_db():
-    conn = get_conn()
-    c = conn.cursor()
+    with transaction() as c:
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS topics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                description TEXT
+            )
+        """)
 
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS topics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            description TEXT
-        )
-    """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS notes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                content TEXT,
+                created_at TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 1,
+                updated_at TEXT,
+                FOREIGN KEY(topic_id) REFERENCES topics(id) ON DELETE CASCADE
+            )
+        """)
+        # databases created before notes were versioned
+        columns = {r["name"] for r in c.execute("PRAGMA table_info(notes)")}
+        if "version" not in columns:
+            c.execute("ALTER TABLE notes ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        if "updated_at" not in columns:
+            c.execute("ALTER TABLE notes ADD COLUMN updated_at TEXT")
 
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS notes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            topic_id INTEGER NOT NULL,
-            title TEXT NOT NULL,
-            content TEXT,
-            created_at TEXT NOT NULL,
-            FOREIGN KEY(topic_id) REFERENCES topics(id) ON DELETE CASCADE
-        )
-    """)
+        # Backs per-topic listings: WHERE topic_id=? AND id<? ORDER BY id DESC
+        c.execute("CREATE INDEX IF NOT EXISTS idx_notes_topic_id ON notes(topic_id, id)")
+
+        # Full-text index over notes, kept in sync by the triggers below. Its
+        # content table is a view with the bodies decompressed, so the index
+        # and snippet() see plain text.
+        c.execute("""
+            CREATE VIEW IF NOT EXISTS notes_plain AS
+            SELECT id, title, note_text(content) AS content FROM notes
+        """)
+        fts = c.execute(
+            "SELECT sql FROM sqlite_master WHERE type='table' AND name='notes_fts'"
+        ).fetchone()
+        has_fts = fts is not None and "notes_plain" in fts["sql"] and "prefix=" in fts["sql"]
+        if fts is not None and not has_fts:
+            # index from before compression (built straight on notes) or without
+            # prefix indexes; rebuilt below
+            for trigger in ("notes_fts_ai", "notes_fts_ad", "notes_fts_au"):
+                c.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            c.execute("DROP TABLE notes_fts")
+        c.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+                title, content,
+                content='notes_plain', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='1 2 3'
+            )
+        """)
+        c.execute(_NOTES_FTS_INSERT_TRIGGER)
+        c.execute("""
+            CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+                INSERT INTO notes_fts(notes_fts, rowid, title, content)
+                VALUES ('delete', old.id, old.title, note_text(old.content));
+            END
+        """)
+        c.execute("""
+            CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF title, content ON notes BEGIN
+                INSERT INTO notes_fts(notes_fts, rowid, title, content)
+                VALUES ('delete', old.id, old.title, note_text(old.content));
+                INSERT INTO notes_fts(rowid, title, content)
+                VALUES (new.id, new.title, note_text(new.content));
+            END
+        """)
+        if not has_fts:
+            # index notes written before the FTS table existed
+            c.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+
+        # Tutor conversation per topic, append-only.
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS chat_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic_id INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        """)
+        c.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chat_messages_topic
+            ON chat_messages(topic_id, id)
+        """)
+
+        # Past versions of notes; see the Note revisions section below.
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS note_revisions (
+                note_id INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                base_version INTEGER,
+                title TEXT NOT NULL,
+                data BLOB NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (note_id, version),
+                FOREIGN KEY(note_id) REFERENCES notes(id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        """)
 
-    conn.commit()
-    conn.close()
+        # Batch-generated study material (study_batch.py), for the note version in `version`.
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS note_summaries (
+                note_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL,
+                summary TEXT NOT NULL,
+                model TEXT,
+                created_at TEXT NOT NULL,
+                FOREIGN KEY(note_id) REFERENCES notes(id) ON DELETE CASCADE
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS note_flashcards (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                note_id INTEGER NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                FOREIGN KEY(note_id) REFERENCES notes(id) ON DELETE CASCADE
+            )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_note_flashcards_note ON note_flashcards(note_id, id)")
+
+        # Rolling summary of the messages up to upto_id that fell out of the context window.
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS chat_summaries (
+                topic_id INTEGER PRIMARY KEY,
+                upto_id INTEGER NOT NULL,
+                content TEXT NOT NULL
+            )
+        """)
 
 # ---------------------------
 # CRUD Topics
 # ---------------------------
 
+@timed("db_call_seconds", fn="create_topic")
 def create_topic(name, description=""):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("INSERT INTO topics (name, description) VALUES (?, ?)", (name, description))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute("INSERT INTO topics (name, description) VALUES (?, ?)", (name, description))
+        topic_id = c.lastrowid
+    _notify("topic_created", topic_id=topic_id)
+    return topic_id
 
+@timed("db_call_seconds", fn="get_topics")
 def get_topics():
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT * FROM topics ORDER BY id DESC")
-    rows = c.fetchall()
-    conn.close()
-    return rows
+    return get_conn().execute("SELECT * FROM topics ORDER BY id DESC").fetchall()
 
+@timed("db_call_seconds", fn="get_topic")
+def get_topic(topic_id):
+    return get_conn().execute("SELECT * FROM topics WHERE id=?", (topic_id,)).fetchone()
+
+@timed("db_call_seconds", fn="list_topics")
+def list_topics(before_id=None, limit=100):
+    """One page of topics, newest first; pass the last id seen as before_id for the next."""
+    if before_id is None:
+        sql, params = "SELECT id, name, description FROM topics ORDER BY id DESC LIMIT ?", (limit,)
+    else:
+        sql = "SELECT id, name, description FROM topics WHERE id < ? ORDER BY id DESC LIMIT ?"
+        params = (before_id, limit)
+    return get_conn().execute(sql, params).fetchall()
+
+@timed("db_call_seconds", fn="update_topic")
 def update_topic(topic_id, name, description):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("UPDATE topics SET name=?, description=? WHERE id=?", (name, description, topic_id))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute("UPDATE topics SET name=?, description=? WHERE id=?", (name, description, topic_id))
+    _notify("topic_updated", topic_id=topic_id)
 
+@timed("db_call_seconds", fn="delete_topic")
 def delete_topic(topic_id):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("DELETE FROM topics WHERE id=?", (topic_id,))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute("DELETE FROM chat_messages WHERE topic_id=?", (topic_id,))
+        c.execute("DELETE FROM chat_summaries WHERE topic_id=?", (topic_id,))
+        c.execute("DELETE FROM topics WHERE id=?", (topic_id,))
+    _notify("topic_deleted", topic_id=topic_id)
 
 # ---------------------------
 # CRUD Notes
 # ---------------------------
 
+@timed("db_call_seconds", fn="create_note")
 def create_note(topic_id, title, content):
-    conn = get_conn()
-    c = conn.cursor()
     created = datetime.now().isoformat()
-    c.execute("""
-        INSERT INTO notes (topic_id, title, content, created_at)
-        VALUES (?, ?, ?, ?)
-    """, (topic_id, title, content, created))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute("""
+            INSERT INTO notes (topic_id, title, content, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (topic_id, title, compression.encode(content), created, created))
+        note_id = c.lastrowid
+    _notify("note_created", note_id=note_id, topic_id=topic_id)
+    return note_id
 
+@timed("db_call_seconds", fn="get_note")
+def get_note(note_id):
+    return get_conn().execute(f"SELECT {_NOTE_COLUMNS} FROM notes WHERE id=?", (note_id,)).fetchone()
+
+@timed("db_call_seconds", fn="get_notes_by_topic")
 def get_notes_by_topic(topic_id):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT * FROM notes WHERE topic_id=? ORDER BY id DESC", (topic_id,))
-    rows = c.fetchall()
-    conn.close()
-    return rows
+    return get_conn().execute(
+        f"SELECT {_NOTE_COLUMNS} FROM notes WHERE topic_id=? ORDER BY id DESC", (topic_id,)
+    ).fetchall()
 
-def update_note(note_id, title, content):
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("UPDATE notes SET title=?, content=? WHERE id=?", (title, content, note_id))
-    conn.commit()
-    conn.close()
+@timed("db_call_seconds", fn="list_notes")
+def list_notes(topic_id, before_id=None, limit=100):
+    """One page of a topic's notes (id, title, created_at only), newest first.
+
+    Keyset-paginated: pass the last id seen as before_id for the next page.
+    """
+    if before_id is None:
+        sql = "SELECT id, title, created_at FROM notes WHERE topic_id=? ORDER BY id DESC LIMIT ?"
+        params = (topic_id, limit)
+    else:
+        sql = """
+            SELECT id, title, created_at FROM notes
+            WHERE topic_id=? AND id < ? ORDER BY id DESC LIMIT ?
+        """
+        params = (topic_id, before_id, limit)
+    return get_conn().execute(sql, params).fetchall()
 
+@timed("db_call_seconds", fn="update_note")
+def update_note(note_id, title, content, expected_version=None):
+    """Overwrite a note and return its new version.
+
+    With expected_version, the write only happens if the note is still at
+    that version (nobody saved it since it was read); otherwise raises
+    NoteConflict.
+    """
+    updated = datetime.now().isoformat()
+    with transaction() as c:
+        old = c.execute(f"SELECT {_NOTE_COLUMNS} FROM notes WHERE id=?", (note_id,)).fetchone()
+        if old is None:
+            return None
+        if expected_version is not None and old["version"] != expected_version:
+            raise NoteConflict(note_id, expected_version, old["version"])
+        c.execute("UPDATE notes SET title=?, content=?, version=?, updated_at=? WHERE id=?",
+                  (title, compression.encode(content), old["version"] + 1, updated, note_id))
+        _record_revision(c, old, title, content, updated)
+    _notify("note_updated", note_id=note_id)
+    return old["version"] + 1
+
+@timed("db_call_seconds", fn="update_notes")
+def update_notes(changes):
+    """Apply many (note_id, title, content, expected_version) updates in one transaction.
+
+    expected_version works as in update_note(), except that a conflicting
+    change is skipped rather than raised. Returns ({note_id: new_version}
+    for the notes written, [note_ids that conflicted], [note_ids that no
+    longer exist]).
+    """
+    updated = datetime.now().isoformat()
+    versions, conflicts, missing = {}, [], []
+    with transaction() as c:
+        for note_id, title, content, expected_version in changes:
+            old = c.execute(f"SELECT {_NOTE_COLUMNS} FROM notes WHERE id=?", (note_id,)).fetchone()
+            if old is None:
+                missing.append(note_id)
+                continue
+            if expected_version is not None and old["version"] != expected_version:
+                conflicts.append(note_id)
+                continue
+            c.execute("UPDATE notes SET title=?, content=?, version=?, updated_at=? WHERE id=?",
+                      (title, compression.encode(content), old["version"] + 1, updated, note_id))
+            _record_revision(c, old, title, content, updated)
+            versions[note_id] = old["version"] + 1
+    for note_id in versions:
+        _notify("note_updated", note_id=note_id)
+    return versions, conflicts, missing
+
+@timed("db_call_seconds", fn="delete_note")
 def delete_note(note_id):
+    with transaction() as c:
+        c.execute("DELETE FROM notes WHERE id=?", (note_id,))
+    _notify("note_deleted", note_id=note_id)
+
+# ---------------------------
+# Note revisions
+# ---------------------------
+# Revisions are written by update_note()/update_notes() in the same
+# transaction as the note. The first update of a note also stores the
+# version it replaces, so a note that was never edited has no revisions.
+# A "full" revision holds the zlib-compressed text; a "delta" holds a
+# deltas.make_delta() from the revision at base_version, which is always
+# the note's previous stored revision. Reading any version applies at most
+# SNAPSHOT_EVERY deltas to the nearest full revision before it.
+
+def _record_revision(c, old, title, content, created):
+    note_id, version = old["id"], old["version"] + 1
+    last = c.execute(
+        "SELECT MAX(version) FROM note_revisions WHERE note_id=?", (note_id,)
+    ).fetchone()[0]
+    if last != old["version"]:
+        # history starts here, or the note was saved by code that kept none
+        c.execute("""
+            INSERT OR REPLACE INTO note_revisions (note_id, version, kind, base_version, title, data, created_at)
+            VALUES (?, ?, 'full', NULL, ?, ?, ?)
+        """, (note_id, old["version"], old["title"], deltas.pack(old["content"] or ""),
+              old["updated_at"] or old["created_at"]))
+    _store_revision(c, note_id, version, old["version"], old["content"] or "", title, content or "", created)
+    if version % COMPACT_EVERY == 0:
+        _compact_revisions(c, note_id, KEEP_RECENT)
+
+def _store_revision(c, note_id, version, base_version, base_content, title, content, created):
+    since_full = c.execute("""
+        SELECT COUNT(*) FROM note_revisions
+        WHERE note_id=? AND version > (
+            SELECT MAX(version) FROM note_revisions WHERE note_id=? AND kind='full'
+        )
+    """, (note_id, note_id)).fetchone()[0]
+    full = deltas.pack(content)
+    delta = deltas.make_delta(base_content, content) if base_content is not None else None
+    # a delta that is not clearly smaller than the text isn't worth the replay cost
+    if delta is None or since_full + 1 >= SNAPSHOT_EVERY or len(delta) * 2 > len(full):
+        kind, base_version, data = "full", None, full
+    else:
+        kind, data = "delta", delta
+    c.execute("""
+        INSERT OR REPLACE INTO note_revisions (note_id, version, kind, base_version, title, data, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (note_id, version, kind, base_version, title, data, created))
+
+def _revision_content(c, note_id, version):
+    rows = c.execute("""
+        SELECT version, kind, data FROM note_revisions
+        WHERE note_id=? AND version <= ? AND version >= (
+            SELECT MAX(version) FROM note_revisions WHERE note_id=? AND version <= ? AND kind='full'
+        )
+        ORDER BY version
+    """, (note_id, version, note_id, version)).fetchall()
+    if not rows or rows[-1]["version"] != version:
+        return None
+    content = deltas.unpack(rows[0]["data"])
+    for row in rows[1:]:
+        content = deltas.apply_delta(content, row["data"])
+    return content
+
+def _thin(versions, keep_recent):
+    """Versions to keep: the first, the newest keep_recent, and the newest of each
+    power-of-two age bucket among the rest."""
+    versions = sorted(versions)
+    newest = versions[-1]
+    # not versions[-keep_recent:], which is every version when keep_recent is 0
+    split = max(len(versions) - keep_recent, 0)
+    keep = set(versions[split:]) | {versions[0]}
+    buckets = {}
+    for v in versions[:split]:
+        # ascending order, so the last write per bucket is its newest version
+        buckets[(newest - v).bit_length()] = v
+    return sorted(keep | set(buckets.values()))
+
+def _compact_revisions(c, note_id, keep_recent):
+    rows = c.execute(
+        "SELECT version, title, created_at FROM note_revisions WHERE note_id=? ORDER BY version", (note_id,)
+    ).fetchall()
+    if not rows:
+        return  # never edited, or no such note
+    keep = _thin([r["version"] for r in rows], keep_recent)
+    if len(keep) == len(rows):
+        return
+    meta = {r["version"]: r for r in rows}
+    # materialize the kept versions walking the chain once, then re-encode them
+    contents = {}
+    content = None
+    for row in c.execute(
+            "SELECT version, kind, data FROM note_revisions WHERE note_id=? ORDER BY version", (note_id,)):
+        content = deltas.unpack(row["data"]) if row["kind"] == "full" else deltas.apply_delta(content, row["data"])
+        if row["version"] in keep:
+            contents[row["version"]] = content
+    c.execute("DELETE FROM note_revisions WHERE note_id=?", (note_id,))
+    previous = None
+    for version in keep:
+        base_version, base_content = previous if previous else (None, None)
+        _store_revision(c, note_id, version, base_version, base_content, meta[version]["title"],
+                        contents[version], meta[version]["created_at"])
+        previous = (version, contents[version])
+
+@timed("db_call_seconds", fn="list_note_revisions")
+def list_note_revisions(note_id):
+    """A note's stored revisions, newest first: version, title, created_at, kind, size (bytes)."""
+    return get_conn().execute("""
+        SELECT version, title, created_at, kind, length(data) AS size FROM note_revisions
+        WHERE note_id=? ORDER BY version DESC
+    """, (note_id,)).fetchall()
+
+@timed("db_call_seconds", fn="get_note_revision")
+def get_note_revision(note_id, version):
+    """{version, title, content, created_at} of one stored revision, or None."""
     conn = get_conn()
-    c = conn.cursor()
-    c.execute("DELETE FROM notes WHERE id=?", (note_id,))
-    conn.commit()
-    conn.close()
+    row = conn.execute(
+        "SELECT title, created_at FROM note_revisions WHERE note_id=? AND version=?", (note_id, version)
+    ).fetchone()
+    if row is None:
+        return None
+    return {"version": version, "title": row["title"], "created_at": row["created_at"],
+            "content": _revision_content(conn, note_id, version)}
+
+@timed("db_call_seconds", fn="compact_note_revisions")
+def compact_note_revisions(note_id, keep_recent=KEEP_RECENT):
+    """Thin out old revisions now (update_note() also does it every COMPACT_EVERY versions)."""
+    if keep_recent < 0:
+        raise ValueError("keep_recent must not be negative")
+    with transaction() as c:
+        _compact_revisions(c, note_id, keep_recent)
+
+# ---------------------------
+# Bulk import / export
+# ---------------------------
+
+@timed("db_call_seconds", fn="import_notes")
+def import_notes(records, batch_size=BULK_BATCH_SIZE):
+    """Insert notes from an iterable of dicts in a single transaction.
+
+    Each record has topic (name), title and content, and optionally
+    topic_description and created_at. Topics are matched by name and
+    created when missing. records is consumed lazily, batch_size rows per
+    executemany(); the FTS insert trigger is dropped for the duration and
+    the new rows are indexed in one statement at the end. Listeners get a
+    single notes_imported event instead of one note_created per row.
+    Returns (topics_created, notes_imported).
+    """
+    created = datetime.now().isoformat()
+    new_topics = []
+    count = 0
+    with transaction() as c:
+        topic_ids = {r["name"]: r["id"] for r in c.execute("SELECT id, name FROM topics ORDER BY id DESC")}
+        first_id = c.execute("SELECT COALESCE(MAX(id), 0) FROM notes").fetchone()[0] + 1
+        c.execute("DROP TRIGGER IF EXISTS notes_fts_ai")
+
+        batch = []
+        for record in records:
+            name = record["topic"]
+            topic_id = topic_ids.get(name)
+            if topic_id is None:
+                c.execute("INSERT INTO topics (name, description) VALUES (?, ?)",
+                          (name, record.get("topic_description") or ""))
+                topic_id = topic_ids[name] = c.lastrowid
+                new_topics.append(topic_id)
+            note_created = record.get("created_at") or created
+            batch.append((topic_id, record.get("title") or "New Note",
+                          compression.encode(record.get("content") or ""), note_created, note_created))
+            if len(batch) >= batch_size:
+                c.executemany(
+                    "INSERT INTO notes (topic_id, title, content, created_at, updated_at) VALUES (?, ?, ?, ?, ?)", batch
+                )
+                count += len(batch)
+                batch = []
+        if batch:
+            c.executemany(
+                "INSERT INTO notes (topic_id, title, content, created_at, updated_at) VALUES (?, ?, ?, ?, ?)", batch
+            )
+            count += len(batch)
+
+        c.execute("""
+            INSERT INTO notes_fts(rowid, title, content)
+            SELECT id, title, content FROM notes_plain WHERE id >= ?
+        """, (first_id,))
+        c.execute(_NOTES_FTS_INSERT_TRIGGER)
+        last_id = c.execute("SELECT COALESCE(MAX(id), 0) FROM notes").fetchone()[0]
+
+    for topic_id in new_topics:
+        _notify("topic_created", topic_id=topic_id)
+    if count:
+        _notify("notes_imported", first_id=first_id, last_id=last_id)
+    return len(new_topics), count
+
+@timed("db_call_seconds", fn="compress_stored_notes")
+def compress_stored_notes(batch_size=BULK_BATCH_SIZE):
+    """Re-encode note bodies stored as plain text by earlier versions or with
+    compression off; returns how many were compressed.
+
+    A storage-only change: versions, revisions and listeners are untouched.
+    """
+    count = 0
+    last_id = 0
+    while True:
+        with transaction() as c:
+            rows = c.execute("""
+                SELECT id, content FROM notes
+                WHERE id > ? AND typeof(content) = 'text' AND length(CAST(content AS BLOB)) >= ?
+                ORDER BY id LIMIT ?
+            """, (last_id, compression.THRESHOLD, batch_size)).fetchall()
+            if not rows:
+                return count
+            last_id = rows[-1]["id"]
+            encoded = [(compression.encode(r["content"]), r["id"]) for r in rows]
+            encoded = [e for e in encoded if isinstance(e[0], bytes)]
+            c.executemany("UPDATE notes SET content=? WHERE id=?", encoded)
+            count += len(encoded)
+
+def iter_notes(topic_id=None):
+    """Yield every note joined with its topic name and description, topic by topic.
+
+    Rows are streamed from the cursor rather than fetched all at once.
+    """
+    sql = """
+        SELECT t.id AS topic_id, t.name AS topic, t.description AS topic_description,
+               n.id, n.title, note_text(n.content) AS content, n.created_at
+        FROM notes n JOIN topics t ON t.id = n.topic_id
+    """
+    params = ()
+    if topic_id is not None:
+        sql += " WHERE n.topic_id = ?"
+        params = (topic_id,)
+    sql += " ORDER BY n.topic_id, n.id"
+    # a dedicated cursor, so other queries on this connection don't reset it mid-export
+    yield from get_conn().cursor().execute(sql, params)
+
+# ---------------------------
+# Study material
+# ---------------------------
+# Summaries and flashcards are written by study_batch.py, one transaction
+# per note, tagged with the note version they were made from. A note whose
+# version moved past its summary's (or that has none) is due again.
+
+@timed("db_call_seconds", fn="notes_needing_study")
+def notes_needing_study(after_id=0, limit=100):
+    """Notes (id, topic_id, title, content, version) with no summary of their
+    current version, by id; pass the last id seen as after_id for the next page."""
+    return get_conn().execute("""
+        SELECT n.id, n.topic_id, n.title, note_text(n.content) AS content, n.version
+        FROM notes n LEFT JOIN note_summaries s ON s.note_id = n.id
+        WHERE n.id > ? AND (s.version IS NULL OR s.version < n.version)
+        ORDER BY n.id LIMIT ?
+    """, (after_id, limit)).fetchall()
+
+@timed("db_call_seconds", fn="save_study_material")
+def save_study_material(note_id, version, summary, flashcards, model=None):
+    """Replace a note's summary and [(question, answer)] flashcards with ones made from version.
+
+    Returns False, storing nothing, if the note is gone or already has
+    material from that version or a later one.
+    """
+    created = datetime.now().isoformat()
+    with transaction() as c:
+        if c.execute("SELECT 1 FROM notes WHERE id=?", (note_id,)).fetchone() is None:
+            return False
+        stored = c.execute("SELECT version FROM note_summaries WHERE note_id=?", (note_id,)).fetchone()
+        if stored is not None and stored["version"] >= version:
+            return False
+        c.execute("""
+            INSERT OR REPLACE INTO note_summaries (note_id, version, summary, model, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (note_id, version, summary, model, created))
+        c.execute("DELETE FROM note_flashcards WHERE note_id=?", (note_id,))
+        c.executemany("INSERT INTO note_flashcards (note_id, question, answer) VALUES (?, ?, ?)",
+                      [(note_id, q, a) for q, a in flashcards])
+    return True
+
+@timed("db_call_seconds", fn="get_note_summary")
+def get_note_summary(note_id, current_only=False):
+    """version, summary, model, created_at of a note's summary, or None.
+
+    With current_only, only a summary of the note's current version counts;
+    the row then also carries the note's content it was made from.
+    """
+    if not current_only:
+        return get_conn().execute(
+            "SELECT version, summary, model, created_at FROM note_summaries WHERE note_id=?", (note_id,)
+        ).fetchone()
+    return get_conn().execute("""
+        SELECT s.version, s.summary, s.model, s.created_at, note_text(n.content) AS content
+        FROM note_summaries s JOIN notes n ON n.id = s.note_id AND n.version = s.version
+        WHERE s.note_id=?
+    """, (note_id,)).fetchone()
+
+@timed("db_call_seconds", fn="get_flashcards")
+def get_flashcards(note_id):
+    return get_conn().execute(
+        "SELECT id, question, answer FROM note_flashcards WHERE note_id=? ORDER BY id", (note_id,)
+    ).fetchall()
+
+# ---------------------------
+# Chat history
+# ---------------------------
+
+@timed("db_call_seconds", fn="add_chat_messages")
+def add_chat_messages(topic_id, messages):
+    """Append messages ({"role", "content"} dicts) to a topic's history in one transaction."""
+    created = datetime.now().isoformat()
+    with transaction() as c:
+        c.executemany("""
+            INSERT INTO chat_messages (topic_id, role, content, created_at)
+            VALUES (?, ?, ?, ?)
+        """, [(topic_id, m["role"], compression.encode(m["content"]), created) for m in messages])
+
+@timed("db_call_seconds", fn="get_chat_messages")
+def get_chat_messages(topic_id, limit=None, before_id=None, after_id=None):
+    """Return a topic's messages oldest first; with limit, only the newest `limit`
+    messages. before_id/after_id bound the id range (exclusive)."""
+    sql = "SELECT id, role, note_text(content) AS content, created_at FROM chat_messages WHERE topic_id=?"
+    params = [topic_id]
+    if after_id is not None:
+        sql += " AND id > ?"
+        params.append(after_id)
+    if before_id is not None:
+        sql += " AND id < ?"
+        params.append(before_id)
+    sql += " ORDER BY id DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    rows = get_conn().execute(sql, params).fetchall()
+    rows.reverse()
+    return rows
+
+@timed("db_call_seconds", fn="get_chat_summary")
+def get_chat_summary(topic_id):
+    return get_conn().execute(
+        "SELECT upto_id, content FROM chat_summaries WHERE topic_id=?", (topic_id,)
+    ).fetchone()
+
+@timed("db_call_seconds", fn="save_chat_summary")
+def save_chat_summary(topic_id, upto_id, content):
+    with transaction() as c:
+        c.execute("""
+            INSERT INTO chat_summaries (topic_id, upto_id, content) VALUES (?, ?, ?)
+            ON CONFLICT(topic_id) DO UPDATE SET upto_id=excluded.upto_id, content=excluded.content
+        """, (topic_id, upto_id, content))
+
+@timed("db_call_seconds", fn="migrate_chat_history_json")
+def migrate_chat_history_json(path):
+    """One-shot import of the legacy {topic_id: [messages]} JSON history file.
+
+    The file is renamed before reading, so concurrent callers cannot both
+    import it, and ends up as <path>.migrated. A file that cannot be read
+    is left in place and logged; if the import fails the file is put back
+    and the error raised, so a later call retries it. Returns the number
+    of messages imported.
+    """
+    path = Path(path)
+    claimed = path.with_name(path.name + ".migrating")
+    try:
+        path.rename(claimed)
+    except FileNotFoundError:
+        return 0
+    try:
+        with open(claimed, "r", encoding="utf-8") as f:
+            history = json.load(f)
+        if not isinstance(history, dict):
+            raise ValueError("expected an object of topic ids")
+    except ValueError as e:
+        claimed.rename(path)
+        log.error("Chat history %s not migrated, it is not valid JSON history: %s", path, e)
+        return 0
+
+    count = 0
+    try:
+        with transaction():
+            for topic_id, messages in history.items():
+                add_chat_messages(int(topic_id), messages)
+                count += len(messages)
+    except BaseException:
+        claimed.rename(path)
+        raise
+    claimed.rename(path.with_name(path.name + ".migrated"))
+    return count
+
+# ---------------------------
+# Search
+# ---------------------------
+
+def _fts_query(text):
+    """Turn free user input into an FTS5 query: every word must match as a prefix.
+
+    Words shorter than MIN_PREFIX_CHARS must match whole; as prefixes they
+    would pull in a large share of the index.
+    """
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{w}"*' if len(w) >= MIN_PREFIX_CHARS else f'"{w}"' for w in words)
+
+@timed("db_call_seconds", fn="search_notes")
+def search_notes(query, topic_id=None, limit=50, offset=0, within_ids=None):
+    """Full-text search over note titles and content, best BM25 match first.
+
+    Each hit carries id, topic_id, title, created_at, a highlighted
+    `snippet` and its `rank` (lower is better). Searches every topic
+    unless topic_id is given; within_ids restricts it to those notes.
+    """
+    match = _fts_query(query)
+    if not match:
+        return []
+    sql = """
+        SELECT n.id, n.topic_id, n.title, n.created_at,
+               snippet(notes_fts, -1, '[', ']', '…', 12) AS snippet,
+               bm25(notes_fts, 10.0, 1.0) AS rank
+        FROM notes_fts
+        JOIN notes n ON n.id = notes_fts.rowid
+        WHERE notes_fts MATCH ?
+    """
+    params = [match]
+    if topic_id is not None:
+        sql += " AND n.topic_id = ?"
+        params.append(topic_id)
+    if within_ids is not None:
+        sql += " AND notes_fts.rowid IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(list(within_ids)))
+    sql += " ORDER BY rank LIMIT ? OFFSET ?"
+    params += [limit, offset]
+    return get_conn().execute(sql, params).fetchall()
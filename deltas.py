@@ -0,0 +1,48 @@
+"""Compact, zlib-compressed line deltas between two versions of a text.
+
+A delta is a list of ops applied to the old text's lines: [start, end]
+copies old lines start..end, a string inserts new text. Unchanged runs
+therefore cost a few bytes no matter how long they are.
+"""
+import json
+import zlib
+from difflib import SequenceMatcher
+
+LEVEL = 6
+
+
+def pack(text):
+    return zlib.compress(text.encode("utf-8"), LEVEL)
+
+
+def unpack(data):
+    return zlib.decompress(data).decode("utf-8")
+
+
+def make_delta(old, new):
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    ops = []
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            inserted = "".join(new_lines[j1:j2])
+            # merge with a preceding insert so replace+insert runs stay one string
+            if ops and isinstance(ops[-1], str):
+                ops[-1] += inserted
+            else:
+                ops.append(inserted)
+    return pack(json.dumps(ops, ensure_ascii=False, separators=(",", ":")))
+
+
+def apply_delta(old, delta):
+    old_lines = old.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(unpack(delta)):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(old_lines[op[0]:op[1]])
+    return "".join(parts)
@@ -0,0 +1,214 @@
+"""Latency histograms and counters for db calls, tutor phases and UI work.
+
+Off unless NOTES_METRICS=1 (or enable() is called): a disabled timed()
+wrapper costs one flag check per call and span() hands back a shared
+no-op context manager. When enabled:
+
+    NOTES_METRICS_PORT=9464   serve Prometheus text at http://127.0.0.1:9464/metrics
+    NOTES_METRICS_FILE=m.json write a JSON snapshot at exit
+
+Metrics are named the Prometheus way, with labels given as keywords:
+
+    @timed("db_call_seconds", fn="get_note")
+    with span("tutor_phase_seconds", phase="api_call"): ...
+    incr("tutor_tokens_total", usage.prompt_tokens, kind="prompt")
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+# Histogram bucket upper bounds, in seconds.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = os.environ.get("NOTES_METRICS", "") not in ("", "0")
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, seconds, **labels):
+    """Record one duration in the name{labels} histogram."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"buckets": [0] * len(BUCKETS), "count": 0, "sum": 0.0}
+        hist["count"] += 1
+        hist["sum"] += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist["buckets"][i] += 1
+                break
+
+
+def incr(name, value=1, **labels):
+    if not _enabled or not value:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+class _Span:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, **labels):
+    """Context manager timing its block into the name{labels} histogram."""
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(name, labels)
+
+
+def timed(name, **labels):
+    """Decorator timing every call of the function into the name{labels} histogram."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start, **labels)
+        return wrapper
+    return decorate
+
+
+# ---------------------------
+# Export
+# ---------------------------
+
+def snapshot():
+    """Every metric as plain data: {"histograms": [...], "counters": [...]}."""
+    with _lock:
+        histograms = [
+            {"name": name, "labels": dict(labels), "count": h["count"], "sum": h["sum"],
+             "buckets": dict(zip(map(str, BUCKETS), h["buckets"]))}
+            for (name, labels), h in sorted(_histograms.items())
+        ]
+        counters = [{"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(_counters.items())]
+    return {"histograms": histograms, "counters": counters}
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def prometheus_text():
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        typed = set()
+        for (name, labels), h in sorted(_histograms.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(BUCKETS, h["buckets"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {h['count']}")
+            lines.append(f"{name}_sum{_labels(labels)} {h['sum']}")
+            lines.append(f"{name}_count{_labels(labels)} {h['count']}")
+        for (name, labels), value in sorted(_counters.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_json(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, indent=2)
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve /metrics from a daemon thread; returns the server."""
+    # imported here: http.server pulls in the email package, too slow for app startup
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            data = prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def start_exporters():
+    """Start the exporters configured through NOTES_METRICS_PORT / NOTES_METRICS_FILE."""
+    if not _enabled:
+        return
+    port = os.environ.get("NOTES_METRICS_PORT")
+    if port:
+        serve(int(port))
+    path = os.environ.get("NOTES_METRICS_FILE")
+    if path:
+        atexit.register(write_json, path)
@@ -1,5 +1,8 @@
 
 import tkinter as tk
+from bisect import bisect_left, bisect_right
+
+from instrumentation import timed
 
 class RoundedButton(tk.Canvas):
     def __init__(self, parent, text="", radius=12, padding=10,
@@ -85,3 +88,439 @@ class RoundedButton(tk.Canvas):
     def on_click(self, event):
         if self.command:
             self.command()
+
+
+class VirtualList(tk.Frame):
+    """Listbox replacement that only draws the rows in view.
+
+    Rows are pulled lazily from fetch_page(cursor, limit) -> (rows, next_cursor),
+    starting with cursor None; next_cursor None means the source is exhausted.
+    The canvas holds a fixed pool of row items that are re-pointed at
+    different rows while scrolling, and the update_row/insert_row/remove_row
+    diffs touch only the affected row instead of rebuilding the list.
+    Rows are identified by row["id"] and shown as text_of(row).
+    """
+
+    def __init__(self, parent, text_of, on_select=None, page_size=200, row_height=24,
+                 bg="#181825", fg="#CDD6F4", select_bg="#45475A",
+                 font=("Segoe UI", 11), height=None):
+        super().__init__(parent, bg=bg)
+        self.text_of = text_of
+        self.on_select = on_select
+        self.page_size = page_size
+        self.row_height = row_height
+        self.fg = fg
+        self.bg = bg
+        self.select_bg = select_bg
+        self.font = font
+
+        self.rows = []
+        self.fetch_page = None
+        self.cursor = None
+        self.exhausted = True
+        self.selected_id = None
+        self.top = 0
+        self.pool = []
+
+        self.canvas = tk.Canvas(self, bg=bg, highlightthickness=0, bd=0,
+                                height=height * row_height if height else None)
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+
+        self.canvas.bind("<Configure>", self._on_configure)
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", lambda e: self.scroll(-e.delta // 120 * 3))
+        self.canvas.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.canvas.bind("<Button-5>", lambda e: self.scroll(3))
+        self.canvas.bind("<Up>", lambda e: self._move_selection(-1))
+        self.canvas.bind("<Down>", lambda e: self._move_selection(1))
+
+    # ---------------- data ----------------
+    def load(self, fetch_page):
+        """Switch to a new row source and show its first page."""
+        self.fetch_page = fetch_page
+        self.rows = []
+        self.cursor = None
+        self.exhausted = fetch_page is None
+        self.top = 0
+        self.selected_id = None
+        self._ensure_loaded(self._visible_count())
+        self._redraw()
+
+    def clear(self):
+        self.load(None)
+
+    def show(self, rows):
+        """Display a fixed list of rows pushed by the caller (see append_rows)."""
+        self.load(None)
+        self.rows = list(rows)
+        self._redraw()
+
+    def append_rows(self, rows):
+        self.rows.extend(rows)
+        self._redraw()
+
+    def update_row(self, row):
+        idx = self.index_of(row["id"])
+        if idx is not None:
+            self.rows[idx] = row
+            self._redraw()
+
+    def insert_row(self, row, index=0):
+        self.rows.insert(index, row)
+        self._redraw()
+
+    def remove_row(self, row_id):
+        idx = self.index_of(row_id)
+        if idx is not None:
+            del self.rows[idx]
+            if row_id == self.selected_id:
+                self.selected_id = None
+            self._redraw()
+
+    def index_of(self, row_id):
+        for i, row in enumerate(self.rows):
+            if row["id"] == row_id:
+                return i
+        return None
+
+    def selected(self):
+        idx = self.index_of(self.selected_id) if self.selected_id is not None else None
+        return self.rows[idx] if idx is not None else None
+
+    def select(self, row_id, notify=False):
+        self.selected_id = row_id
+        self._redraw()
+        row = self.selected()
+        if notify and row is not None and self.on_select:
+            self.on_select(row)
+
+    def _ensure_loaded(self, count):
+        """Pull pages until at least count rows are loaded or the source runs dry."""
+        while len(self.rows) < count and not self.exhausted:
+            page, self.cursor = self.fetch_page(self.cursor, self.page_size)
+            self.rows.extend(page)
+            self.exhausted = self.cursor is None or not page
+
+    # ---------------- scrolling ----------------
+    def _content_height(self):
+        # one extra row of room while more pages can still be pulled in
+        extra = 0 if self.exhausted else 1
+        return (len(self.rows) + extra) * self.row_height
+
+    def _visible_count(self):
+        return max(self.canvas.winfo_height(), self.row_height) // self.row_height + 2
+
+    def _set_top(self, top):
+        view = self.canvas.winfo_height()
+        self.top = max(0, min(top, self._content_height() - view))
+        first = self.top // self.row_height
+        self._ensure_loaded(first + self._visible_count() + self.page_size // 4)
+        self._redraw()
+
+    def yview(self, *args):
+        if args[0] == "moveto":
+            self._set_top(int(float(args[1]) * self._content_height()))
+        elif args[0] == "scroll":
+            step = self.row_height if args[2] == "units" else self.canvas.winfo_height()
+            self._set_top(self.top + int(args[1]) * step)
+
+    def scroll(self, rows):
+        self._set_top(self.top + rows * self.row_height)
+
+    def see(self, index):
+        y = index * self.row_height
+        view = self.canvas.winfo_height()
+        if y < self.top:
+            self._set_top(y)
+        elif y + self.row_height > self.top + view:
+            self._set_top(y + self.row_height - view)
+
+    # ---------------- drawing ----------------
+    def _on_configure(self, event):
+        wanted = self._visible_count()
+        while len(self.pool) < wanted:
+            rect = self.canvas.create_rectangle(0, 0, 0, 0, width=0, fill=self.bg)
+            text = self.canvas.create_text(8, 0, anchor="w", fill=self.fg, font=self.font)
+            self.pool.append((rect, text))
+        while len(self.pool) > wanted:
+            for item in self.pool.pop():
+                self.canvas.delete(item)
+        self._set_top(self.top)
+
+    @timed("ui_seconds", op="list_redraw")
+    def _redraw(self):
+        width = self.canvas.winfo_width()
+        first = self.top // self.row_height
+        offset = self.top % self.row_height
+        for slot, (rect, text) in enumerate(self.pool):
+            idx = first + slot
+            y = slot * self.row_height - offset
+            if idx < len(self.rows):
+                row = self.rows[idx]
+                fill = self.select_bg if row["id"] == self.selected_id else self.bg
+                self.canvas.coords(rect, 0, y, width, y + self.row_height)
+                self.canvas.itemconfig(rect, fill=fill, state="normal")
+                self.canvas.coords(text, 8, y + self.row_height // 2)
+                self.canvas.itemconfig(text, text=self.text_of(row), state="normal")
+            else:
+                self.canvas.itemconfig(rect, state="hidden")
+                self.canvas.itemconfig(text, state="hidden")
+
+        total = self._content_height()
+        if total:
+            view = self.canvas.winfo_height()
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + view) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _on_click(self, event):
+        self.canvas.focus_set()
+        idx = (self.top + event.y) // self.row_height
+        if idx < len(self.rows):
+            self.select(self.rows[idx]["id"], notify=True)
+
+    def _move_selection(self, delta):
+        idx = self.index_of(self.selected_id) if self.selected_id is not None else -1
+        idx = max(0, idx + delta)
+        self._ensure_loaded(idx + 1)
+        if idx < len(self.rows):
+            self.select(self.rows[idx]["id"], notify=True)
+            self.see(idx)
+
+
+class ChatTranscript(tk.Frame):
+    """Chat view that draws bubbles straight onto a canvas.
+
+    Every message is measured once when it arrives and kept as (top, height)
+    in absolute canvas units, so appending never touches older messages.
+    Only the bubbles in view are drawn, using a small pool of recycled
+    canvas items. At most max_loaded messages are kept; older ones are
+    dropped from memory and paged back in through load_older(before_id, limit)
+    (oldest first, each {"id", "sender", "text"}) when the user scrolls up.
+    """
+
+    PAD_X = 12
+    PAD_Y = 8
+    GAP = 6
+
+    def __init__(self, parent, load_older=None, page_size=30, max_loaded=400, wrap=450,
+                 bg="#313244", user_bg="#2e384d", user_fg="#89B4FA",
+                 assistant_bg="#374152", assistant_fg="#A6E3A1", font=("Segoe UI", 10)):
+        super().__init__(parent, bg=bg)
+        self.load_older = load_older
+        self.page_size = page_size
+        self.max_loaded = max_loaded
+        self.wrap = wrap
+        self.bg = bg
+        self.styles = {"user": (user_bg, user_fg), "assistant": (assistant_bg, assistant_fg)}
+        self.font = font
+
+        # parallel lists, ordered oldest -> newest; handles are strictly increasing
+        self.handles = []
+        self.messages = []
+        self.tops = []
+        self.heights = []
+        self.widths = []
+        self._next_handle = 1
+        self._prev_handle = 0
+        self.oldest_id = None
+        self.exhausted = True
+        self.top = 0
+        self.pool = []
+
+        self.canvas = tk.Canvas(self, bg=bg, highlightthickness=0, bd=0)
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self._measure = self.canvas.create_text(-10000, -10000, anchor="nw", width=wrap, font=font)
+
+        self.canvas.bind("<Configure>", lambda e: self._set_top(self.top))
+        self.canvas.bind("<MouseWheel>", lambda e: self.scroll(-e.delta // 120 * 40))
+        self.canvas.bind("<Button-4>", lambda e: self.scroll(-40))
+        self.canvas.bind("<Button-5>", lambda e: self.scroll(40))
+
+    # ---------------- messages ----------------
+    def reset(self, messages=(), exhausted=True):
+        """Replace the transcript with messages (oldest first, as for load_older)."""
+        self.handles, self.messages = [], []
+        self.tops, self.heights, self.widths = [], [], []
+        self.oldest_id = messages[0]["id"] if messages else None
+        self.exhausted = exhausted or not messages
+        for m in messages:
+            self.add_message(m["text"], m["sender"], message_id=m["id"], stick=False)
+        self.scroll_to_end()
+
+    def add_message(self, text, sender="user", message_id=None, stick=True):
+        """Append a bubble and return its handle. Cost does not depend on transcript length.
+
+        message_id is the history store id, if the message has one; it is
+        what older pages are fetched relative to. A message saved later can
+        be given its id through set_message_id().
+        """
+        at_end = self._at_end()
+        width, height = self._measure_text(text)
+        self.handles.append(self._next_handle)
+        self._next_handle += 1
+        self.messages.append({"id": message_id, "sender": sender, "text": text})
+        self.tops.append(self._end())
+        self.heights.append(height)
+        self.widths.append(width)
+        # trim in page-sized steps, and never from under a reader who scrolled up
+        if at_end and len(self.messages) > self.max_loaded + self.page_size:
+            self._trim_front(len(self.messages) - self.max_loaded)
+        if stick and at_end:
+            self.scroll_to_end()
+        else:
+            self._redraw()
+        return self.handles[-1]
+
+    def set_message_id(self, handle, message_id):
+        """Record the history store id of a message added before it was saved."""
+        idx = self._index(handle)
+        if idx is not None:
+            self.messages[idx]["id"] = message_id
+
+    def update_message(self, handle, text):
+        idx = self._index(handle)
+        if idx is None:
+            return
+        at_end = self._at_end()
+        width, height = self._measure_text(text)
+        self.messages[idx]["text"] = text
+        self.widths[idx] = width
+        self._shift(idx + 1, height - self.heights[idx])
+        self.heights[idx] = height
+        if at_end:
+            self.scroll_to_end()
+        else:
+            self._redraw()
+
+    def remove_message(self, handle):
+        idx = self._index(handle)
+        if idx is None:
+            return
+        self._shift(idx + 1, -self.heights[idx])
+        for seq in (self.handles, self.messages, self.tops, self.heights, self.widths):
+            del seq[idx]
+        self._set_top(self.top)
+
+    def _index(self, handle):
+        i = bisect_left(self.handles, handle)
+        return i if i < len(self.handles) and self.handles[i] == handle else None
+
+    def _shift(self, start, delta):
+        if delta:
+            for i in range(start, len(self.tops)):
+                self.tops[i] += delta
+
+    def _measure_text(self, text):
+        self.canvas.itemconfig(self._measure, text=text)
+        x1, y1, x2, y2 = self.canvas.bbox(self._measure) or (0, 0, 0, 0)
+        return x2 - x1 + 2 * self.PAD_X, y2 - y1 + 2 * self.PAD_Y + self.GAP
+
+    def _trim_front(self, count):
+        dropped = [m["id"] for m in self.messages[:count] if m["id"] is not None]
+        for seq in (self.handles, self.messages, self.tops, self.heights, self.widths):
+            del seq[:count]
+        # the dropped messages are in the history store; page them back on demand,
+        # before the oldest loaded message that has a store id. Live messages not
+        # saved yet have none, so with only those left, page from the newest dropped one.
+        oldest = next((m["id"] for m in self.messages if m["id"] is not None), None)
+        if oldest is not None:
+            self.oldest_id = oldest
+        elif dropped:
+            self.oldest_id = dropped[-1] + 1
+        self.exhausted = self.load_older is None or self.oldest_id is None
+
+    def _load_older_page(self):
+        if self.exhausted or self.load_older is None:
+            return
+        older = self.load_older(self.oldest_id, self.page_size)
+        if len(older) < self.page_size:
+            self.exhausted = True
+        if not older:
+            return
+        self.oldest_id = older[0]["id"]
+        start = self.tops[0] if self.tops else 0
+        sizes = [self._measure_text(m["text"]) for m in older]
+        total = sum(h for _, h in sizes)
+        tops, y = [], start - total
+        for _, h in sizes:
+            tops.append(y)
+            y += h
+        handles = list(range(self._prev_handle - len(older) + 1, self._prev_handle + 1))
+        self._prev_handle -= len(older)
+        self.handles[:0] = handles
+        self.messages[:0] = [{"id": m["id"], "sender": m["sender"], "text": m["text"]} for m in older]
+        self.tops[:0] = tops
+        self.heights[:0] = [h for _, h in sizes]
+        self.widths[:0] = [w for w, _ in sizes]
+
+    # ---------------- scrolling ----------------
+    def _start(self):
+        return self.tops[0] if self.tops else 0
+
+    def _end(self):
+        return self.tops[-1] + self.heights[-1] if self.tops else 0
+
+    def _at_end(self):
+        return self.top + self.canvas.winfo_height() >= self._end() - 2
+
+    def _set_top(self, top):
+        view = self.canvas.winfo_height()
+        if top < self._start() and not self.exhausted:
+            self._load_older_page()
+        self.top = max(self._start(), min(top, self._end() - view))
+        self._redraw()
+
+    def scroll_to_end(self):
+        self._set_top(self._end())
+
+    def scroll(self, pixels):
+        self._set_top(self.top + pixels)
+
+    def yview(self, *args):
+        start, total = self._start(), self._end() - self._start()
+        if args[0] == "moveto":
+            self._set_top(start + int(float(args[1]) * total))
+        elif args[0] == "scroll":
+            step = 40 if args[2] == "units" else self.canvas.winfo_height()
+            self._set_top(self.top + int(args[1]) * step)
+
+    # ---------------- drawing ----------------
+    @timed("ui_seconds", op="transcript_redraw")
+    def _redraw(self):
+        width = self.canvas.winfo_width()
+        view = self.canvas.winfo_height()
+        i = max(0, bisect_right(self.tops, self.top) - 1)
+        slot = 0
+        while i < len(self.tops) and self.tops[i] < self.top + view:
+            if slot == len(self.pool):
+                rect = self.canvas.create_rectangle(0, 0, 0, 0, width=0)
+                text = self.canvas.create_text(0, 0, anchor="nw", width=self.wrap, font=self.font)
+                self.pool.append((rect, text))
+            rect, text = self.pool[slot]
+            msg = self.messages[i]
+            fill, fg = self.styles.get(msg["sender"], self.styles["assistant"])
+            y = self.tops[i] - self.top
+            w = self.widths[i]
+            # user bubbles hug the right edge, tutor bubbles the left
+            x = width - 10 - w if msg["sender"] == "user" else 10
+            self.canvas.coords(rect, x, y, x + w, y + self.heights[i] - self.GAP)
+            self.canvas.itemconfig(rect, fill=fill, state="normal")
+            self.canvas.coords(text, x + self.PAD_X, y + self.PAD_Y)
+            self.canvas.itemconfig(text, text=msg["text"], fill=fg, state="normal")
+            slot += 1
+            i += 1
+        for rect, text in self.pool[slot:]:
+            self.canvas.itemconfig(rect, state="hidden")
+            self.canvas.itemconfig(text, state="hidden")
+
+        total = self._end() - self._start()
+        if total > view:
+            first = (self.top - self._start()) / total
+            self.scrollbar.set(first, first + view / total)
+        else:
+            self.scrollbar.set(0.0, 1.0)
@@ -0,0 +1,230 @@
+import hashlib
+import math
+import os
+import re
+import threading
+import unicodedata
+
+import db
+
+CHROMA_PATH = "data/chroma"
+COLLECTION_NAME = "note_chunks"
+# notes embedded (or dropped) per chromadb call in sync()
+SYNC_BATCH = 500
+
+# Target chunk size in characters; paragraphs are packed up to this size.
+CHUNK_CHARS = 800
+
+
+def chunk_text(title, content, size=CHUNK_CHARS):
+    """Split a note into paragraph-aligned chunks, each prefixed with the note title."""
+    pieces = []
+    for para in re.split(r"\n\s*\n", content or ""):
+        para = para.strip()
+        while len(para) > size:
+            cut = para.rfind(" ", 0, size)
+            cut = cut if cut > 0 else size
+            pieces.append(para[:cut])
+            para = para[cut:].strip()
+        if para:
+            pieces.append(para)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > size:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return [f"{title}\n{chunk}" for chunk in chunks] or [title]
+
+
+class HashingEmbedder:
+    """Deterministic bag-of-words embedder (feature hashing).
+
+    Needs no model download or network, so it is what tests and offline
+    setups plug in instead of the default sentence-transformer embedder.
+    """
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def __call__(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def _embed(self, text):
+        text = unicodedata.normalize("NFKD", text.lower())
+        text = "".join(ch for ch in text if not unicodedata.combining(ch))
+        vec = [0.0] * self.dim
+        for word in re.findall(r"\w+", text):
+            h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+            vec[h % self.dim] += 1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+
+class NoteIndex:
+    """Embedding index over note chunks, stored in a chromadb collection.
+
+    What the collection holds is recorded in the note_index_state table of
+    topics.db: the note version each note's chunks were made from. sync(),
+    which query() runs first, diffs that against notes and re-embeds
+    whatever is new, changed or gone, so edits made by other processes
+    (bulk imports, server workers, another app instance) or before a
+    restart are picked up too. query() only embeds its own topic's notes.
+    The diff is skipped while neither this process (db.py change
+    notifications) nor another one (PRAGMA data_version) has committed
+    anything since the topic was last synced. chromadb
+    and the default embedder are loaded on first use.
+
+    A chromadb PersistentClient keeps its vector index in process memory,
+    so several processes writing one CHROMA_PATH do not see each other's
+    additions and can corrupt it. Give each process its own path, or set
+    NOTES_CHROMA_HOST=host:port to share a chroma server instead.
+    """
+
+    def __init__(self, embedder=None, client=None, collection_name=COLLECTION_NAME):
+        self._embedder = embedder
+        self._client = client
+        self.collection_name = collection_name
+        self._collection = None
+        # topic id (None: every topic) -> the data_version it was last synced at
+        self._synced = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        db.add_listener(self._on_change)
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            from chromadb.utils import embedding_functions
+            self._embedder = embedding_functions.DefaultEmbeddingFunction()
+        return self._embedder
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            import chromadb
+            client = self._client or _default_client(chromadb)
+            collection = client.get_or_create_collection(
+                self.collection_name, metadata={"hnsw:space": "cosine"}
+            )
+            with db.transaction() as c:
+                c.execute("""
+                    CREATE TABLE IF NOT EXISTS note_index_state (
+                        collection TEXT NOT NULL,
+                        note_id INTEGER NOT NULL,
+                        version INTEGER NOT NULL,
+                        PRIMARY KEY (collection, note_id)
+                    ) WITHOUT ROWID
+                """)
+                if collection.count() == 0:
+                    # a new or wiped collection: whatever the table says, backfill everything
+                    c.execute("DELETE FROM note_index_state WHERE collection=?", (self.collection_name,))
+            self._collection = collection
+        return self._collection
+
+    def _on_change(self, event, **ids):
+        if event.startswith("note") or event == "topic_deleted":
+            with self._lock:
+                self._generation += 1
+                self._synced.clear()
+
+    def sync(self, topic_id=None):
+        """Re-embed notes changed since they were indexed and drop deleted ones.
+
+        With topic_id only that topic's notes are embedded, so a question
+        never waits for notes of other topics (say, a bulk import elsewhere).
+        """
+        collection = self.collection
+        with self._sync_lock:
+            conn = db.get_conn()
+            # data_version moves when another connection commits; it is per connection
+            seen = (id(conn), conn.execute("PRAGMA data_version").fetchone()[0])
+            with self._lock:
+                if seen in (self._synced.get(topic_id), self._synced.get(None)):
+                    return
+                generation = self._generation
+
+            # dropping chunks embeds nothing, so deleted notes are cleared everywhere
+            gone = [r["note_id"] for r in conn.execute("""
+                SELECT note_id FROM note_index_state
+                WHERE collection=? AND note_id NOT IN (SELECT id FROM notes)
+            """, (self.collection_name,))]
+            for start in range(0, len(gone), SYNC_BATCH):
+                batch = gone[start:start + SYNC_BATCH]
+                collection.delete(where={"note_id": {"$in": batch}})
+                with db.transaction() as c:
+                    c.executemany("DELETE FROM note_index_state WHERE collection=? AND note_id=?",
+                                  [(self.collection_name, note_id) for note_id in batch])
+
+            sql = """
+                SELECT n.id FROM notes n
+                LEFT JOIN note_index_state s ON s.collection=? AND s.note_id=n.id
+                WHERE s.version IS NOT n.version
+            """
+            params = [self.collection_name]
+            if topic_id is not None:
+                sql += " AND n.topic_id=?"
+                params.append(topic_id)
+            stale = [r["id"] for r in conn.execute(sql, params)]
+            for start in range(0, len(stale), SYNC_BATCH):
+                self._embed(collection, stale[start:start + SYNC_BATCH])
+            with self._lock:
+                # a change notified meanwhile may not be embedded yet; check again next time
+                if generation == self._generation:
+                    self._synced[topic_id] = seen
+
+    def _embed(self, collection, note_ids):
+        """Replace the chunks of note_ids and record the versions they were made from."""
+        collection.delete(where={"note_id": {"$in": note_ids}})
+        ids, documents, metadatas, versions = [], [], [], []
+        for note_id in note_ids:
+            note = db.get_note(note_id)
+            if note is None:
+                continue
+            versions.append((self.collection_name, note_id, note["version"]))
+            for i, chunk in enumerate(chunk_text(note["title"], note["content"])):
+                ids.append(f"{note_id}:{i}")
+                documents.append(chunk)
+                metadatas.append({"note_id": note_id, "topic_id": note["topic_id"]})
+        if ids:
+            collection.add(
+                ids=ids,
+                documents=documents,
+                metadatas=metadatas,
+                embeddings=self.embedder(documents),
+            )
+        # committed per batch, so an interrupted backfill resumes where it stopped
+        with db.transaction() as c:
+            c.executemany("INSERT OR REPLACE INTO note_index_state (collection, note_id, version) VALUES (?, ?, ?)",
+                          versions)
+
+    def query(self, topic_id, text, k=4):
+        """Return the k note chunks of a topic most similar to text."""
+        self.sync(topic_id)
+        if self.collection.count() == 0:
+            return []
+        result = self.collection.query(
+            query_embeddings=self.embedder([text]),
+            n_results=k,
+            where={"topic_id": topic_id},
+        )
+        return result["documents"][0] if result["documents"] else []
+
+
+def uses_chroma_server():
+    """Whether NOTES_CHROMA_HOST points the index at a shared chroma server."""
+    return bool(os.environ.get("NOTES_CHROMA_HOST"))
+
+
+def _default_client(chromadb):
+    if uses_chroma_server():
+        host = os.environ["NOTES_CHROMA_HOST"]
+        host, _, port = host.partition(":")
+        return chromadb.HttpClient(host=host, port=int(port or 8000))
+    return chromadb.PersistentClient(path=CHROMA_PATH)
@@ -0,0 +1,119 @@
+"""The per-topic part of the tutor's system prompt, built once and cached.
+
+A topic's context block (name, description, note titles) only changes
+when the topic or its notes do, so it is assembled and token-counted on
+first use and then reused verbatim until a db.py change notification
+invalidates it, or, for changes made by other processes, until its
+topic's stamp (see topic_stamp()) no longer matches. Reusing the same string keeps the system prompt
+byte-identical from one question to the next, which is what lets the
+provider's prompt caching apply.
+"""
+import threading
+
+import db
+from context_window import estimate_tokens
+
+# note titles listed in a topic's context block, newest first
+TITLE_LIMIT = 200
+
+
+class ContextBlock:
+    """A topic's preassembled prompt sections and their estimated token counts."""
+
+    __slots__ = ("topic_id", "header", "titles", "header_tokens", "titles_tokens", "note_ids",
+                 "stamp", "checked")
+
+    def __init__(self, topic_id, header, titles, note_ids, stamp=None):
+        self.topic_id = topic_id
+        self.header = header
+        self.titles = titles
+        self.header_tokens = estimate_tokens(header)
+        self.titles_tokens = estimate_tokens(titles)
+        self.note_ids = note_ids
+        self.stamp = stamp
+        # the (connection, PRAGMA data_version) the stamp was last confirmed at
+        self.checked = None
+
+
+def topic_stamp(conn, topic_id):
+    """A value that changes whenever the topic or any of its notes is written, or None."""
+    row = conn.execute("""
+        SELECT t.name, t.description, COUNT(n.id), MAX(n.id), SUM(n.version)
+        FROM topics t LEFT JOIN notes n ON n.topic_id = t.id
+        WHERE t.id = ?
+    """, (topic_id,)).fetchone()
+    return tuple(row) if row[0] is not None else None
+
+
+def _data_version(conn):
+    return id(conn), conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def build_block(topic, notes, stamp=None):
+    header = (f"Ești un tutor AI care ajută utilizatorul să înțeleagă topicul: **{topic['name']}**.\n\n"
+              f"Descriere topic:\n{topic['description'] or ''}")
+    titles = f"Titlurile notelor din acest topic:\n{', '.join(n['title'] for n in notes)}"
+    return ContextBlock(topic["id"], header, titles, frozenset(n["id"] for n in notes), stamp)
+
+
+class TopicContextCache:
+    """ContextBlocks by topic id, dropped when the topic or one of its listed notes changes.
+
+    get() returns None for a topic that does not exist. A block built
+    while a change to its topic was being committed is not stored, so a
+    stale block can never outlive the notification that invalidated it.
+    Writes by other processes send no notification: when PRAGMA
+    data_version says another connection has committed since a block was
+    last checked, get() compares the topic's stamp and rebuilds on a
+    mismatch.
+    """
+
+    def __init__(self, title_limit=TITLE_LIMIT):
+        self.title_limit = title_limit
+        self._blocks = {}
+        # bumped by every invalidation; a build only lands if it did not move
+        self._generation = 0
+        self._lock = threading.Lock()
+        db.add_listener(self._on_change)
+
+    def get(self, topic_id):
+        with self._lock:
+            block = self._blocks.get(topic_id)
+            generation = self._generation
+        conn = db.get_conn()
+        seen = _data_version(conn)
+        if block is not None and block.checked == seen:
+            return block
+        stamp = topic_stamp(conn, topic_id)
+        if stamp is None:
+            return None
+        if block is not None and block.stamp == stamp:
+            block.checked = seen
+            return block
+        topic = db.get_topic(topic_id)
+        if topic is None:
+            return None
+        block = build_block(topic, db.list_notes(topic_id, limit=self.title_limit), stamp)
+        block.checked = seen
+        with self._lock:
+            if generation == self._generation:
+                self._blocks[topic_id] = block
+        return block
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._blocks.clear()
+
+    def _on_change(self, event, note_id=None, topic_id=None, first_id=None, last_id=None):
+        with self._lock:
+            self._generation += 1
+            if event == "notes_imported":
+                self._blocks.clear()
+            elif topic_id is not None:
+                self._blocks.pop(topic_id, None)
+            elif event in ("note_updated", "note_deleted"):
+                # only a listed note can change the block
+                for key, block in list(self._blocks.items()):
+                    if note_id in block.note_ids:
+                        del self._blocks[key]
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import db
+
+CACHE_DB_PATH = Path("data/tutor_cache.db")
+
+MEMORY_ENTRIES = 256
+DISK_MAX_ENTRIES = 20000
+TTL_SECONDS = 7 * 24 * 3600
+# the disk tier is trimmed to DISK_MAX_ENTRIES every PRUNE_EVERY writes
+PRUNE_EVERY = 100
+
+
+def cache_key(messages, model, temperature, max_tokens):
+    payload = json.dumps(
+        {"messages": messages, "model": model, "temperature": temperature, "max_tokens": max_tokens},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier cache of tutor answers: an in-memory LRU over a SQLite file.
+
+    Entries expire ttl seconds after they were written. The disk tier is
+    capped at max_entries, dropping the least recently used rows first.
+    """
+
+    def __init__(self, path=CACHE_DB_PATH, memory_entries=MEMORY_ENTRIES,
+                 max_entries=DISK_MAX_ENTRIES, ttl=TTL_SECONDS, clock=time.time):
+        self.path = Path(path)
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._initialized = False
+
+    def _conn(self):
+        if not self._initialized:
+            with db.transaction(self.path) as c:
+                c.execute("""
+                    CREATE TABLE IF NOT EXISTS responses (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        accessed_at REAL NOT NULL
+                    )
+                """)
+                c.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+            self._initialized = True
+        return db.get_conn(self.path)
+
+    def get(self, key):
+        now = self.clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        conn = self._conn()
+        row = conn.execute("SELECT value, created_at FROM responses WHERE key=?", (key,)).fetchone()
+        if row is None or now - row["created_at"] >= self.ttl:
+            with self._lock:
+                self._memory.pop(key, None)
+                self.misses += 1
+            return None
+
+        conn.execute("UPDATE responses SET accessed_at=? WHERE key=?", (now, key))
+        with self._lock:
+            self._remember(key, row["value"], row["created_at"])
+            self.hits += 1
+        return row["value"]
+
+    def put(self, key, value):
+        now = self.clock()
+        with self._lock:
+            self._remember(key, value, now)
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+        self._conn()
+        with db.transaction(self.path) as c:
+            c.execute("""
+                INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at)
+                VALUES (?, ?, ?, ?)
+            """, (key, value, now, now))
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Drop expired rows and trim the disk tier to max_entries."""
+        self._conn()
+        with db.transaction(self.path) as c:
+            c.execute("DELETE FROM responses WHERE created_at <= ?", (self.clock() - self.ttl,))
+            c.execute("""
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        self._conn()
+        with db.transaction(self.path) as c:
+            c.execute("DELETE FROM responses")
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
@@ -0,0 +1,111 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+
+DEBOUNCE_MS = 200
+POLL_MS = 16
+BATCH_SIZE = 50
+MAX_RESULTS = 500
+
+
+class SearchPipeline:
+    """Search-as-you-type over the notes FTS index, off the Tk thread.
+
+    Keystrokes are debounced with root.after(); each query that actually
+    runs gets a generation number and anything older is dropped, both in
+    the worker (between batches) and when results are delivered. Results
+    arrive in ranked batches through on_results(rows, first, done).
+
+    When a query only appends to the previous one, its matches are a
+    subset of the previous matches, so if those were complete the search
+    is limited to their ids instead of scanning the whole topic again.
+    """
+
+    def __init__(self, root, on_results, debounce_ms=DEBOUNCE_MS, batch_size=BATCH_SIZE,
+                 max_results=MAX_RESULTS):
+        self.root = root
+        self.on_results = on_results
+        self.debounce_ms = debounce_ms
+        self.batch_size = batch_size
+        self.max_results = max_results
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        self.results = queue.Queue()
+        self.generation = 0
+        self._debounce_job = None
+        self._poll_job = None
+        # last completed search: (query, topic_id, ids) with ids None if capped
+        self._last = None
+        self._collecting = None
+        db.add_listener(self._on_change)
+
+    def _on_change(self, event, **ids):
+        # an edited note may now match; the next search must not refine stale ids
+        if event.startswith("note") or event == "topic_deleted":
+            self._last = None
+
+    def set_query(self, text, topic_id):
+        """Call on every keystroke; the search starts once typing pauses."""
+        if self._debounce_job:
+            self.root.after_cancel(self._debounce_job)
+        self._debounce_job = self.root.after(self.debounce_ms, self._start, text.strip(), topic_id)
+
+    def cancel(self):
+        if self._debounce_job:
+            self.root.after_cancel(self._debounce_job)
+            self._debounce_job = None
+        self.generation += 1
+
+    def shutdown(self):
+        self.cancel()
+        db.remove_listener(self._on_change)
+        if self._poll_job:
+            self.root.after_cancel(self._poll_job)
+            self._poll_job = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _start(self, query, topic_id):
+        self._debounce_job = None
+        self.generation += 1
+        within = None
+        last = self._last
+        if (last and last[1] == topic_id and last[2] is not None
+                and query.startswith(last[0])):
+            within = last[2]
+        self._collecting = (query, topic_id, [])
+        self.executor.submit(self._run, self.generation, query, topic_id, within)
+        self._schedule_poll()
+
+    def _run(self, generation, query, topic_id, within):
+        offset = 0
+        while generation == self.generation:
+            rows = db.search_notes(query, topic_id=topic_id, limit=self.batch_size,
+                                   offset=offset, within_ids=within)
+            offset += len(rows)
+            done = len(rows) < self.batch_size or offset >= self.max_results
+            self.results.put((generation, rows, offset == len(rows), done))
+            if done:
+                return
+
+    def _schedule_poll(self):
+        if self._poll_job is None:
+            self._poll_job = self.root.after(POLL_MS, self._poll)
+
+    def _poll(self):
+        self._poll_job = None
+        while True:
+            try:
+                generation, rows, first, done = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self.generation:
+                continue
+            query, topic_id, ids = self._collecting
+            ids.extend(r["id"] for r in rows)
+            if done:
+                capped = len(ids) >= self.max_results
+                self._last = (query, topic_id, None if capped else ids)
+            self.on_results(rows, first, done)
+            if done:
+                return
+        self._schedule_poll()
@@ -0,0 +1,250 @@
+"""HTTP API over the notes database and the AI tutor.
+
+Run under a multi-worker WSGI server, e.g.
+
+    gunicorn -w 4 --threads 8 "server:create_app()"
+
+Every worker thread gets its own long-lived SQLite connection from
+db.get_conn() (keyed by pid, so forked workers never share one), and
+WAL plus the busy timeout let the workers write to topics.db, including
+the chat history, concurrently. The tutor's chromadb note index is not
+multi-process safe on disk, so unless NOTES_CHROMA_HOST points it at a
+chroma server (see note_index.NoteIndex) the server sends note titles
+instead of retrieved chunks (rag_top_k=0).
+"""
+import gzip
+import hashlib
+import json
+
+from flask import Flask, Response, abort, jsonify, request, stream_with_context
+from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
+
+import db
+import instrumentation
+from note_index import uses_chroma_server
+from settings import load_settings
+
+DEFAULT_PAGE = 50
+MAX_PAGE = 500
+GZIP_MIN_BYTES = 512
+
+
+def create_app():
+    app = Flask(__name__)
+    CORS(app)
+    db.init_db()
+
+    # ---------------------------
+    # Helpers
+    # ---------------------------
+
+    def limit_arg():
+        """?limit=, capped at MAX_PAGE; 400 unless it is at least 1 (SQLite reads -1 as no limit)."""
+        limit = request.args.get("limit", DEFAULT_PAGE, type=int)
+        if limit < 1:
+            abort(400, "limit must be at least 1.")
+        return min(limit, MAX_PAGE)
+
+    def page_args():
+        return request.args.get("before_id", type=int), limit_arg()
+
+    def paged(rows, limit):
+        next_before = rows[-1]["id"] if len(rows) == limit else None
+        return jsonify(items=[dict(r) for r in rows], next_before_id=next_before)
+
+    def body():
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            abort(400, "Expected a JSON object.")
+        return data
+
+    def require(row):
+        if row is None:
+            abort(404)
+        return row
+
+    @app.errorhandler(HTTPException)
+    def http_error(e):
+        return jsonify(error=e.description), e.code
+
+    @app.after_request
+    def etag_and_gzip(response):
+        """ETag/If-None-Match and gzip for JSON GET responses."""
+        if (request.method != "GET" or response.status_code != 200
+                or response.mimetype != "application/json"):
+            return response
+        data = response.get_data()
+        etag = hashlib.sha1(data).hexdigest()
+        use_gzip = "gzip" in request.headers.get("Accept-Encoding", "") and len(data) >= GZIP_MIN_BYTES
+        # the gzip variant gets its own tag; either one validates the same content
+        tag = f'"{etag}-gzip"' if use_gzip else f'"{etag}"'
+        response.headers["Vary"] = "Accept-Encoding"
+        if etag in request.headers.get("If-None-Match", ""):
+            not_modified = Response(status=304)
+            not_modified.headers["ETag"] = tag
+            not_modified.headers["Vary"] = "Accept-Encoding"
+            return not_modified
+        response.headers["ETag"] = tag
+        if use_gzip:
+            response.set_data(gzip.compress(data, compresslevel=6))
+            response.headers["Content-Encoding"] = "gzip"
+        return response
+
+    # ---------------------------
+    # Topics
+    # ---------------------------
+
+    @app.get("/api/topics")
+    def topics_list():
+        before_id, limit = page_args()
+        return paged(db.list_topics(before_id=before_id, limit=limit), limit)
+
+    @app.post("/api/topics")
+    def topics_create():
+        data = body()
+        if not data.get("name"):
+            abort(400, "name is required.")
+        topic_id = db.create_topic(data["name"], data.get("description", ""))
+        return jsonify(dict(db.get_topic(topic_id))), 201
+
+    @app.get("/api/topics/<int:topic_id>")
+    def topics_get(topic_id):
+        return jsonify(dict(require(db.get_topic(topic_id))))
+
+    @app.put("/api/topics/<int:topic_id>")
+    def topics_update(topic_id):
+        topic = require(db.get_topic(topic_id))
+        data = body()
+        db.update_topic(topic_id, data.get("name", topic["name"]),
+                        data.get("description", topic["description"]))
+        return jsonify(dict(db.get_topic(topic_id)))
+
+    @app.delete("/api/topics/<int:topic_id>")
+    def topics_delete(topic_id):
+        require(db.get_topic(topic_id))
+        db.delete_topic(topic_id)
+        return "", 204
+
+    # ---------------------------
+    # Notes
+    # ---------------------------
+
+    @app.get("/api/topics/<int:topic_id>/notes")
+    def notes_list(topic_id):
+        before_id, limit = page_args()
+        return paged(db.list_notes(topic_id, before_id=before_id, limit=limit), limit)
+
+    @app.post("/api/topics/<int:topic_id>/notes")
+    def notes_create(topic_id):
+        require(db.get_topic(topic_id))
+        data = body()
+        note_id = db.create_note(topic_id, data.get("title", "New Note"), data.get("content", ""))
+        return jsonify(dict(db.get_note(note_id))), 201
+
+    @app.get("/api/notes/<int:note_id>")
+    def notes_get(note_id):
+        return jsonify(dict(require(db.get_note(note_id))))
+
+    @app.put("/api/notes/<int:note_id>")
+    def notes_update(note_id):
+        """Send the version you read back as "version" to get 409 instead of overwriting a newer save."""
+        note = require(db.get_note(note_id))
+        data = body()
+        version = data.get("version")
+        if version is not None and (not isinstance(version, int) or isinstance(version, bool)):
+            abort(400, "version must be an integer.")
+        try:
+            db.update_note(note_id, data.get("title", note["title"]), data.get("content", note["content"]),
+                           expected_version=version)
+        except db.NoteConflict as e:
+            return jsonify(error=str(e), version=e.current_version), 409
+        return jsonify(dict(db.get_note(note_id)))
+
+    @app.get("/api/notes/<int:note_id>/revisions")
+    def notes_revisions(note_id):
+        require(db.get_note(note_id))
+        return jsonify(items=[dict(r) for r in db.list_note_revisions(note_id)])
+
+    @app.get("/api/notes/<int:note_id>/revisions/<int:version>")
+    def notes_revision(note_id, version):
+        return jsonify(require(db.get_note_revision(note_id, version)))
+
+    @app.delete("/api/notes/<int:note_id>")
+    def notes_delete(note_id):
+        require(db.get_note(note_id))
+        db.delete_note(note_id)
+        return "", 204
+
+    @app.get("/api/search")
+    def search():
+        limit = limit_arg()
+        offset = request.args.get("offset", 0, type=int)
+        if offset < 0:
+            abort(400, "offset must not be negative.")
+        rows = db.search_notes(request.args.get("q", ""), topic_id=request.args.get("topic_id", type=int),
+                               limit=limit, offset=offset)
+        next_offset = offset + len(rows) if len(rows) == limit else None
+        return jsonify(items=[dict(r) for r in rows], next_offset=next_offset)
+
+    @app.get("/metrics")
+    def metrics():
+        """Prometheus text for this worker process; empty unless NOTES_METRICS is set."""
+        return Response(instrumentation.prometheus_text(), mimetype="text/plain")
+
+    # ---------------------------
+    # Tutor
+    # ---------------------------
+
+    def tutor_args(topic_id):
+        require(db.get_topic(topic_id))
+        data = body()
+        question = (data.get("question") or "").strip()
+        if not question:
+            abort(400, "question is required.")
+        selected = ""
+        if data.get("note_id") is not None:
+            selected = require(db.get_note(data["note_id"]))["content"] or ""
+        return dict(
+            topic_id=topic_id,
+            selected_note_content=selected,
+            selected_note_id=data.get("note_id"),
+            question=question,
+            settings=tutor_settings(),
+        )
+
+    def tutor_settings():
+        settings = load_settings()
+        if not uses_chroma_server():
+            # workers must not share a local chroma directory; send note titles instead
+            settings = {**settings, "rag_top_k": 0}
+        return settings
+
+    @app.post("/api/topics/<int:topic_id>/tutor")
+    def tutor_ask(topic_id):
+        from ai_tutor import ask_tutor
+        return jsonify(answer=ask_tutor(**tutor_args(topic_id)))
+
+    @app.post("/api/topics/<int:topic_id>/tutor/stream")
+    def tutor_stream(topic_id):
+        """Server-sent events: one `data: {"delta": ...}` per chunk, then `event: done`."""
+        from ai_tutor import ask_tutor_stream
+        kwargs = tutor_args(topic_id)
+
+        def events():
+            try:
+                for delta in ask_tutor_stream(**kwargs):
+                    yield f"data: {json.dumps({'delta': delta}, ensure_ascii=False)}\n\n"
+            except Exception as e:
+                yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+                return
+            yield "event: done\ndata: {}\n\n"
+
+        return Response(stream_with_context(events()), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    return app
+
+
+if __name__ == "__main__":
+    create_app().run(threaded=True)
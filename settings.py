@@ -1,23 +1,203 @@
 import json
+import logging
 import os
+import tempfile
+import threading
+from pathlib import Path
 
 SETTINGS_PATH = "data/tutor_settings.json"
+# how often watch() looks at the settings file
+WATCH_MS = 1000
 
 DEFAULT_SETTINGS = {
     "language": "RO",
     "depth": "medium",
     "model": "gpt-4o-mini",
+    # model that folds old turns into the chat history summary
+    "summary_model": "gpt-4o-mini",
     "temperature": 0.5,
-    "max_tokens": 300
+    "max_tokens": 300,
+    # token budget for the chat history sent with each question
+    "context_token_budget": 2000,
+    # seconds before a tutor request is abandoned
+    "request_timeout": 60,
+    # note chunks retrieved per question (0 sends note titles instead)
+    "rag_top_k": 4,
+    # reuse answers to identical requests when temperature <= cache_max_temperature
+    "cache_responses": True,
+    "cache_max_temperature": 0.2,
+    # async tutor engine limits
+    "max_concurrent_requests": 4,
+    "requests_per_second": 3.0,
+    # send a long selected note's batch summary (study_batch.py) instead of its text
+    "use_note_summaries": True
 }
 
+log = logging.getLogger(__name__)
+
+_schema = None
+
+
+def settings_schema():
+    """The pydantic model for the settings file.
+
+    Built on first use rather than at import: pydantic costs ~150 ms, which
+    would otherwise land on app startup before the window is drawn.
+    """
+    global _schema
+    if _schema is None:
+        from typing import Literal
+        from pydantic import BaseModel, ConfigDict, Field
+
+        class TutorSettings(BaseModel):
+            # unknown keys are kept, so newer settings files survive older code
+            model_config = ConfigDict(extra="allow")
+
+            language: str = DEFAULT_SETTINGS["language"]
+            depth: Literal["short", "medium", "detailed"] = DEFAULT_SETTINGS["depth"]
+            model: str = DEFAULT_SETTINGS["model"]
+            summary_model: str = DEFAULT_SETTINGS["summary_model"]
+            temperature: float = Field(DEFAULT_SETTINGS["temperature"], ge=0, le=2)
+            max_tokens: int = Field(DEFAULT_SETTINGS["max_tokens"], gt=0)
+            context_token_budget: int = Field(DEFAULT_SETTINGS["context_token_budget"], ge=0)
+            request_timeout: float = Field(DEFAULT_SETTINGS["request_timeout"], gt=0)
+            rag_top_k: int = Field(DEFAULT_SETTINGS["rag_top_k"], ge=0)
+            cache_responses: bool = DEFAULT_SETTINGS["cache_responses"]
+            cache_max_temperature: float = Field(DEFAULT_SETTINGS["cache_max_temperature"], ge=0, le=2)
+            max_concurrent_requests: int = Field(DEFAULT_SETTINGS["max_concurrent_requests"], ge=1)
+            requests_per_second: float = Field(DEFAULT_SETTINGS["requests_per_second"], gt=0)
+            use_note_summaries: bool = DEFAULT_SETTINGS["use_note_summaries"]
+
+        _schema = TutorSettings
+    return _schema
+
+
+def validate_settings(data):
+    """Return data merged over the defaults and validated; raises pydantic.ValidationError,
+    or ValueError when data is not a dict."""
+    if not isinstance(data, dict):
+        raise ValueError(f"settings must be a JSON object, not {type(data).__name__}")
+    return settings_schema().model_validate({**DEFAULT_SETTINGS, **data}).model_dump()
+
+
+class SettingsService:
+    """Validated in-memory copy of the settings file.
+
+    get() costs one os.stat(): the file is parsed again only when its
+    mtime, size or inode changed. save() validates, writes a temp file and
+    renames it over the old one, so readers never see a half-written file.
+    Subscribers get fn(settings) whenever the settings change, through
+    save() or, once watch() runs, through an edit of the file on disk.
+    A file that fails validation is logged and the last good copy kept.
+    """
+
+    def __init__(self, path=SETTINGS_PATH):
+        self.path = Path(path)
+        self._data = None
+        self._signature = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._watch_job = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _refresh(self):
+        """Reload if the file changed; returns True when the settings changed. Needs _lock."""
+        signature = self._stat()
+        if signature is None:
+            self._write(DEFAULT_SETTINGS if self._data is None else self._data)
+            signature = self._stat()
+        if signature == self._signature and self._data is not None:
+            return False
+        self._signature = signature
+        old = self._data
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = validate_settings(json.load(f))
+        except ValueError as e:  # bad JSON and pydantic.ValidationError alike
+            log.warning("Ignoring invalid settings in %s: %s", self.path, e)
+            if self._data is not None:
+                return False
+            data = dict(DEFAULT_SETTINGS)
+        self._data = data
+        return old is not None and data != old
+
+    def _write(self, data):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=self.path.name + ".", suffix=".tmp", dir=self.path.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def get(self):
+        """The current settings as a dict (a copy; changing it changes nothing)."""
+        with self._lock:
+            changed = self._refresh()
+            data = dict(self._data)
+        if changed:
+            self._notify(data)
+        return data
+
+    def save(self, data):
+        data = validate_settings(data)
+        with self._lock:
+            self._write(data)
+            self._signature = self._stat()
+            changed = data != self._data
+            self._data = data
+        if changed:
+            self._notify(dict(data))
+
+    def update(self, **changes):
+        self.save({**self.get(), **changes})
+
+    def subscribe(self, fn):
+        self._subscribers.append(fn)
+
+    def unsubscribe(self, fn):
+        self._subscribers.remove(fn)
+
+    def _notify(self, data):
+        for fn in list(self._subscribers):
+            fn(dict(data))
+
+    def check(self):
+        """Reload if the file changed on disk, notifying subscribers."""
+        self.get()
+
+    def watch(self, root, interval_ms=WATCH_MS):
+        """Run check() every interval_ms on a Tk root (the Tk thread gets the notifications)."""
+        def tick():
+            try:
+                self.check()
+            finally:
+                # one failed check (say, an unreadable file) must not end the watching
+                self._watch_job = root.after(interval_ms, tick)
+        self.stop_watching(root)
+        self._watch_job = root.after(interval_ms, tick)
+
+    def stop_watching(self, root):
+        if self._watch_job is not None:
+            root.after_cancel(self._watch_job)
+            self._watch_job = None
+
+
+settings_service = SettingsService()
+
+
 def load_settings():
-    if not os.path.exists(SETTINGS_PATH):
-        save_settings(DEFAULT_SETTINGS)
-        return DEFAULT_SETTINGS
-    with open(SETTINGS_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return settings_service.get()
 
 def save_settings(data):
-    with open(SETTINGS_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+    settings_service.save(data)
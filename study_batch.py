@@ -0,0 +1,126 @@
+"""Batch summaries and study flashcards for new and changed notes.
+
+    python study_batch.py [--limit 500] [--batch-size 50] [--model gpt-4o-mini]
+
+A note is due when it has no summary made from its current version
+(notes.version; see the Study material section of db.py). Due notes are
+walked by id, batch_size at a time, and each note's summary and cards are
+committed as soon as both arrive. Those stored versions are the
+checkpoint: a run that crashes or is stopped picks up with the notes
+still due, and a note edited meanwhile comes round again on the next run.
+A note whose requests fail is skipped and retried on the next run.
+
+Requests go through AsyncTutorEngine, so max_concurrent_requests and
+requests_per_second from the tutor settings bound the load, and 429/5xx
+answers are retried with backoff.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+
+import db
+from async_tutor import AsyncTutorEngine
+
+# due notes fetched, and at most in flight, per round
+BATCH_SIZE = 50
+MAX_CARDS = 8
+SUMMARY_MAX_TOKENS = 250
+CARDS_MAX_TOKENS = 600
+
+SUMMARY_PROMPT = ("Rezumă nota de mai jos în 3-5 propoziții, păstrând definițiile, "
+                  "formulele și ideile principale. Răspunde în limba: {lang}.")
+CARDS_PROMPT = ("Scrie cel mult {n} întrebări de studiu, cu răspunsuri scurte, pe baza notei de mai jos. "
+                "Răspunde în limba: {lang}, doar cu o listă JSON de forma "
+                '[{{"q": "întrebare", "a": "răspuns"}}].')
+
+log = logging.getLogger(__name__)
+
+
+def parse_flashcards(text, limit=MAX_CARDS):
+    """[(question, answer)] from the model's JSON list; anything malformed is dropped."""
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end < start:
+        return []
+    try:
+        items = json.loads(text[start:end + 1])
+    except ValueError:
+        return []
+    cards = []
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        q, a = item.get("q"), item.get("a")
+        if isinstance(q, str) and isinstance(a, str) and q.strip() and a.strip():
+            cards.append((q.strip(), a.strip()))
+    return cards[:limit]
+
+
+async def process_note(engine, note, settings):
+    """Generate and store one note's summary and flashcards; returns whether they were stored."""
+    model = settings.get("model", "gpt-4o-mini")
+    lang = settings.get("language", "RO")
+    if not (note["content"] or "").strip():
+        # nothing to study; record it so the note isn't due again until edited
+        summary, cards = "", []
+    else:
+        text = f"{note['title']}\n\n{note['content']}"
+        summary, cards_text = await asyncio.gather(
+            engine.complete([{"role": "system", "content": SUMMARY_PROMPT.format(lang=lang)},
+                             {"role": "user", "content": text}], model, 0, SUMMARY_MAX_TOKENS),
+            engine.complete([{"role": "system", "content": CARDS_PROMPT.format(n=MAX_CARDS, lang=lang)},
+                             {"role": "user", "content": text}], model, 0, CARDS_MAX_TOKENS),
+        )
+        cards = parse_flashcards(cards_text)
+    return await asyncio.to_thread(db.save_study_material, note["id"], note["version"],
+                                   summary.strip(), cards, model)
+
+
+async def run(engine, settings, limit=None, batch_size=BATCH_SIZE):
+    """Process due notes (at most limit); returns (done, failed)."""
+    done = failed = 0
+    after_id = 0
+    while limit is None or done + failed < limit:
+        size = batch_size if limit is None else min(batch_size, limit - done - failed)
+        notes = await asyncio.to_thread(db.notes_needing_study, after_id, size)
+        if not notes:
+            break
+        after_id = notes[-1]["id"]
+        results = await asyncio.gather(*(process_note(engine, note, settings) for note in notes),
+                                       return_exceptions=True)
+        for note, result in zip(notes, results):
+            if isinstance(result, Exception):
+                log.warning("Study material for note %s failed: %s", note["id"], result)
+                failed += 1
+            else:
+                done += 1
+    return done, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize new and changed notes and write flashcards.")
+    parser.add_argument("--limit", type=int, help="process at most this many notes")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--model", help="default: the tutor settings' model")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from settings import load_settings
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    db.init_db()
+    settings = load_settings()
+    if args.model:
+        settings["model"] = args.model
+
+    async def go():
+        return await run(AsyncTutorEngine.from_settings(settings), settings, args.limit, args.batch_size)
+
+    done, failed = asyncio.run(go())
+    print(f"Processed {done} notes ({failed} failed).")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+import time
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def tmp_db(tmp_path, monkeypatch):
+    """Point db.py at a fresh database file for the duration of a test."""
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "topics.db")
+    db.init_db()
+    yield tmp_path / "topics.db"
+    db.close_conn()
+
+
+class FakeRoot:
+    """Stands in for tk.Tk: after() callbacks run when the test calls pump()."""
+
+    def __init__(self):
+        self.jobs = {}
+        self.next_id = 0
+
+    def after(self, ms, fn, *args):
+        self.next_id += 1
+        self.jobs[self.next_id] = (fn, args)
+        return self.next_id
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+    def pump(self, until, timeout=2.0):
+        end = time.monotonic() + timeout
+        while not until() and time.monotonic() < end:
+            for job in list(self.jobs):
+                fn, args = self.jobs.pop(job)
+                fn(*args)
+            time.sleep(0.005)
+
+
+@pytest.fixture
+def fake_root():
+    return FakeRoot()
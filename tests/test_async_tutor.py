@@ -0,0 +1,135 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("openai")
+from openai import AsyncOpenAI, BadRequestError
+
+from async_tutor import AsyncTutorEngine, TokenBucket
+
+
+class FakeOpenAI(ThreadingHTTPServer):
+    """Minimal OpenAI-compatible /v1/chat/completions endpoint.
+
+    `failures` is a list of status codes returned (in order) before the
+    server starts answering; `delay` holds every answer for that long.
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.failures = []
+        self.delay = 0.0
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests.append(body)
+            status = server.failures.pop(0) if server.failures else 200
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        time.sleep(server.delay)
+        with server.lock:
+            server.active -= 1
+
+        if status == 200:
+            payload = {
+                "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "echo: " + body["messages"][-1]["content"]}}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }
+        else:
+            payload = {"error": {"message": f"status {status}", "type": "test"}}
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", "0.01")
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def fake_openai():
+    server = FakeOpenAI()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def engine_for(server, **kwargs):
+    client = AsyncOpenAI(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+                         api_key="test", max_retries=0)
+    kwargs.setdefault("base_delay", 0.01)
+    return AsyncTutorEngine(client=client, requests_per_second=1000, burst=1000, **kwargs)
+
+
+def user(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_retries_429_and_5xx_then_succeeds(fake_openai):
+    fake_openai.failures = [429, 503, 500]
+    engine = engine_for(fake_openai)
+    answer = asyncio.run(engine.complete(user("salut"), "gpt-test", 0.2, 50))
+    assert answer == "echo: salut"
+    assert len(fake_openai.requests) == 4
+
+
+def test_client_errors_are_not_retried(fake_openai):
+    fake_openai.failures = [400]
+    engine = engine_for(fake_openai)
+    with pytest.raises(BadRequestError):
+        asyncio.run(engine.complete(user("salut"), "gpt-test", 0.2, 50))
+    assert len(fake_openai.requests) == 1
+
+
+def test_identical_inflight_requests_are_coalesced(fake_openai):
+    fake_openai.delay = 0.1
+    engine = engine_for(fake_openai)
+
+    async def main():
+        return await asyncio.gather(*[engine.complete(user(q), "gpt-test", 0.2, 50)
+                                      for q in ["a", "a", "a", "b"]])
+
+    assert asyncio.run(main()) == ["echo: a"] * 3 + ["echo: b"]
+    assert len(fake_openai.requests) == 2
+
+
+def test_concurrency_limit(fake_openai):
+    fake_openai.delay = 0.05
+    engine = engine_for(fake_openai, max_concurrency=2)
+
+    async def main():
+        await asyncio.gather(*[engine.complete(user(str(i)), "gpt-test", 0.2, 50) for i in range(6)])
+
+    asyncio.run(main())
+    assert fake_openai.max_active == 2
+
+
+def test_token_bucket_limits_rate():
+    async def main():
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) >= 0.09
@@ -0,0 +1,15 @@
+from benchmarks.run import compare, measure, note_records
+
+
+def test_compare_flags_only_real_regressions():
+    baseline = {"1000": {"search": {"median_ms": 10.0}, "tiny": {"median_ms": 0.01}}}
+    results = {"1000": {"search": {"median_ms": 14.0}, "tiny": {"median_ms": 0.03},
+                        "new": {"median_ms": 5.0}}}
+    assert compare(results, baseline, threshold=0.25) == ["1000/search: 10.000 ms -> 14.000 ms"]
+    assert compare(results, baseline, threshold=0.5) == []
+
+
+def test_measure_and_corpus_are_deterministic():
+    stats = measure(lambda: None, repeat=5)
+    assert stats["repeat"] == 5 and stats["min_ms"] <= stats["median_ms"] <= stats["p95_ms"]
+    assert list(note_records(20)) == list(note_records(20))
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+import bulk_io
+import db
+
+
+def records(n, topics=3):
+    for i in range(n):
+        yield {"topic": f"Topic {i % topics}", "topic_description": f"desc {i % topics}",
+               "title": f"Note {i}", "content": f"continut numarul {i}"}
+
+
+def test_import_notes_batches_and_indexes(tmp_db):
+    existing = db.create_topic("Topic 0", "already here")
+    events = []
+    listener = lambda event, **ids: events.append((event, ids))
+    db.add_listener(listener)
+    try:
+        assert db.import_notes(records(25), batch_size=4) == (2, 25)
+    finally:
+        db.remove_listener(listener)
+
+    assert len(db.get_topics()) == 3
+    assert len(db.get_notes_by_topic(existing)) == 9
+    assert [r["title"] for r in db.search_notes("numarul 17")] == ["Note 17"]
+    assert [e for e, _ in events].count("topic_created") == 2
+    assert events[-1][0] == "notes_imported"
+
+    # the insert trigger is back, so single inserts keep being indexed
+    db.create_note(existing, "Later", "adaugata ulterior")
+    assert [r["title"] for r in db.search_notes("ulterior")] == ["Later"]
+
+
+def test_failed_import_rolls_back_everything(tmp_db):
+    def broken():
+        yield from records(3)
+        raise ValueError("bad line")
+
+    with pytest.raises(ValueError):
+        db.import_notes(broken(), batch_size=2)
+    assert db.get_topics() == []
+    assert db.get_conn().execute(
+        "SELECT 1 FROM sqlite_master WHERE type='trigger' AND name='notes_fts_ai'"
+    ).fetchone()
+
+
+@pytest.mark.parametrize("target", ["notes.jsonl", "notes.csv", "notes_md"])
+def test_export_import_roundtrip(tmp_db, tmp_path, monkeypatch, target):
+    db.import_notes(records(10))
+    db.update_note(1, "Note 0", "linia 1\n\nlinia 2, cu \"ghilimele\"")
+    path = tmp_path / target
+    assert bulk_io.export_file(path) == 10
+
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "copy.db")
+    db.init_db()
+    assert bulk_io.import_file(path) == (3, 10)
+
+    copied = [(r["topic"], r["topic_description"], r["title"], r["content"]) for r in db.iter_notes()]
+    monkeypatch.setattr(db, "DB_PATH", tmp_db)
+    original = [(r["topic"], r["topic_description"], r["title"], r["content"]) for r in db.iter_notes()]
+    assert sorted(copied) == sorted(original)
+
+
+def test_markdown_without_topic_file(tmp_db, tmp_path):
+    (tmp_path / "md" / "Istorie").mkdir(parents=True)
+    (tmp_path / "md" / "Istorie" / "daci.md").write_text("Fara titlu.", encoding="utf-8")
+    bulk_io.import_file(tmp_path / "md")
+    note = db.get_note(1)
+    assert (note["title"], note["content"]) == ("daci", "Fara titlu.")
+    assert db.get_topic(note["topic_id"])["name"] == "Istorie"
+
+
+def test_jsonl_export_keeps_created_at(tmp_db, tmp_path):
+    db.import_notes([{"topic": "T", "title": "a", "content": "b", "created_at": "2024-01-01T00:00:00"}])
+    bulk_io.export_file(tmp_path / "out.jsonl")
+    line = json.loads((tmp_path / "out.jsonl").read_text(encoding="utf-8"))
+    assert line["created_at"] == "2024-01-01T00:00:00"
@@ -0,0 +1,77 @@
+import sqlite3
+
+import pytest
+
+import compression
+import db
+
+BODY = "\n".join(f"paragraful {i} despre fotosinteza si clorofila" for i in range(200))
+
+
+def stored(note_id):
+    return db.get_conn().execute("SELECT content FROM notes WHERE id=?", (note_id,)).fetchone()[0]
+
+
+def test_encode_keeps_small_text_and_marks_large():
+    assert compression.encode("scurt") == "scurt"
+    packed = compression.encode(BODY)
+    assert isinstance(packed, bytes) and packed[:1] == compression.ZLIB
+    assert len(packed) < len(BODY) / 4
+    assert compression.decode(packed) == BODY
+    assert compression.decode("scurt") == "scurt"
+    with pytest.raises(ValueError):
+        compression.decode(b"?abc")
+
+
+def test_notes_and_chat_are_stored_compressed_and_read_plain(tmp_db):
+    topic_id = db.create_topic("T")
+    note_id = db.create_note(topic_id, "Biologie", BODY)
+    assert isinstance(stored(note_id), bytes)
+    assert db.get_note(note_id)["content"] == BODY
+    assert db.get_notes_by_topic(topic_id)[0]["content"] == BODY
+    assert next(db.iter_notes())["content"] == BODY
+
+    # the index sees plain text, and snippets come out decompressed
+    hit, = db.search_notes("clorofila")
+    assert hit["id"] == note_id and "[clorofila]" in hit["snippet"]
+
+    db.update_note(note_id, "Biologie", BODY + "\nmitocondrie")
+    assert db.search_notes("mitocondrie")[0]["id"] == note_id
+    assert db.get_note_revision(note_id, 1)["content"] == BODY
+
+    db.add_chat_messages(topic_id, [{"role": "user", "content": BODY}])
+    assert db.get_chat_messages(topic_id)[0]["content"] == BODY
+
+
+def test_codec_off_and_plain_rows_stay_readable(tmp_db, monkeypatch):
+    monkeypatch.setattr(compression, "_codec", "off")
+    topic_id = db.create_topic("T")
+    note_id = db.create_note(topic_id, "t", BODY)
+    assert stored(note_id) == BODY
+    monkeypatch.setattr(compression, "_codec", "zlib")
+
+    assert db.get_note(note_id)["content"] == BODY
+    assert db.compress_stored_notes() == 1
+    assert isinstance(stored(note_id), bytes)
+    assert db.get_note(note_id)["version"] == 1
+    assert db.search_notes("fotosinteza")[0]["id"] == note_id
+
+
+def test_old_fts_index_is_rebuilt_on_the_plain_view(tmp_path, monkeypatch):
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY AUTOINCREMENT, topic_id INTEGER NOT NULL, "
+                 "title TEXT NOT NULL, content TEXT, created_at TEXT NOT NULL)")
+    conn.execute("CREATE VIRTUAL TABLE notes_fts USING fts5(title, content, content='notes', content_rowid='id')")
+    conn.execute("INSERT INTO notes (topic_id, title, content, created_at) VALUES (1, 't', 'vechi', 'now')")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db.init_db()
+    try:
+        assert db.search_notes("vechi")[0]["id"] == 1
+        note_id = db.create_note(1, "nou", BODY)
+        assert db.search_notes("clorofila")[0]["id"] == note_id
+    finally:
+        db.close_conn()
@@ -0,0 +1,52 @@
+"""Several processes sharing one topics.db, as with multiple app instances."""
+import json
+import multiprocessing
+from pathlib import Path
+
+import db
+
+PROCESSES = 4
+ROUNDS = 40
+
+
+def hammer(path, legacy, worker, topic_id, note_id):
+    db.DB_PATH = Path(path)
+    # every instance tries the one-shot import of the legacy history at startup
+    db.migrate_chat_history_json(legacy)
+    for i in range(ROUNDS):
+        db.add_chat_messages(topic_id, [{"role": "user", "content": f"{worker}:{i}"},
+                                        {"role": "assistant", "content": "ok"}])
+        # read-modify-write of a shared counter, retried on conflict
+        while True:
+            note = db.get_note(note_id)
+            try:
+                db.update_note(note_id, note["title"], str(int(note["content"]) + 1),
+                               expected_version=note["version"])
+                break
+            except db.NoteConflict:
+                pass
+    db.close_conn()
+
+
+def test_processes_do_not_lose_writes(tmp_db, tmp_path):
+    topic_id = db.create_topic("Shared")
+    note_id = db.create_note(topic_id, "counter", "0")
+    legacy = tmp_path / "chat_history.json"
+    legacy.write_text(json.dumps({"999": [{"role": "user", "content": "vechi"}]}), encoding="utf-8")
+
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=hammer, args=(str(tmp_db), str(legacy), w, topic_id, note_id))
+             for w in range(PROCESSES)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=120)
+        assert p.exitcode == 0
+
+    note = db.get_note(note_id)
+    assert int(note["content"]) == PROCESSES * ROUNDS
+    assert note["version"] == 1 + PROCESSES * ROUNDS
+    messages = db.get_chat_messages(topic_id)
+    assert len(messages) == 2 * PROCESSES * ROUNDS
+    assert len({m["content"] for m in messages if m["role"] == "user"}) == PROCESSES * ROUNDS
+    assert len(db.get_chat_messages(999)) == 1
@@ -0,0 +1,75 @@
+import db
+from context_window import ContextWindow, message_tokens
+
+
+def fake_summarize(calls):
+    def summarize(previous, messages, max_tokens):
+        calls.append([m["content"] for m in messages])
+        return " | ".join(filter(None, [previous] + [m["content"] for m in messages]))
+    return summarize
+
+
+def add_turns(topic_id, n, start=0):
+    for i in range(start, start + n):
+        db.add_chat_messages(topic_id, [
+            {"role": "user", "content": f"q{i} " + "x" * 36},
+            {"role": "assistant", "content": f"a{i} " + "y" * 36},
+        ])
+
+
+def test_short_history_is_sent_verbatim(tmp_db):
+    calls = []
+    add_turns(1, 2)
+    messages = ContextWindow(fake_summarize(calls)).build(1, budget=1000)
+    assert [m["content"][:2] for m in messages] == ["q0", "a0", "q1", "a1"]
+    assert calls == []
+
+
+def test_old_turns_fold_into_cached_summary(tmp_db):
+    calls = []
+    window = ContextWindow(fake_summarize(calls), page_size=3)
+    add_turns(1, 10)
+
+    budget = 80  # 60 for the window: four 15-token messages
+    messages = window.build(1, budget)
+    assert messages[0]["role"] == "system"
+    assert [m["content"][:2] for m in messages[1:]] == ["q8", "a8", "q9", "a9"]
+    assert sum(message_tokens(m) for m in messages[1:]) <= budget
+    assert len(calls) == 1 and calls[0][0].startswith("q0")
+
+    # nothing new dropped out: the stored summary is reused as is
+    assert window.build(1, budget) == messages
+    assert len(calls) == 1
+
+    # one more turn pushes exactly one turn into the summary
+    add_turns(1, 1, start=10)
+    messages = window.build(1, budget)
+    assert len(calls) == 2
+    assert [c[:2] for c in calls[1]] == ["q8", "a8"]
+    assert [m["content"][:3] for m in messages[1:]] == ["q9 ", "a9 ", "q10", "a10"]
+
+
+def test_tutor_summary_uses_the_settings_model_and_request_timeout(tmp_db, monkeypatch):
+    from types import SimpleNamespace
+
+    import ai_tutor
+
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="rezumat"))], usage=None)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(ai_tutor, "get_client", lambda: client)
+    monkeypatch.setattr(ai_tutor, "_history_migrated", True)
+    topic_id = db.create_topic("T")
+    add_turns(topic_id, 20)
+    settings = {"rag_top_k": 0, "context_token_budget": 200, "summary_model": "mic", "request_timeout": 9}
+
+    ai_tutor.build_messages(topic_id, "", "?", settings, timeout=3)
+    assert (calls[0]["model"], calls[0]["timeout"]) == ("mic", 3)
+    add_turns(topic_id, 5, start=20)
+    del settings["summary_model"]
+    ai_tutor.build_messages(topic_id, "", "?", settings)
+    assert (calls[1]["model"], calls[1]["timeout"]) == (ai_tutor.DEFAULT_SUMMARY_MODEL, 9)
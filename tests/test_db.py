@@ -0,0 +1,202 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+
+import db
+
+
+def test_connection_is_reused_per_thread(tmp_db):
+    assert db.get_conn() is db.get_conn()
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(db.get_conn()))
+    t.start()
+    t.join()
+    assert other[0] is not db.get_conn()
+
+
+def test_pragmas(tmp_db):
+    conn = db.get_conn()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+
+def test_delete_topic_cascades_to_notes(tmp_db):
+    topic_id = db.create_topic("Python", "Limbaj de programare.")
+    db.create_note(topic_id, "Variabile", "Ce este o variabilă.")
+    db.create_note(topic_id, "Liste", "Liste și operații.")
+    assert len(db.get_notes_by_topic(topic_id)) == 2
+
+    db.delete_topic(topic_id)
+    assert db.get_notes_by_topic(topic_id) == []
+
+
+def test_transaction_rolls_back_on_error(tmp_db):
+    with pytest.raises(RuntimeError):
+        with db.transaction() as c:
+            c.execute("INSERT INTO topics (name, description) VALUES ('x', '')")
+            raise RuntimeError
+    assert db.get_topics() == []
+
+
+def test_crud_roundtrip(tmp_db):
+    topic_id = db.create_topic("ML")
+    note_id = db.create_note(topic_id, "Old", "old body")
+    db.update_note(note_id, "New", "new body")
+    note = db.get_notes_by_topic(topic_id)[0]
+    assert (note["title"], note["content"]) == ("New", "new body")
+
+    db.update_topic(topic_id, "Machine Learning", "Modele.")
+    assert db.get_topics()[0]["name"] == "Machine Learning"
+
+    db.delete_note(note_id)
+    assert db.get_notes_by_topic(topic_id) == []
+
+
+def test_search_notes_ranks_title_hits_first(tmp_db):
+    py = db.create_topic("Python")
+    ml = db.create_topic("ML")
+    db.create_note(py, "Liste", "O listă poate conține variabile de orice tip.")
+    db.create_note(py, "Variabile", "Ce este o variabilă în Python.")
+    db.create_note(ml, "Regresie", "Variabile dependente și independente.")
+
+    hits = db.search_notes("variab")
+    assert [h["title"] for h in hits][0] == "Variabile"
+    assert {h["topic_id"] for h in hits} == {py, ml}
+    assert "[" in hits[0]["snippet"]
+
+    assert [h["title"] for h in db.search_notes("variab", topic_id=ml)] == ["Regresie"]
+
+
+def test_search_index_gains_prefix_indexes(tmp_db):
+    note_id = db.create_note(db.create_topic("Python"), "Bucle", "for si while")
+    with db.transaction() as c:
+        for trigger in ("notes_fts_ai", "notes_fts_ad", "notes_fts_au"):
+            c.execute(f"DROP TRIGGER {trigger}")
+        c.execute("DROP TABLE notes_fts")
+        c.execute("CREATE VIRTUAL TABLE notes_fts USING fts5(title, content, "
+                  "content='notes_plain', content_rowid='id')")
+    db.init_db()
+    sql = db.get_conn().execute("SELECT sql FROM sqlite_master WHERE name='notes_fts'").fetchone()[0]
+    assert "prefix='1 2 3'" in sql
+    assert [h["id"] for h in db.search_notes("bu")] == [note_id]
+    # a single letter matches whole words only
+    assert db.search_notes("b") == [] and db._fts_query("b wh") == '"b" "wh"*'
+
+
+def test_search_index_follows_updates_and_deletes(tmp_db):
+    topic_id = db.create_topic("Python")
+    note_id = db.create_note(topic_id, "Dicționare", "chei și valori")
+    assert db.search_notes("dictionare")  # diacritics folded
+
+    db.update_note(note_id, "Seturi", "elemente unice")
+    assert db.search_notes("chei") == []
+    assert db.search_notes("unice")
+
+    db.delete_note(note_id)
+    assert db.search_notes("unice") == []
+    assert db.search_notes("  ") == []
+
+
+def test_chat_messages_newest_window(tmp_db):
+    db.add_chat_messages(1, [{"role": "user", "content": f"q{i}"} for i in range(5)])
+    db.add_chat_messages(2, [{"role": "user", "content": "other topic"}])
+
+    assert [m["content"] for m in db.get_chat_messages(1)] == ["q0", "q1", "q2", "q3", "q4"]
+    last = db.get_chat_messages(1, limit=2)
+    assert [m["content"] for m in last] == ["q3", "q4"]
+    older = db.get_chat_messages(1, limit=2, before_id=last[0]["id"])
+    assert [m["content"] for m in older] == ["q1", "q2"]
+
+
+def test_migrate_chat_history_json(tmp_db, tmp_path):
+    legacy = tmp_path / "chat_history.json"
+    legacy.write_text(json.dumps({
+        "1": [{"role": "user", "content": "Ce e o listă?"},
+              {"role": "assistant", "content": "O colecție ordonată."}],
+        "7": [{"role": "user", "content": "salut"}],
+    }), encoding="utf-8")
+
+    assert db.migrate_chat_history_json(legacy) == 3
+    assert not legacy.exists()
+    assert (tmp_path / "chat_history.json.migrated").exists()
+    assert [m["role"] for m in db.get_chat_messages(1)] == ["user", "assistant"]
+    assert db.migrate_chat_history_json(legacy) == 0
+
+
+def test_migrate_chat_history_json_keeps_a_file_it_could_not_import(tmp_db, tmp_path, caplog):
+    legacy = tmp_path / "chat_history.json"
+    legacy.write_text("{nu e json", encoding="utf-8")
+    assert db.migrate_chat_history_json(legacy) == 0
+    assert legacy.read_text(encoding="utf-8") == "{nu e json"
+    assert "not migrated" in caplog.text
+
+    # a failed import is rolled back and the file put back for the next try
+    legacy.write_text(json.dumps({"1": [{"role": "user", "content": "q"}, {"role": "user"}]}),
+                      encoding="utf-8")
+    with pytest.raises(KeyError):
+        db.migrate_chat_history_json(legacy)
+    assert legacy.exists() and db.get_chat_messages(1) == []
+    assert list(tmp_path.glob("chat_history.json.*")) == []
+
+
+def test_list_notes_keyset_pages(tmp_db):
+    topic_id = db.create_topic("Python")
+    ids = [db.create_note(topic_id, f"n{i}", "conținut lung " * 100) for i in range(5)]
+    db.create_note(db.create_topic("Altul"), "străin", "")
+
+    first = db.list_notes(topic_id, limit=2)
+    assert [n["id"] for n in first] == ids[:-3:-1]
+    assert set(first[0].keys()) == {"id", "title", "created_at"}
+    second = db.list_notes(topic_id, before_id=first[-1]["id"], limit=2)
+    assert [n["id"] for n in second] == [ids[2], ids[1]]
+    last = db.list_notes(topic_id, before_id=second[-1]["id"], limit=2)
+    assert [n["id"] for n in last] == [ids[0]]
+
+    assert db.get_note(ids[0])["content"].startswith("conținut")
+    plan = db.get_conn().execute(
+        "EXPLAIN QUERY PLAN SELECT id, title, created_at FROM notes "
+        "WHERE topic_id=? AND id < ? ORDER BY id DESC LIMIT ?", (topic_id, 3, 2)
+    ).fetchall()
+    assert "idx_notes_topic_id" in plan[0]["detail"]
+
+
+def test_list_topics_keyset_pages(tmp_db):
+    ids = [db.create_topic(f"t{i}") for i in range(3)]
+    assert [t["id"] for t in db.list_topics(limit=2)] == [ids[2], ids[1]]
+    assert [t["id"] for t in db.list_topics(before_id=ids[1])] == [ids[0]]
+
+
+def test_update_note_detects_conflicts(tmp_db):
+    note_id = db.create_note(db.create_topic("T"), "a", "v1")
+    assert db.get_note(note_id)["version"] == 1
+    assert db.update_note(note_id, "a", "v2", expected_version=1) == 2
+
+    with pytest.raises(db.NoteConflict) as err:
+        db.update_note(note_id, "a", "stale", expected_version=1)
+    assert err.value.current_version == 2
+    assert db.get_note(note_id)["content"] == "v2"
+
+    # without expected_version the last writer wins, as before
+    assert db.update_note(note_id, "a", "v3") == 3
+
+
+def test_old_database_gains_version_columns(tmp_path, monkeypatch):
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY AUTOINCREMENT, topic_id INTEGER NOT NULL, "
+                 "title TEXT NOT NULL, content TEXT, created_at TEXT NOT NULL)")
+    conn.execute("INSERT INTO notes (topic_id, title, content, created_at) VALUES (1, 't', 'c', 'now')")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db.init_db()
+    try:
+        assert db.get_note(1)["version"] == 1
+        assert db.update_note(1, "t", "c2", expected_version=1) == 2
+    finally:
+        db.close_conn()
@@ -0,0 +1,65 @@
+import json
+import urllib.request
+
+import pytest
+
+import db
+import instrumentation
+from instrumentation import incr, span, timed
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    monkeypatch.setattr(instrumentation, "_enabled", True)
+    instrumentation.reset()
+    yield instrumentation
+    instrumentation.reset()
+
+
+def test_disabled_records_nothing(monkeypatch):
+    monkeypatch.setattr(instrumentation, "_enabled", False)
+    instrumentation.reset()
+    with span("x_seconds"):
+        pass
+    incr("x_total")
+    assert timed("y_seconds")(lambda: 42)() == 42
+    assert instrumentation.snapshot() == {"histograms": [], "counters": []}
+
+
+def test_histograms_and_counters(metrics):
+    for _ in range(3):
+        with span("phase_seconds", phase="api_call"):
+            pass
+    incr("tokens_total", 10, kind="prompt")
+    incr("tokens_total", 5, kind="prompt")
+
+    text = metrics.prometheus_text()
+    assert "# TYPE phase_seconds histogram" in text
+    assert 'phase_seconds_bucket{phase="api_call",le="0.0005"} 3' in text
+    assert 'phase_seconds_count{phase="api_call"} 3' in text
+    assert 'tokens_total{kind="prompt"} 15' in text
+
+
+def test_db_calls_are_timed(metrics, tmp_db):
+    topic = db.create_topic("T")
+    db.get_topic(topic)
+    db.get_topic(topic)
+    counts = {h["labels"]["fn"]: h["count"] for h in metrics.snapshot()["histograms"]
+              if h["name"] == "db_call_seconds"}
+    assert counts["get_topic"] == 2
+    assert counts["create_topic"] == 1
+
+
+def test_exports(metrics, tmp_path):
+    incr("requests_total")
+    metrics.write_json(tmp_path / "m.json")
+    assert json.loads((tmp_path / "m.json").read_text())["counters"][0]["value"] == 1
+
+    server = metrics.serve(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        body = urllib.request.urlopen(url, timeout=5).read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert "requests_total 1" in body
@@ -0,0 +1,104 @@
+import pytest
+
+import db
+from note_index import HashingEmbedder, NoteIndex, chunk_text
+
+
+def test_chunk_text_packs_paragraphs_up_to_size():
+    content = "\n\n".join(["a" * 30, "b" * 30, "c " * 60])
+    chunks = chunk_text("Titlu", content, size=70)
+    assert all(c.startswith("Titlu\n") for c in chunks)
+    assert all(len(c) - len("Titlu\n") <= 70 for c in chunks)
+    assert "".join(chunks).count("c") == 60
+    assert chunk_text("Gol", "") == ["Gol"]
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    embed = HashingEmbedder(dim=64)
+    a, b = embed(["Rețele neuronale", "retele NEURONALE"])
+    assert a == b
+    assert abs(sum(v * v for v in a) - 1.0) < 1e-9
+
+
+@pytest.fixture
+def index(tmp_db):
+    chromadb = pytest.importorskip("chromadb")
+    index = NoteIndex(embedder=HashingEmbedder(), client=chromadb.EphemeralClient(),
+                      collection_name=f"test_{id(tmp_db)}")
+    yield index
+    if index._on_change in db._listeners:
+        db.remove_listener(index._on_change)
+
+
+def test_query_follows_note_changes(index):
+    py = db.create_topic("Python")
+    ml = db.create_topic("ML")
+    lists = db.create_note(py, "Liste", "Listele sunt colecții ordonate și mutabile.")
+    db.create_note(py, "Funcții", "O funcție se definește cu def și returnează o valoare.")
+    db.create_note(ml, "Liste în ML", "Listele de exemple pentru antrenare.")
+
+    hits = index.query(py, "ce sunt listele ordonate", k=1)
+    assert hits[0].startswith("Liste\n")
+
+    db.update_note(lists, "Tupluri", "Tuplurile sunt imutabile.")
+    assert index.query(py, "tupluri imutabile", k=1)[0].startswith("Tupluri\n")
+
+    db.delete_note(lists)
+    assert all("Tupluri" not in h for h in index.query(py, "tupluri", k=5))
+
+    db.delete_topic(ml)
+    assert index.query(ml, "liste", k=5) == []
+
+
+def test_notes_written_elsewhere_are_indexed(index):
+    import threading
+
+    topic = db.create_topic("Python")
+    db.create_note(topic, "Liste", "Listele sunt colecții ordonate.")
+    index.query(topic, "liste", k=1)
+
+    # a write this index is not told about, from another connection (as another process would)
+    db.remove_listener(index._on_change)
+    worker = threading.Thread(target=lambda: db.import_notes(
+        [{"topic": "Python", "title": "Dicționare", "content": "Dicționarele asociază chei cu valori."}]))
+    worker.start()
+    worker.join()
+    assert index.query(topic, "dicționare chei valori", k=1)[0].startswith("Dicționare\n")
+
+    # and a new index on the same persistent collection catches up with what it missed
+    db.create_note(topic, "Seturi", "Seturile nu au duplicate.")
+    fresh = NoteIndex(embedder=HashingEmbedder(), client=index._client, collection_name=index.collection_name)
+    try:
+        assert fresh.query(topic, "seturi duplicate", k=1)[0].startswith("Seturi\n")
+    finally:
+        db.remove_listener(fresh._on_change)
+
+
+def test_query_only_embeds_its_own_topic(index):
+    texts = []
+    embed = index._embedder
+    index._embedder = lambda docs: texts.extend(docs) or embed(docs)
+    a = db.create_topic("A")
+    b = db.create_topic("B")
+    db.create_note(a, "Liste", "Listele sunt ordonate.")
+    db.import_notes({"topic": "B", "title": f"nota {i}", "content": "text"} for i in range(50))
+
+    index.query(a, "liste", k=1)
+    assert texts == ["Liste\nListele sunt ordonate.", "liste"]
+    index.query(a, "ordonate", k=1)
+    assert len(texts) == 3
+    assert index.query(b, "nota", k=1) and len(texts) == 3 + 50 + 1
+
+
+def test_tutor_sends_titles_when_retrieval_fails(tmp_db, monkeypatch):
+    import ai_tutor
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("model download failed")
+
+    monkeypatch.setattr(ai_tutor, "_history_migrated", True)
+    monkeypatch.setattr(ai_tutor.note_index, "query", broken)
+    topic = db.create_topic("Python")
+    db.create_note(topic, "Liste", "Listele sunt ordonate.")
+    messages = ai_tutor.build_messages(topic, "", "?", {"rag_top_k": 4})
+    assert "Liste" in messages[0]["content"]
@@ -0,0 +1,75 @@
+import ai_tutor
+import db
+from prompt_context import TopicContextCache
+
+SETTINGS = {"language": "RO", "depth": "short", "rag_top_k": 0, "context_token_budget": 2000}
+
+
+def test_block_is_reused_until_the_topic_changes(tmp_db):
+    cache = TopicContextCache()
+    topic_id = db.create_topic("Chimie", "acizi si baze")
+    other_id = db.create_topic("Istorie")
+    note_id = db.create_note(topic_id, "pH", "")
+    block = cache.get(topic_id)
+    assert "**Chimie**" in block.header and block.titles.endswith("pH")
+    assert block.header_tokens > 0 and cache.get(topic_id) is block
+
+    other = cache.get(other_id)
+    db.update_note(note_id, "pH si pOH", "")
+    assert cache.get(other_id) is other
+    assert cache.get(topic_id).titles.endswith("pH si pOH")
+
+    for change in (lambda: db.create_note(topic_id, "titrare", ""),
+                   lambda: db.delete_note(note_id),
+                   lambda: db.update_topic(topic_id, "Chimie anorganica", ""),
+                   lambda: db.import_notes([{"topic": "Istorie", "title": "Dacia", "content": ""}])):
+        block = cache.get(topic_id)
+        change()
+        assert cache.get(topic_id) is not block
+    assert cache.get(other_id).titles.endswith("Dacia")
+
+    db.delete_topic(topic_id)
+    assert cache.get(topic_id) is None
+
+
+def test_system_prompt_is_byte_stable_across_questions(tmp_db, monkeypatch):
+    monkeypatch.setattr(ai_tutor, "_history_migrated", True)
+    topic_id = db.create_topic("Fizica", "mecanica")
+    db.create_note(topic_id, "Newton", "F = m * a")
+    db.add_chat_messages(topic_id, [{"role": "user", "content": "salut"},
+                                    {"role": "assistant", "content": "buna"}])
+
+    first = ai_tutor.build_messages(topic_id, "", "Ce e forta?", SETTINGS)
+    second = ai_tutor.build_messages(topic_id, "F = m * a", "Si masa?", SETTINGS)
+    assert first[0] == second[0] and "Newton" in first[0]["content"]
+    # history keeps its place right after the shared prefix; the note goes last, before the question
+    assert first[1:3] == second[1:3]
+    assert [m["content"] for m in second[3:]] == ["Fragment notă selectată:\nF = m * a", "Si masa?"]
+    assert len(first) == 4
+
+
+def test_changes_from_other_processes_are_noticed(tmp_db):
+    import threading
+
+    cache = TopicContextCache()
+    db.remove_listener(cache._on_change)  # as if the writes below came from another process
+    topic_id = db.create_topic("Chimie")
+    note_id = db.create_note(topic_id, "pH", "")
+    block = cache.get(topic_id)
+    assert cache.get(topic_id) is block
+
+    def elsewhere(fn):
+        # a different connection, so the test thread's connection sees a new PRAGMA data_version
+        worker = threading.Thread(target=fn)
+        worker.start()
+        worker.join()
+
+    elsewhere(lambda: db.add_chat_messages(topic_id, [{"role": "user", "content": "x"}]))
+    assert cache.get(topic_id) is block  # unrelated writes only cost a stamp check
+
+    elsewhere(lambda: db.update_note(note_id, "pH si pOH", ""))
+    assert cache.get(topic_id).titles.endswith("pH si pOH")
+    elsewhere(lambda: db.update_topic(topic_id, "Chimie anorganica", ""))
+    assert "Chimie anorganica" in cache.get(topic_id).header
+    elsewhere(lambda: db.delete_topic(topic_id))
+    assert cache.get(topic_id) is None
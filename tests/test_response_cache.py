@@ -0,0 +1,62 @@
+from response_cache import ResponseCache, cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_key_covers_messages_and_sampling_params():
+    messages = [{"role": "user", "content": "Ce e o listă?"}]
+    key = cache_key(messages, "gpt-4o-mini", 0.2, 300)
+    assert key == cache_key([dict(m) for m in messages], "gpt-4o-mini", 0.2, 300)
+    assert key != cache_key(messages, "gpt-4o-mini", 0.2, 301)
+    assert key != cache_key(messages, "gpt-4o", 0.2, 300)
+
+
+def test_default_settings_do_not_cache_sampled_answers():
+    from ai_tutor import _response_cache_key
+    from settings import DEFAULT_SETTINGS
+
+    messages = [{"role": "user", "content": "Ce e o listă?"}]
+    assert _response_cache_key(messages, dict(DEFAULT_SETTINGS), True) is None
+    assert _response_cache_key(messages, {**DEFAULT_SETTINGS, "temperature": 0}, True) is not None
+
+
+def test_memory_lru_falls_back_to_disk(tmp_db, tmp_path):
+    cache = ResponseCache(tmp_path / "cache.db", memory_entries=2)
+    for k in "abc":
+        cache.put(k, k.upper())
+    assert list(cache._memory) == ["b", "c"]
+
+    assert cache.get("a") == "A"  # evicted from memory, served from disk
+    assert list(cache._memory) == ["c", "a"]
+    assert cache.get("missing") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_entries_expire_after_ttl(tmp_db, tmp_path):
+    clock = Clock()
+    cache = ResponseCache(tmp_path / "cache.db", ttl=60, clock=clock)
+    cache.put("q", "answer")
+    clock.now += 59
+    assert cache.get("q") == "answer"
+    clock.now += 1
+    assert cache.get("q") is None
+    assert ResponseCache(tmp_path / "cache.db", ttl=60, clock=clock).get("q") is None
+
+
+def test_prune_keeps_most_recently_used(tmp_db, tmp_path):
+    clock = Clock()
+    cache = ResponseCache(tmp_path / "cache.db", memory_entries=0, max_entries=2, clock=clock)
+    for k in "abc":
+        clock.now += 1
+        cache.put(k, k)
+    clock.now += 1
+    cache.get("a")
+    cache.prune()
+    rows = cache._conn().execute("SELECT key FROM responses ORDER BY key").fetchall()
+    assert [r["key"] for r in rows] == ["a", "c"]
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+import db
+import deltas
+
+
+@pytest.mark.parametrize("old,new", [
+    ("", "abc"),
+    ("a\nb\nc", "a\nB\nc\nd"),
+    ("fara newline la final", "fara newline la final\n"),
+    ("x\n" * 50, ""),
+])
+def test_delta_roundtrip(old, new):
+    assert deltas.apply_delta(old, deltas.make_delta(old, new)) == new
+
+
+def edit(text, rng, version):
+    lines = text.split("\n")
+    lines[rng.randrange(len(lines))] = f"editare {version}"
+    return "\n".join(lines)
+
+
+def test_every_stored_revision_reconstructs(tmp_db):
+    rng = random.Random(7)
+    text = "\n".join(f"paragraful {i} " + "lorem ipsum " * 5 for i in range(100))
+    note_id = db.create_note(db.create_topic("T"), "v1", text)
+    assert db.list_note_revisions(note_id) == []
+
+    history = {1: ("v1", text)}
+    for version in range(2, 41):
+        text = edit(text, rng, version)
+        db.update_note(note_id, f"v{version}", text)
+        history[version] = (f"v{version}", text)
+
+    revisions = db.list_note_revisions(note_id)
+    assert [r["version"] for r in revisions] == list(range(40, 0, -1))
+    for r in revisions:
+        rev = db.get_note_revision(note_id, r["version"])
+        assert (rev["title"], rev["content"]) == history[r["version"]]
+
+    # snapshots bound the number of deltas replayed per read
+    kinds = [r["kind"] for r in reversed(revisions)]
+    longest_run = max(len(run) for run in "".join("d" if k == "delta" else " " for k in kinds).split(" "))
+    assert longest_run < db.SNAPSHOT_EVERY
+    # and deltas keep the store far below a full copy per save
+    assert sum(r["size"] for r in revisions) < 40 * len(deltas.pack(text)) / 4
+
+
+def test_compaction_keeps_storage_sublinear(tmp_db):
+    rng = random.Random(3)
+    text = "\n".join(f"rand {i}" for i in range(50))
+    note_id = db.create_note(db.create_topic("T"), "t", text)
+    counts = []
+    for version in range(2, 402):
+        text = edit(text, rng, version)
+        db.update_note(note_id, "t", text)
+        if version % db.COMPACT_EVERY == 0:
+            counts.append(len(db.list_note_revisions(note_id)))
+    assert max(counts) <= db.KEEP_RECENT + 10
+
+    kept = [r["version"] for r in db.list_note_revisions(note_id)]
+    assert kept[0] == 401 and kept[-1] == 1
+    assert db.get_note_revision(note_id, 401)["content"] == text
+    assert db.get_note_revision(note_id, 2) is None or 2 in kept
+
+    db.compact_note_revisions(note_id, keep_recent=5)
+    kept = [r["version"] for r in db.list_note_revisions(note_id)]
+    assert kept[:5] == [401, 400, 399, 398, 397]
+    assert db.get_note_revision(note_id, 401)["content"] == text
+
+
+def test_revisions_go_with_the_note(tmp_db):
+    note_id = db.create_note(db.create_topic("T"), "t", "a")
+    db.update_note(note_id, "t", "b")
+    db.delete_note(note_id)
+    assert db.list_note_revisions(note_id) == []
+
+
+def test_compacting_without_revisions_or_recent_keep(tmp_db):
+    note_id = db.create_note(db.create_topic("T"), "t", "v1")
+    db.compact_note_revisions(note_id)
+    db.compact_note_revisions(9999)
+
+    for version in range(2, 32):
+        db.update_note(note_id, "t", f"v{version}")
+    before = len(db.list_note_revisions(note_id))
+    db.compact_note_revisions(note_id, keep_recent=0)
+    kept = [r["version"] for r in db.list_note_revisions(note_id)]
+    assert len(kept) < before and kept[0] == 31 and kept[-1] == 1
+    assert db.get_note_revision(note_id, 31)["content"] == "v31"
+    with pytest.raises(ValueError):
+        db.compact_note_revisions(note_id, keep_recent=-1)
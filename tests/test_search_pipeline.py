@@ -0,0 +1,58 @@
+import db
+from search_pipeline import SearchPipeline
+
+
+def test_debounced_batches_and_refinement(tmp_db, fake_root, monkeypatch):
+    topic_id = db.create_topic("Python")
+    for i in range(120):
+        db.create_note(topic_id, f"python {i}", "liste și funcții" if i % 2 else "clase")
+
+    calls = []
+    search = db.search_notes
+    monkeypatch.setattr(db, "search_notes", lambda *a, **kw: calls.append(kw) or search(*a, **kw))
+
+    batches = []
+    pipeline = SearchPipeline(fake_root, lambda rows, first, done: batches.append((rows, first, done)),
+                              batch_size=25)
+    for prefix in ["l", "li", "lis"]:
+        pipeline.set_query(prefix, topic_id)
+    assert len(fake_root.jobs) == 1  # only the last keystroke is pending
+
+    fake_root.pump(lambda: batches and batches[-1][2])
+    assert {kw["within_ids"] for kw in calls} == {None}
+    assert [len(b[0]) for b in batches] == [25, 25, 10]
+    assert [b[1] for b in batches] == [True, False, False]
+    first_ids = {r["id"] for b in batches for r in b[0]}
+
+    # extending the query only searches within the previous hits
+    batches.clear()
+    calls.clear()
+    pipeline.set_query("liste fun", topic_id)
+    fake_root.pump(lambda: batches and batches[-1][2])
+    assert all(kw["within_ids"] is not None for kw in calls)
+    assert {r["id"] for b in batches for r in b[0]} == first_ids
+
+    # a note change invalidates the refinement base
+    db.create_note(topic_id, "nouă", "liste funcții")
+    batches.clear()
+    calls.clear()
+    pipeline.set_query("liste func", topic_id)
+    fake_root.pump(lambda: batches and batches[-1][2])
+    assert calls[0]["within_ids"] is None
+    assert len({r["id"] for b in batches for r in b[0]}) == 61
+    pipeline.shutdown()
+
+
+def test_stale_results_are_dropped(tmp_db, fake_root):
+    topic_id = db.create_topic("Python")
+    db.create_note(topic_id, "alpha", "")
+    db.create_note(topic_id, "beta", "")
+
+    seen = []
+    pipeline = SearchPipeline(fake_root, lambda rows, first, done: seen.append([r["title"] for r in rows]))
+    pipeline._start("alpha", topic_id)
+    pipeline._start("beta", topic_id)
+    fake_root.pump(lambda: seen)
+    fake_root.pump(lambda: False, timeout=0.05)
+    assert seen == [["beta"]]
+    pipeline.shutdown()
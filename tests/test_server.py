@@ -0,0 +1,116 @@
+import gzip
+import json
+
+import pytest
+
+pytest.importorskip("flask")
+
+import db
+from server import create_app
+
+
+@pytest.fixture
+def client(tmp_db):
+    return create_app().test_client()
+
+
+def test_topic_and_note_crud(client):
+    topic = client.post("/api/topics", json={"name": "Python", "description": "Limbaj"}).get_json()
+    note = client.post(f"/api/topics/{topic['id']}/notes",
+                       json={"title": "Liste", "content": "Colecții ordonate"}).get_json()
+
+    assert client.put(f"/api/notes/{note['id']}", json={"title": "Liste 2"}).get_json()["title"] == "Liste 2"
+    assert client.get(f"/api/notes/{note['id']}").get_json()["content"] == "Colecții ordonate"
+    assert client.get("/api/search?q=colectii").get_json()["items"][0]["id"] == note["id"]
+
+    assert client.delete(f"/api/topics/{topic['id']}").status_code == 204
+    assert client.get(f"/api/notes/{note['id']}").status_code == 404
+
+
+def test_listing_pages_etag_and_gzip(client):
+    topic_id = db.create_topic("Python")
+    for i in range(30):
+        db.create_note(topic_id, f"notă {i}", "x" * 100)
+
+    first = client.get(f"/api/topics/{topic_id}/notes?limit=20")
+    page = first.get_json()
+    assert len(page["items"]) == 20 and set(page["items"][0]) == {"id", "title", "created_at"}
+    rest = client.get(f"/api/topics/{topic_id}/notes?limit=20&before_id={page['next_before_id']}")
+    assert len(rest.get_json()["items"]) == 10 and rest.get_json()["next_before_id"] is None
+
+    etag = first.headers["ETag"]
+    again = client.get(f"/api/topics/{topic_id}/notes?limit=20", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+
+    zipped = client.get(f"/api/topics/{topic_id}/notes?limit=20", headers={"Accept-Encoding": "gzip"})
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(zipped.data)) == page
+    assert client.get(f"/api/topics/{topic_id}/notes?limit=20",
+                      headers={"If-None-Match": zipped.headers["ETag"]}).status_code == 304
+
+    db.create_note(topic_id, "nouă", "")
+    assert client.get(f"/api/topics/{topic_id}/notes?limit=20",
+                      headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_tutor_stream_is_server_sent_events(client, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    pytest.importorskip("openai")
+    import ai_tutor
+
+    def fake_stream(**kwargs):
+        assert kwargs["question"] == "Ce e o listă?"
+        yield "O colecție"
+        yield " ordonată."
+
+    monkeypatch.setattr(ai_tutor, "ask_tutor_stream", fake_stream)
+    topic_id = db.create_topic("Python")
+    resp = client.post(f"/api/topics/{topic_id}/tutor/stream", json={"question": "Ce e o listă?"})
+    assert resp.mimetype == "text/event-stream"
+    events = resp.get_data(as_text=True).split("\n\n")
+    assert [json.loads(e[len("data: "):])["delta"] for e in events[:2]] == ["O colecție", " ordonată."]
+    assert events[2].startswith("event: done")
+
+
+def test_tutor_retrieves_chunks_only_from_a_chroma_server(client, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    pytest.importorskip("openai")
+    import ai_tutor
+
+    seen = []
+
+    def fake_stream(**kwargs):
+        seen.append(kwargs["settings"]["rag_top_k"])
+        yield "ok"
+
+    monkeypatch.setattr(ai_tutor, "ask_tutor_stream", fake_stream)
+    topic_id = db.create_topic("Python")
+    monkeypatch.delenv("NOTES_CHROMA_HOST", raising=False)
+    client.post(f"/api/topics/{topic_id}/tutor/stream", json={"question": "?"}).get_data()
+    monkeypatch.setenv("NOTES_CHROMA_HOST", "localhost:8000")
+    client.post(f"/api/topics/{topic_id}/tutor/stream", json={"question": "?"}).get_data()
+    from settings import load_settings
+    assert seen == [0, load_settings()["rag_top_k"]]
+
+
+def test_stale_note_version_is_rejected(client):
+    note_id = db.create_note(db.create_topic("T"), "a", "v1")
+    ok = client.put(f"/api/notes/{note_id}", json={"content": "v2", "version": 1})
+    assert ok.status_code == 200 and ok.get_json()["version"] == 2
+
+    stale = client.put(f"/api/notes/{note_id}", json={"content": "lost", "version": 1})
+    assert stale.status_code == 409 and stale.get_json()["version"] == 2
+    assert db.get_note(note_id)["content"] == "v2"
+
+
+def test_bad_paging_and_version_are_rejected(client):
+    topic_id = db.create_topic("T")
+    note_id = db.create_note(topic_id, "a", "v1")
+    for url in (f"/api/topics/{topic_id}/notes?limit=0", f"/api/topics/{topic_id}/notes?limit=-1",
+                "/api/topics?limit=0", "/api/search?q=a&limit=0", "/api/search?q=a&offset=-5"):
+        assert client.get(url).status_code == 400, url
+    assert client.get(f"/api/topics/{topic_id}/notes?limit=1").get_json()["next_before_id"] == note_id
+
+    for version in ("abc", 1.5, True):
+        assert client.put(f"/api/notes/{note_id}", json={"content": "x", "version": version}).status_code == 400
+    assert db.get_note(note_id)["content"] == "v1"
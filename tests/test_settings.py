@@ -0,0 +1,75 @@
+import json
+import os
+
+import pytest
+
+import settings as settings_module
+from settings import DEFAULT_SETTINGS, SettingsService
+
+
+@pytest.fixture
+def service(tmp_path):
+    return SettingsService(tmp_path / "tutor_settings.json")
+
+
+def write(service, data):
+    service.path.write_text(json.dumps(data), encoding="utf-8")
+    # make the change visible even on filesystems with coarse mtimes
+    st = os.stat(service.path)
+    os.utime(service.path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+def test_missing_file_gets_defaults(service):
+    assert service.get() == DEFAULT_SETTINGS
+    assert json.loads(service.path.read_text(encoding="utf-8")) == DEFAULT_SETTINGS
+
+
+def test_file_is_parsed_only_when_it_changes(service, monkeypatch):
+    write(service, {"depth": "short"})
+    loads = []
+    real_load = json.load
+    monkeypatch.setattr(settings_module.json, "load", lambda f: loads.append(1) or real_load(f))
+    for _ in range(5):
+        assert service.get()["depth"] == "short"
+    assert len(loads) == 1
+
+    write(service, {"depth": "detailed", "max_tokens": 500})
+    assert service.get()["max_tokens"] == 500
+    assert len(loads) == 2
+
+
+def test_invalid_file_keeps_last_good_settings(service):
+    write(service, {"temperature": 0.2})
+    assert service.get()["temperature"] == 0.2
+    write(service, {"temperature": "hot"})
+    assert service.get()["temperature"] == 0.2
+    service.path.write_text("{not json", encoding="utf-8")
+    assert service.get()["temperature"] == 0.2
+    write(service, [1, 2])
+    assert service.get()["temperature"] == 0.2
+
+
+def test_save_is_atomic_validated_and_notifies(service):
+    seen = []
+    service.subscribe(seen.append)
+    service.update(depth="short")
+    assert seen[-1]["depth"] == "short"
+    assert json.loads(service.path.read_text(encoding="utf-8"))["depth"] == "short"
+    assert [p.name for p in service.path.parent.iterdir()] == [service.path.name]
+
+    with pytest.raises(ValueError):
+        service.update(depth="endless")
+    assert service.get()["depth"] == "short"
+
+
+def test_watch_notifies_on_external_edit(service, fake_root):
+    service.get()
+    seen = []
+    service.subscribe(seen.append)
+    service.watch(fake_root, interval_ms=10)
+    write(service, [1, 2])
+    fake_root.pump(lambda: False, timeout=0.05)
+    write(service, {"language": "EN"})
+    fake_root.pump(lambda: seen)
+    assert seen[0]["language"] == "EN"
+    service.stop_watching(fake_root)
@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+def test_app_import_is_lazy_and_needs_no_api_key(tmp_path):
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    env["PYTHONPATH"] = str(REPO)
+    code = ("import sys, app; "
+            "heavy = [m for m in ('openai', 'dotenv', 'chromadb', 'http.server') if m in sys.modules]; "
+            "assert not heavy, heavy")
+    subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, check=True, timeout=60)
@@ -0,0 +1,114 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import ai_tutor
+import db
+import study_batch
+from async_tutor import AsyncTutorEngine
+
+
+class StubModel:
+    """Local AsyncOpenAI stand-in: a summary or a JSON card list, depending on the prompt."""
+
+    def __init__(self, fail_titles=()):
+        self.chat = SimpleNamespace(completions=self)
+        self.fail_titles = set(fail_titles)
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def create(self, model, messages, **kwargs):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.001)
+            title = messages[-1]["content"].split("\n")[0]
+            if title in self.fail_titles:
+                raise RuntimeError("model down")
+            if "JSON" in messages[0]["content"]:
+                text = json.dumps([{"q": f"Ce este {title}?", "a": title}, {"q": "fara raspuns"}])
+            else:
+                text = f"Rezumat: {title}"
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+        finally:
+            self.active -= 1
+
+
+def run(model, **kwargs):
+    async def go():
+        engine = AsyncTutorEngine(client=model, max_concurrency=3, requests_per_second=1000, burst=1000)
+        return await study_batch.run(engine, {"model": "stub"}, **kwargs)
+    return asyncio.run(go())
+
+
+def test_only_new_and_changed_notes_are_processed(tmp_db):
+    topic_id = db.create_topic("T")
+    ids = [db.create_note(topic_id, f"nota {i}", f"continut {i}") for i in range(12)]
+    empty_id = db.create_note(topic_id, "goala", "")
+    model = StubModel()
+
+    assert run(model, batch_size=5) == (13, 0)
+    assert model.calls == 24 and model.max_active <= 3
+    assert db.get_note_summary(ids[0])["summary"] == "Rezumat: nota 0"
+    assert [tuple(c)[1:] for c in db.get_flashcards(ids[0])] == [("Ce este nota 0?", "nota 0")]
+    assert db.get_note_summary(empty_id)["summary"] == ""
+
+    assert run(model) == (0, 0)
+    db.update_note(ids[3], "nota 3 bis", "alt continut")
+    assert run(model) == (1, 0)
+    assert db.get_note_summary(ids[3])["version"] == 2
+    assert db.get_flashcards(ids[3])[0]["answer"] == "nota 3 bis"
+
+
+def test_interrupted_or_failed_run_resumes(tmp_db):
+    pytest.importorskip("openai")  # AsyncTutorEngine's retry check
+    topic_id = db.create_topic("T")
+    for i in range(6):
+        db.create_note(topic_id, f"nota {i}", "text")
+
+    # a run cut short leaves the rest due
+    assert run(StubModel(), limit=2) == (2, 0)
+    assert len(db.notes_needing_study()) == 4
+
+    assert run(StubModel(fail_titles={"nota 4"})) == (3, 1)
+    assert [n["title"] for n in db.notes_needing_study()] == ["nota 4"]
+    assert run(StubModel()) == (1, 0)
+    assert db.notes_needing_study() == []
+
+
+def test_stale_material_is_not_stored(tmp_db):
+    note_id = db.create_note(db.create_topic("T"), "t", "v1")
+    assert db.save_study_material(note_id, 1, "s1", [("q", "a")])
+    assert not db.save_study_material(note_id, 1, "again", [])
+    db.update_note(note_id, "t", "v2")
+    assert db.get_note_summary(note_id, current_only=True) is None
+    assert db.get_note_summary(note_id)["summary"] == "s1"
+
+
+def test_parse_flashcards_drops_malformed_items():
+    text = 'Iata:\n[{"q": "A?", "a": "a"}, {"q": "B?"}, "x", {"q": " ", "a": "c"}]\n'
+    assert study_batch.parse_flashcards(text) == [("A?", "a")]
+    assert study_batch.parse_flashcards("nu e JSON") == []
+    assert study_batch.parse_flashcards("[1, ") == []
+
+
+def test_tutor_sends_the_current_summary_of_a_long_note(tmp_db, monkeypatch):
+    monkeypatch.setattr(ai_tutor, "_history_migrated", True)
+    topic_id = db.create_topic("T")
+    long_text = "fraza lunga despre subiect. " * 100
+    note_id = db.create_note(topic_id, "lunga", long_text)
+    db.save_study_material(note_id, 1, "pe scurt", [])
+    settings = {"rag_top_k": 0}
+
+    messages = ai_tutor.build_messages(topic_id, long_text, "?", settings, selected_note_id=note_id)
+    assert messages[-2]["content"] == "Rezumatul notei selectate:\npe scurt"
+    # unsaved edits in the editor: the summary no longer describes what the user sees
+    edited = ai_tutor.build_messages(topic_id, long_text + "nou", "?", settings, selected_note_id=note_id)
+    assert edited[-2]["content"].startswith("Fragment notă selectată:")
+    off = ai_tutor.build_messages(topic_id, long_text, "?", {**settings, "use_note_summaries": False},
+                                  selected_note_id=note_id)
+    assert off[-2]["content"].startswith("Fragment notă selectată:")
@@ -0,0 +1,100 @@
+import threading
+import time
+
+from tutor_worker import TutorWorker
+
+
+def test_results_are_delivered_on_the_polling_thread(fake_root):
+    root = fake_root
+    worker = TutorWorker(root, max_workers=2, poll_ms=1)
+    done = []
+    for topic_id in (1, 2):
+        worker.submit(topic_id, lambda n: n * 2, {"n": topic_id},
+                      on_done=lambda v: done.append((v, threading.current_thread())),
+                      on_error=done.append)
+    root.pump(lambda: len(done) == 2)
+    assert sorted(v for v, _ in done) == [2, 4]
+    assert all(t is threading.main_thread() for _, t in done)
+    assert not worker.pending and not root.jobs
+    worker.shutdown()
+
+
+def test_cancelled_topic_is_dropped_and_timeouts_fire(fake_root):
+    root = fake_root
+    worker = TutorWorker(root, max_workers=2, poll_ms=1)
+    release = threading.Event()
+    seen = []
+
+    worker.submit(1, release.wait, {"timeout": 2}, on_done=seen.append, on_error=seen.append)
+    worker.submit(2, release.wait, {"timeout": 2}, on_done=seen.append, on_error=seen.append,
+                  timeout=0.05)
+    worker.cancel_topic(1)
+    assert not worker.has_pending(1)
+
+    root.pump(lambda: seen)
+    assert len(seen) == 1 and isinstance(seen[0], TimeoutError)
+
+    release.set()
+    root.pump(lambda: False, timeout=0.05)
+    assert len(seen) == 1
+    worker.shutdown()
+
+
+def test_stream_deltas_are_batched_per_frame(fake_root):
+    root = fake_root
+    worker = TutorWorker(root, poll_ms=1)
+    frames, done = [], []
+
+    def stream():
+        for word in ["Salut", ", ", "lume", "!"]:
+            yield word
+
+    worker.submit(1, stream, {}, on_delta=frames.append, on_done=done.append, on_error=done.append)
+    # let the whole stream land in the queue before the first poll
+    worker.pending[1].future.result(timeout=2)
+    root.pump(lambda: done)
+    assert frames == ["Salut, lume!"]
+    assert done == ["Salut, lume!"]
+    worker.shutdown()
+
+
+def test_cancel_closes_a_running_stream(fake_root):
+    root = fake_root
+    worker = TutorWorker(root, poll_ms=1)
+    started, closed = threading.Event(), threading.Event()
+
+    def stream():
+        try:
+            while True:
+                started.set()
+                yield "x"
+                time.sleep(0.01)
+        finally:
+            closed.set()
+
+    request_id = worker.submit(1, stream, {}, on_delta=lambda d: None,
+                               on_done=lambda v: None, on_error=lambda e: None)
+    started.wait(2)
+    worker.cancel(request_id)
+    assert closed.wait(2)
+    worker.shutdown()
+
+
+def test_detached_stream_finishes_without_callbacks(fake_root):
+    root = fake_root
+    worker = TutorWorker(root, poll_ms=1)
+    go, saved, seen = threading.Event(), threading.Event(), []
+
+    def stream():
+        go.wait(2)
+        yield "raspuns"
+        saved.set()  # as ask_tutor_stream saves the turn once the stream is done
+
+    worker.submit(1, stream, {}, on_delta=seen.append, on_done=seen.append, on_error=seen.append)
+    worker.detach_topic(1)
+    assert not worker.has_pending(1)
+    go.set()
+    assert saved.wait(2)
+    root.pump(lambda: False, timeout=0.05)
+    assert seen == []
+    worker.shutdown()
@@ -0,0 +1,128 @@
+import tkinter as tk
+
+import pytest
+
+from modern_widgets import VirtualList
+
+
+@pytest.fixture
+def root():
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("no display")
+    root.geometry("300x240")
+    yield root
+    root.destroy()
+
+
+def counting_source(n, calls):
+    rows = [{"id": i, "title": f"note {i}"} for i in range(n, 0, -1)]
+
+    def fetch(cursor, limit):
+        calls.append(cursor)
+        start = cursor or 0
+        page = rows[start:start + limit]
+        return page, (start + limit if start + limit < n else None)
+    return fetch
+
+
+def test_loads_pages_lazily_and_keeps_a_fixed_pool(root):
+    calls = []
+    lst = VirtualList(root, text_of=lambda r: r["title"], page_size=50, row_height=20)
+    lst.pack(fill="both", expand=True)
+    lst.load(counting_source(10000, calls))
+    root.update()
+
+    assert len(lst.rows) == 50 and calls == [None]
+    pool = len(lst.pool)
+    assert pool < 20
+
+    lst.yview("moveto", 0.99)
+    root.update()
+    assert 50 < len(lst.rows) < 10000
+    assert len(lst.pool) == pool
+
+
+def test_row_diffs(root):
+    selected = []
+    lst = VirtualList(root, text_of=lambda r: r["title"], on_select=selected.append)
+    lst.pack(fill="both", expand=True)
+    lst.load(counting_source(3, []))
+    root.update()
+
+    lst.select(2, notify=True)
+    assert selected[-1]["id"] == 2
+    lst.update_row({"id": 2, "title": "renamed"})
+    assert lst.selected()["title"] == "renamed"
+    lst.insert_row({"id": 4, "title": "new"})
+    assert [r["id"] for r in lst.rows] == [4, 3, 2, 1]
+    lst.remove_row(2)
+    assert lst.selected() is None and [r["id"] for r in lst.rows] == [4, 3, 1]
+
+
+def test_transcript_recycles_items_and_pages_older_history(root):
+    from modern_widgets import ChatTranscript
+
+    history = [{"id": i, "sender": "user" if i % 2 else "assistant", "text": f"mesaj {i}"}
+               for i in range(1, 201)]
+
+    def load_older(before_id, limit):
+        return [m for m in history if m["id"] < before_id][-limit:]
+
+    chat = ChatTranscript(root, load_older=load_older, page_size=20, max_loaded=50)
+    chat.pack(fill="both", expand=True)
+    root.update()
+    chat.reset(history[-20:], exhausted=False)
+    root.update()
+
+    # scrolling above the first loaded message pages the previous one in
+    chat.yview("moveto", 0.0)
+    chat.scroll(-100)
+    assert [m["id"] for m in chat.messages[:2]] == [161, 162]
+    pool = len(chat.pool)
+    assert pool < 20
+
+    # appends keep the loaded window and the item pool bounded
+    chat.scroll_to_end()
+    for i in range(100):
+        handle = chat.add_message(f"nou {i}", "user")
+    chat.update_message(handle, "nou 99, editat\n" * 3)
+    assert len(chat.messages) <= 50 + 20
+    assert chat.messages[-1]["text"].startswith("nou 99, editat")
+    assert len(chat.pool) <= pool + 1
+
+
+def test_transcript_pages_history_after_trimming_live_messages(root):
+    from modern_widgets import ChatTranscript
+
+    history = [{"id": i, "sender": "user", "text": f"mesaj {i}"} for i in range(1, 41)]
+
+    def load_older(before_id, limit):
+        return [m for m in history if m["id"] < before_id][-limit:]
+
+    chat = ChatTranscript(root, load_older=load_older, page_size=10, max_loaded=20)
+    chat.pack(fill="both", expand=True)
+    root.update()
+    chat.reset(history[-10:], exhausted=False)
+    root.update()
+
+    # answers shown before they are saved carry no store id; trimming down to them
+    # must still page back from the newest dropped message
+    for i in range(25):
+        chat.add_message(f"nou {i}", "user")
+    assert chat.messages[0]["id"] is None
+    assert not chat.exhausted and chat.oldest_id == 41
+
+    chat.reset(history[-10:], exhausted=False)
+    for i in range(25):
+        # as app.py does once the turn is saved
+        chat.set_message_id(chat.add_message(f"nou {i}", "user"), 41 + i)
+    assert chat.oldest_id == chat.messages[0]["id"] == 42
+
+    chat.reset(history[-10:], exhausted=False)
+    for i in range(25):
+        chat.add_message(f"nou {i}", "user")
+    chat.yview("moveto", 0.0)
+    chat.scroll(-100)
+    assert [m["id"] for m in chat.messages[:10]] == list(range(31, 41))
@@ -0,0 +1,133 @@
+import db
+from write_behind import WriteBehind
+
+
+def updates_seen():
+    events = []
+    listener = lambda event, **ids: events.append(ids["note_id"]) if event == "note_updated" else None
+    db.add_listener(listener)
+    return events, lambda: db.remove_listener(listener)
+
+
+def test_edits_coalesce_into_one_flush(tmp_db, tmp_path, fake_root):
+    topic = db.create_topic("T")
+    note = db.create_note(topic, "a", "")
+    writes = WriteBehind(fake_root, journal_dir=tmp_path)
+    events, stop = updates_seen()
+    try:
+        for text in ["h", "he", "hel", "hello"]:
+            writes.update(note, "a", text)
+        assert db.get_note(note)["content"] == ""
+        assert writes.get_note(note)["content"] == "hello"
+        fake_root.pump(lambda: not writes.pending)
+    finally:
+        stop()
+    assert events == [note]
+    assert db.get_note(note)["content"] == "hello"
+    assert writes.journal_path.read_text() == ""
+
+
+def test_flushes_at_size_threshold(tmp_db, tmp_path, fake_root):
+    topic = db.create_topic("T")
+    notes = [db.create_note(topic, str(i), "") for i in range(3)]
+    writes = WriteBehind(fake_root, journal_dir=tmp_path, max_pending=3)
+    for note in notes:
+        writes.update(note, "x", "y")
+    assert not writes.pending
+    assert fake_root.jobs == {}
+    assert all(db.get_note(n)["title"] == "x" for n in notes)
+
+
+def test_replay_after_crash(tmp_db, tmp_path, fake_root):
+    topic = db.create_topic("T")
+    first, second = db.create_note(topic, "a", ""), db.create_note(topic, "b", "")
+    crashed = WriteBehind(fake_root, journal_dir=tmp_path)
+    crashed.update(first, "a", "v1")
+    crashed.update(first, "a", "v2")
+    crashed.update(second, "b", "kept")
+    # the process dies mid-write of the next edit, releasing its lock
+    crashed._journal.write('{"id": 1, "title": "a", "cont')
+    crashed._journal.close()
+
+    assert WriteBehind(fake_root, journal_dir=tmp_path).replay() == 2
+    assert db.get_note(first)["content"] == "v2"
+    assert db.get_note(second)["content"] == "kept"
+    assert not crashed.journal_path.exists()
+
+
+def test_instances_keep_their_journals_apart(tmp_db, tmp_path, fake_root):
+    topic = db.create_topic("T")
+    first, second = db.create_note(topic, "a", ""), db.create_note(topic, "b", "")
+    a = WriteBehind(fake_root, journal_dir=tmp_path)
+    b = WriteBehind(fake_root, journal_dir=tmp_path)
+    a.update(first, "a", "from a")
+    b.update(second, "b", "from b")
+    a.flush()
+    assert b.journal_path.read_text() != ""
+
+    # a newly started instance leaves the journal of a running one alone
+    assert WriteBehind(fake_root, journal_dir=tmp_path).replay() == 0
+    assert db.get_note(second)["content"] == ""
+    b.close()
+    a.close()
+    assert db.get_note(second)["content"] == "from b"
+    assert not a.journal_path.exists() and not b.journal_path.exists()
+
+
+def test_delete_drops_pending_edit(tmp_db, tmp_path, fake_root):
+    topic = db.create_topic("T")
+    note = db.create_note(topic, "a", "")
+    writes = WriteBehind(fake_root, journal_dir=tmp_path)
+    writes.update(note, "a", "edit")
+    writes.delete(note)
+    writes.close()
+    assert db.get_note(note) is None
+
+
+def test_conflicting_edit_is_kept_as_a_copy(tmp_db, tmp_path, fake_root):
+    topic = db.create_topic("T")
+    note = db.create_note(topic, "a", "base")
+    conflicts = []
+    writes = WriteBehind(fake_root, journal_dir=tmp_path,
+                         on_conflict=lambda *ids: conflicts.append(ids))
+    writes.update(note, "a", "mine", version=1)
+    db.update_note(note, "a", "theirs")  # another instance saves first
+    writes.flush()
+
+    assert db.get_note(note)["content"] == "theirs"
+    [(conflicted, copy)] = conflicts
+    assert conflicted == note
+    assert (db.get_note(copy)["title"], db.get_note(copy)["content"]) == ("a (conflict)", "mine")
+
+    # edits on top of our own flushed version don't conflict with ourselves
+    writes.update(note, "a", "one", version=2)
+    writes.flush()
+    writes.update(note, "a", "two", version=2)
+    writes.flush()
+    assert db.get_note(note)["content"] == "two" and len(conflicts) == 1
+
+
+def test_edit_of_a_note_deleted_elsewhere_is_kept(tmp_db, tmp_path, fake_root):
+    topic = db.create_topic("T")
+    note, other = db.create_note(topic, "a", "base"), db.create_note(topic, "b", "")
+    conflicts = []
+    writes = WriteBehind(fake_root, journal_dir=tmp_path,
+                         on_conflict=lambda *ids: conflicts.append(ids))
+    writes.update(note, "a", "mine", version=1, topic_id=topic)
+    writes.update(other, "b", "lost")  # no topic known
+    db.delete_note(note)  # another instance deletes them before we flush
+    db.delete_note(other)
+    writes.flush()
+
+    [(deleted, copy), (lost, none)] = conflicts
+    assert deleted == note and (db.get_note(copy)["title"], db.get_note(copy)["content"]) == ("a (conflict)", "mine")
+    assert (lost, none) == (other, None)
+
+    # the topic travels in the journal, so a replay keeps the edit too
+    note = db.create_note(topic, "c", "")
+    crashed = WriteBehind(fake_root, journal_dir=tmp_path)
+    crashed.update(note, "c", "replayed", topic_id=topic)
+    crashed._journal.close()
+    db.delete_note(note)
+    assert WriteBehind(fake_root, journal_dir=tmp_path, on_conflict=lambda *ids: conflicts.append(ids)).replay() == 1
+    assert db.get_note(conflicts[-1][1])["content"] == "replayed"
@@ -0,0 +1,149 @@
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 4
+# UI frame interval: streamed deltas are batched into one update per poll
+POLL_MS = 33
+
+
+class _Request:
+    def __init__(self, topic_id, timeout, on_done, on_error, on_delta):
+        self.topic_id = topic_id
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_delta = on_delta
+        self.cancelled = threading.Event()
+        self.future = None
+
+    def touch(self):
+        if self.timeout:
+            self.deadline = time.monotonic() + self.timeout
+
+
+class TutorWorker:
+    """Runs tutor calls on a bounded thread pool and hands results back to Tk.
+
+    Workers only ever touch the result queue; callbacks run on the Tk main
+    thread from a root.after() poll that is active while requests are
+    pending. A cancelled or timed-out request's callbacks never fire, even
+    if its worker finishes later. A detached request's callbacks don't fire
+    either, but its call runs to completion, so a tutor answer is still
+    saved to history when the user leaves its topic.
+
+    With on_delta, fn must return an iterable of text deltas (a stream);
+    the deltas received during one poll interval are joined into a single
+    on_delta call, on_done gets the full text, and the timeout counts from
+    the last delta.
+    """
+
+    def __init__(self, root, max_workers=MAX_WORKERS, poll_ms=POLL_MS):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tutor")
+        self.results = queue.Queue()
+        self.pending = {}
+        self._ids = itertools.count(1)
+        self._poll_job = None
+
+    def submit(self, topic_id, fn, kwargs, on_done, on_error, timeout=None, on_delta=None):
+        """Run fn(**kwargs) in the background and return a request id."""
+        request_id = next(self._ids)
+        request = _Request(topic_id, timeout, on_done, on_error, on_delta)
+        self.pending[request_id] = request
+        request.future = self.executor.submit(self._run, request_id, request, fn, kwargs)
+        self._schedule_poll()
+        return request_id
+
+    def cancel(self, request_id):
+        request = self.pending.pop(request_id, None)
+        if request:
+            # queued requests never start; running streams stop at their next delta
+            request.cancelled.set()
+            request.future.cancel()
+
+    def cancel_topic(self, topic_id):
+        for request_id, request in list(self.pending.items()):
+            if request.topic_id == topic_id:
+                self.cancel(request_id)
+
+    def detach_topic(self, topic_id):
+        """Stop delivering a topic's results, but let its calls finish."""
+        for request_id, request in list(self.pending.items()):
+            if request.topic_id == topic_id:
+                del self.pending[request_id]
+
+    def has_pending(self, topic_id):
+        return any(r.topic_id == topic_id for r in self.pending.values())
+
+    def shutdown(self):
+        for request_id in list(self.pending):
+            self.cancel(request_id)
+        if self._poll_job:
+            self.root.after_cancel(self._poll_job)
+            self._poll_job = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, request_id, request, fn, kwargs):
+        try:
+            result = fn(**kwargs)
+            if request.on_delta is not None:
+                parts = []
+                for delta in result:
+                    if request.cancelled.is_set():
+                        close = getattr(result, "close", None)
+                        if close:
+                            close()
+                        return
+                    parts.append(delta)
+                    self.results.put((request_id, "delta", delta))
+                result = "".join(parts)
+            self.results.put((request_id, "done", result))
+        except Exception as e:
+            self.results.put((request_id, "error", e))
+
+    def _schedule_poll(self):
+        if self._poll_job is None:
+            self._poll_job = self.root.after(self.poll_ms, self._poll)
+
+    def _poll(self):
+        self._poll_job = None
+        deltas = {}
+        while True:
+            try:
+                request_id, kind, value = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if request_id not in self.pending:
+                continue
+            if kind == "delta":
+                deltas.setdefault(request_id, []).append(value)
+                continue
+            self._flush_deltas(request_id, deltas)
+            request = self.pending.pop(request_id)
+            if kind == "done":
+                request.on_done(value)
+            else:
+                request.on_error(value)
+        for request_id in list(deltas):
+            self._flush_deltas(request_id, deltas)
+
+        now = time.monotonic()
+        for request_id, request in list(self.pending.items()):
+            if request.deadline is not None and now >= request.deadline:
+                self.cancel(request_id)
+                request.on_error(TimeoutError("Tutor request timed out."))
+
+        if self.pending:
+            self._schedule_poll()
+
+    def _flush_deltas(self, request_id, deltas):
+        parts = deltas.pop(request_id, None)
+        request = self.pending.get(request_id)
+        if parts and request:
+            request.touch()
+            request.on_delta("".join(parts))
@@ -0,0 +1,226 @@
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+
+import db
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+JOURNAL_DIR = Path("data")
+# each instance journals to <JOURNAL_NAME>.<pid>-<token>.jsonl in JOURNAL_DIR
+JOURNAL_NAME = "write_journal"
+FLUSH_MS = 1000
+# flush right away once this many notes have unsaved edits
+MAX_PENDING = 50
+
+
+class WriteBehind:
+    """Write-behind buffer for note edits.
+
+    update() only records the latest title/content per note and appends it
+    to a journal (fsynced, so an edit survives a crash once update()
+    returns); repeated edits of a note coalesce. Pending edits go to the
+    database in one transaction FLUSH_MS after the first unsaved one, or
+    as soon as MAX_PENDING notes are dirty, and the journal is truncated
+    after the commit. Creates and deletes are not buffered.
+
+    Every instance has a journal file of its own, exclusively locked for
+    as long as the instance lives, so several app processes never touch
+    each other's edits. replay() applies the journals whose lock can be
+    taken, i.e. those left behind by instances that died before flushing.
+
+    An edit made on top of a note version that another process has since
+    overwritten is not applied over it: it is saved as a new
+    "<title> (conflict)" note in the same topic and on_conflict(note_id,
+    copy_id) is called. So is an edit of a note that another process
+    deleted, in the topic_id given to update(); copy_id is None when that
+    is unknown or the topic is gone too.
+    """
+
+    def __init__(self, root, journal_dir=JOURNAL_DIR, flush_ms=FLUSH_MS, max_pending=MAX_PENDING,
+                 on_conflict=None):
+        self.root = root
+        self.journal_dir = Path(journal_dir)
+        self.journal_path = self.journal_dir / f"{JOURNAL_NAME}.{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl"
+        self.flush_ms = flush_ms
+        self.max_pending = max_pending
+        self.on_conflict = on_conflict
+        self.pending = {}
+        # versions this queue wrote itself, newer than what the caller last read
+        self.versions = {}
+        self._lock = threading.Lock()
+        self._flush_job = None
+        # created and locked up front, so a replay() elsewhere never takes it for an orphan
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        _lock_file(self._journal)
+
+    def _append(self, entry):
+        self._journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def update(self, note_id, title, content, version=None, topic_id=None):
+        """Queue an edit; version is the note version the edit was made on, if known,
+        and topic_id the note's topic, where the edit is kept if the note is deleted."""
+        with self._lock:
+            if note_id in self.pending:
+                # coalesced edits all build on the first one's base
+                version = self.pending[note_id][2]
+                topic_id = topic_id if topic_id is not None else self.pending[note_id][3]
+            elif version is not None:
+                version = max(version, self.versions.get(note_id, 0))
+            self._append({"id": note_id, "title": title, "content": content, "version": version,
+                          "topic": topic_id})
+            self.pending[note_id] = (title, content, version, topic_id)
+            full = len(self.pending) >= self.max_pending
+        if full:
+            self.flush()
+        elif self._flush_job is None:
+            self._flush_job = self.root.after(self.flush_ms, self.flush)
+
+    def create(self, topic_id, title, content):
+        return db.create_note(topic_id, title, content)
+
+    def delete(self, note_id):
+        with self._lock:
+            self.pending.pop(note_id, None)
+        db.delete_note(note_id)
+
+    def get_note(self, note_id):
+        """db.get_note() as a dict, with any unsaved edit applied."""
+        note = db.get_note(note_id)
+        if note is None:
+            return None
+        note = dict(note)
+        with self._lock:
+            edit = self.pending.get(note_id)
+        if edit is not None:
+            note["title"], note["content"] = edit[:2]
+        return note
+
+    def flush(self):
+        """Write every pending edit in one transaction and reset the journal."""
+        if self._flush_job is not None:
+            self.root.after_cancel(self._flush_job)
+            self._flush_job = None
+        with self._lock:
+            if not self.pending:
+                return
+            edits = dict(self.pending)
+            versions, conflicts, missing = db.update_notes(_changes(edits))
+            self.versions.update(versions)
+            self.pending.clear()
+            copies = self._save_conflicts(edits, conflicts + missing)
+            # the edits are committed; replaying them again would be harmless but pointless
+            self._journal.seek(0)
+            self._journal.truncate()
+        self._report_conflicts(copies)
+
+    def _save_conflicts(self, edits, note_ids):
+        """Store the edits of note_ids (conflicting or deleted notes) as new notes;
+        returns [(note_id, copy_id)], copy_id None where there was no topic to keep it in."""
+        copies = []
+        for note_id in note_ids:
+            title, content, _, topic_id = edits[note_id]
+            note = db.get_note(note_id)
+            if note is not None:
+                if (note["title"], note["content"]) == (title, content):
+                    continue  # already applied (a replay after a crash right after the commit)
+                topic_id = note["topic_id"]
+            if topic_id is None or db.get_topic(topic_id) is None:
+                copies.append((note_id, None))
+                continue
+            copies.append((note_id, db.create_note(topic_id, f"{title} (conflict)", content)))
+        return copies
+
+    def _report_conflicts(self, copies):
+        if self.on_conflict:
+            for note_id, copy_id in copies:
+                self.on_conflict(note_id, copy_id)
+
+    def replay(self):
+        """Apply edits journaled by instances that exited before flushing; returns how many.
+
+        Journals of live instances are locked and left alone.
+        """
+        count = 0
+        for path in sorted(self.journal_dir.glob(f"{JOURNAL_NAME}*.jsonl")):
+            if path != self.journal_path:
+                count += self._replay_orphan(path)
+        return count
+
+    def _replay_orphan(self, path):
+        try:
+            f = open(path, "r+", encoding="utf-8")
+        except FileNotFoundError:
+            return 0
+        try:
+            if not _lock_file(f, blocking=False):
+                return 0  # its instance is still running
+            try:
+                if os.stat(path).st_ino != os.fstat(f.fileno()).st_ino:
+                    return 0
+            except FileNotFoundError:
+                return 0  # replayed and removed by someone else while we waited
+            count = self._apply(f.readlines())
+            if os.name != "nt":
+                # removed while still locked, so nobody else can pick it up again
+                path.unlink()
+        finally:
+            f.close()
+        if os.name == "nt":
+            path.unlink(missing_ok=True)
+        return count
+
+    def _apply(self, lines):
+        latest = {}
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # a write torn by the crash; everything before it is intact
+                break
+            base = latest[entry["id"]][2] if entry["id"] in latest else entry.get("version")
+            latest[entry["id"]] = (entry["title"], entry["content"], base, entry.get("topic"))
+        if latest:
+            versions, conflicts, missing = db.update_notes(_changes(latest))
+            self.versions.update(versions)
+            self._report_conflicts(self._save_conflicts(latest, conflicts + missing))
+        return len(latest)
+
+    def close(self):
+        self.flush()
+        if self._journal is not None:
+            # flushed, so the journal is empty; where the OS allows it, remove it while still locked
+            if os.name != "nt":
+                self.journal_path.unlink()
+            self._journal.close()
+            self._journal = None
+            if os.name == "nt":
+                self.journal_path.unlink(missing_ok=True)
+
+
+def _changes(edits):
+    """db.update_notes() rows for {note_id: (title, content, version, topic_id)}."""
+    return [(note_id, title, content, version) for note_id, (title, content, version, _) in edits.items()]
+
+
+def _lock_file(f, blocking=True):
+    """Exclusively lock an open file until it is closed; False if blocking=False and it is taken."""
+    try:
+        if os.name == "nt":
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except OSError:
+        if blocking:
+            raise
+        return False
+    return True